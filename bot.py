@@ -11,22 +11,43 @@ django.setup()
 
 
 # ------------------ now import the remain -------------------
-import re
+import asyncio
+import hashlib
+import html
+import json
 import logging
-from decimal import Decimal
+import time
+import uuid
+from datetime import timedelta
 from io import BytesIO
+from pathlib import Path
 import httpx
 from PIL import Image
 from asgiref.sync import sync_to_async
 # ✅ NOW it's safe to import Django stuff
-from shop.services.cart_service import get_or_create_active_cart, add_product_to_cart, get_cart_item
+from shop.services.cart_service import get_active_cart, apply_cart_changes
+from shop.services.order_service import get_order_history_page, encode_order_cursor, decode_order_cursor
+from shop.services.order_service import claim_checkout, drop_checkout_claim, finish_checkout, order_status_message
+from shop.services.customer_service import get_customer_profile, save_customer_profile
+from shop.services.search_service import search_products
+from shop.services.catalog_service import get_category_page
+from delivery.services.tracking_service import build_tracking_text, get_tracked_delivery, save_tracking_message
+from delivery.services.eta_service import get_eta_params
+from delivery.services.zone_service import geocode_cached, is_deliverable
+from delivery.services.slot_service import book_slot, release_slot, upcoming_slots
+from shop.services.inventory_service import record_reservations, reserve_stock, unreserve_stock
 from shop.models import Category, Product, Order, OrderItem, CartItem 
+from core.db_router import REPLICA_LAG_SECONDS, replica_alias
+from django.db import close_old_connections, transaction
+from django.utils import timezone
 
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, Message, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import InlineQueryResultArticle, InlineQueryResultCachedPhoto, InputTextMessageContent, InputMediaPhoto
+from telegram.error import BadRequest
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, CallbackQueryHandler,
-    ConversationHandler, MessageHandler, ContextTypes, filters
+    ApplicationBuilder, CommandHandler, CallbackQueryHandler, InlineQueryHandler,
+    ConversationHandler, MessageHandler, TypeHandler, ContextTypes, filters
 )
 
     
@@ -45,15 +66,15 @@ logger = logging.getLogger(__name__)
 # ------------------ Globals ------------------
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")
+LOGO_PATH = "static/images/logo.jpg"   # put your logo file in static/images folder
 
 
 
 
 
 # ------------------ REGEX ------------------
-PHONE_REGEX = re.compile(r"^\+?\d{7,15}$")
-EMAIL_REGEX = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
-NAME_REGEX = re.compile(r"^[A-Za-z\s]{2,}$")
+# shared with shop.models / shop.serializers
+from core.validators import EMAIL_REGEX, NAME_REGEX, PHONE_REGEX
 
 
 
@@ -80,36 +101,188 @@ async def resize_image_for_telegram(image_path):
         return None
 
 
+def product_view(product):
+    """Caption + keyboard of a product page."""
+    text = f"*{product.name}*\nPrice: ${product.price}\n\n{product.description or ''}"
+    buttons = [
+        [InlineKeyboardButton("➕ Add to cart", callback_data=f"add_{product.id}")],
+        [InlineKeyboardButton("⬅️ Back", callback_data=f"cat_{product.category_id}")],
+        [InlineKeyboardButton("Back to categories", callback_data="back_cats")]
+    ]
+    return text, InlineKeyboardMarkup(buttons)
+
+
+async def product_photo(product):
+    """The Telegram file_id if the image was uploaded before, else the resized image to upload (None: no image)."""
+    if product.telegram_file_id:
+        return product.telegram_file_id
+    if product.image and os.path.exists(product.image.path):
+        return await resize_image_for_telegram(product.image.path)
+    return None
+
+
+async def remember_photo(product, message):
+    """First upload of a product image -> keep Telegram's file_id (inline results, later views)."""
+    if product.telegram_file_id or not message or not message.photo:
+        return
+    product.telegram_file_id = message.photo[-1].file_id
+    await sync_to_async(Product.objects.filter(id=product.id).update)(telegram_file_id=product.telegram_file_id)
+
+
+async def send_product(chat_id, context: ContextTypes.DEFAULT_TYPE, product):
+    text, markup = product_view(product)
+    photo = await product_photo(product)
+    if photo:
+        try:
+            message = await context.bot.send_photo(chat_id=chat_id, photo=photo, caption=text, parse_mode="Markdown", reply_markup=markup)
+            await remember_photo(product, message)
+            return
+        except Exception as e:
+            logger.debug("send_photo failed: %s", e)
+    await safe_send_text(chat_id, context, text, reply_markup=markup, parse_mode="Markdown")
+
+
 async def safe_send_text(chat_id, context: ContextTypes.DEFAULT_TYPE, text, reply_markup=None, parse_mode=None):
-    """Send text safely."""
+    """Send text safely. Returns the sent message (None if sending failed)."""
     try:
-        await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        return await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
     except Exception as e:
         logger.error("Failed to send message to %s: %s", chat_id, e)
 
 
+async def render_cart(chat_id, message_obj, context: ContextTypes.DEFAULT_TYPE, text, reply_markup=None, parse_mode=None):
+    """
+    Show the cart in `message_obj`. Skipped when that message already shows exactly this
+    (hash of text + keyboard per chat); "message is not modified" is not an error; a fresh
+    message is sent only when the edit really fails (e.g. a photo message, a deleted one).
+    """
+    markup = reply_markup.to_dict() if reply_markup else None
+    digest = hashlib.sha1(json.dumps([text, markup], sort_keys=True).encode()).hexdigest()
+    rendered = context.chat_data.get("cart_render")
+    if rendered == (message_obj.message_id, digest):
+        return
 
-async def send_cart_message(chat_id, message_obj, context):
-    # 1️⃣ Get cart
-    cart = await get_or_create_active_cart(chat_id)  # already async
+    try:
+        await message_obj.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            logger.debug("cart message %s not editable: %s", message_obj.message_id, e)
+            message_obj = await safe_send_text(chat_id, context, text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except Exception as e:
+        # network trouble: the edit may well have gone through -> no second message
+        logger.error("cart edit for chat %s failed: %s", chat_id, e)
+        return
 
-    # 2️⃣ Fetch items with related products
-    items = await sync_to_async(lambda: list(CartItem.objects.filter(cart=cart).select_related('product')))()
+    if message_obj:
+        context.chat_data["cart_render"] = (message_obj.message_id, digest)
 
-    if not items:
+
+
+# ------------------ Catalog message ------------------
+# Categories -> products -> product live in ONE message, edited in place:
+#   - photo message: the product photo is swapped in with edit_message_media (file_id once uploaded),
+#     lists / products without an image show the shop logo; same picture -> only the caption is edited
+#   - text message: stays text, until a product with a photo is opened -> replaced once by a photo message
+#     (Telegram can't turn a text message into a photo one, and back)
+# context.chat_data["catalog_photo"] = (message_id, "logo" | "prod_<id>") -> what that message shows now
+
+def categories_view(categories, title="Choose category:"):
+    buttons = [[InlineKeyboardButton(c.name, callback_data=f"cat_{c.id}")] for c in categories]
+    return title, InlineKeyboardMarkup(buttons)
+
+
+def logo_photo(context: ContextTypes.DEFAULT_TYPE):
+    """The logo's file_id once uploaded, else its bytes (None: no logo)."""
+    if context.bot_data.get("logo_file_id"):
+        return context.bot_data["logo_file_id"]
+    if os.path.exists(LOGO_PATH):
+        return Path(LOGO_PATH).read_bytes()
+    return None
+
+
+def has_photo(product):
+    return bool(product.telegram_file_id or (product.image and os.path.exists(product.image.path)))
+
+
+async def show_catalog(query, context: ContextTypes.DEFAULT_TYPE, text, markup, product=None):
+    """Show `text` (+ the `product`'s photo) in the message the button was tapped on."""
+    message = query.message
+    shown = context.chat_data.get("catalog_photo")
+    key = f"prod_{product.id}" if product and has_photo(product) else "logo"
+    # built only when the picture really changes (a product image is resized on first upload)
+    photo = None
+
+    try:
+        if not message.photo and key == "logo":
+            await message.edit_text(text, parse_mode="Markdown", reply_markup=markup)
+            return
+        if message.photo:
+            if shown == (message.message_id, key):
+                await message.edit_caption(caption=text, parse_mode="Markdown", reply_markup=markup)
+                return
+            photo = await catalog_photo(context, key, product)
+            if photo:
+                edited = await message.edit_media(InputMediaPhoto(media=photo, caption=text, parse_mode="Markdown"), reply_markup=markup)
+                await remember_catalog_photo(context, edited, key, product)
+                return
+            await message.edit_caption(caption=text, parse_mode="Markdown", reply_markup=markup)
+            return
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return
+        logger.debug("catalog message %s not editable: %s", message.message_id, e)
+
+    # text -> photo (or the edit failed): replace the message instead of adding one more
+    try:
+        await message.delete()
+    except BadRequest:
+        pass
+    if photo is None and key != "logo":
+        photo = await catalog_photo(context, key, product)
+    elif hasattr(photo, "seek"):
+        photo.seek(0)  # a failed edit_media may have read the resized image already
+    if photo:
         try:
-            await message_obj.edit_text("🛒 Your cart is empty.")
-        except Exception:
-            await safe_send_text(chat_id, context, "🛒 Your cart is empty.")
+            sent = await context.bot.send_photo(chat_id=message.chat.id, photo=photo, caption=text, parse_mode="Markdown", reply_markup=markup)
+            await remember_catalog_photo(context, sent, key, product)
+            return
+        except Exception as e:
+            logger.debug("send_photo failed: %s", e)
+    await safe_send_text(message.chat.id, context, text, reply_markup=markup, parse_mode="Markdown")
+
+
+async def catalog_photo(context: ContextTypes.DEFAULT_TYPE, key, product=None):
+    return logo_photo(context) if key == "logo" else await product_photo(product)
+
+
+async def remember_catalog_photo(context: ContextTypes.DEFAULT_TYPE, message, key, product=None):
+    if not isinstance(message, Message) or not message.photo:
         return
+    context.chat_data["catalog_photo"] = (message.message_id, key)
+    if key == "logo":
+        context.bot_data["logo_file_id"] = message.photo[-1].file_id
+    else:
+        await remember_photo(product, message)
+
+
+
+async def send_cart_message(chat_id, message_obj, context):
+    # 1️⃣ Get cart (none until the first product is added)
+    cart = await get_active_cart(chat_id)
+
+    # 2️⃣ Empty? -> Cart.item_count, no item query
+    if not cart or not cart.item_count:
+        await render_cart(chat_id, message_obj, context, "🛒 Your cart is empty.")
+        return
+
+    # 3️⃣ Fetch items with related products (for the lines; the total is kept on the cart)
+    items = await sync_to_async(lambda: list(CartItem.objects.filter(cart=cart).select_related('product')))()
 
     lines = []
-    total = Decimal("0.00")
     keyboard = []
 
     for item in items:
         subtotal = item.price * item.quantity
-        total += subtotal
         lines.append(f"{item.product.name} x{item.quantity} = ${subtotal:.2f}")
         keyboard.append([
             InlineKeyboardButton(
@@ -124,35 +297,98 @@ async def send_cart_message(chat_id, message_obj, context):
             InlineKeyboardButton("❌", callback_data=f"rm_{item.product.id}")
         ])
 
-    lines.append(f"\n*Total:* ${total:.2f}")
+    lines.append(f"\n*Total:* ${cart.total:.2f}")
     keyboard.append([InlineKeyboardButton("Checkout", callback_data="checkout_now")])
     markup = InlineKeyboardMarkup(keyboard)
-    text = "🛒 *Your Cart:*\n\n" + "\n".join(lines)
+    text = f"🛒 *Your Cart* ({cart.item_count} items):\n\n" + "\n".join(lines)
 
-    try:
-        await message_obj.edit_text(text, parse_mode="Markdown", reply_markup=markup)
-    except Exception:
-        await safe_send_text(chat_id, context, text, reply_markup=markup, parse_mode="Markdown")
+    await render_cart(chat_id, message_obj, context, text, reply_markup=markup, parse_mode="Markdown")
 
 
 
             
             
             
+# ------------------ Cart taps ------------------
+# ➕➕➕➕➕ in a row -> one DB transaction and one re-render instead of five: a chat's cart taps
+# are collected for CART_TAP_WINDOW seconds and applied together. Every update of a chat is
+# handled by the same process (bot_worker partitions by chat), so an in-memory buffer is enough.
+# The flush tasks are referenced until done and awaited on shutdown (drain_cart_taps), so a
+# stopping bot / worker applies what it buffered; only a crash can lose the last window's taps.
+CART_TAP_WINDOW = 0.4
+
+_cart_taps = {}  # chat_id -> {"changes": {product_id: [remove, delta]}, "message": message to re-render}
+_cart_flushes = set()  # running flush_cart_taps() tasks
+
+
+def queue_cart_tap(chat_id, op, product_id, message, context: ContextTypes.DEFAULT_TYPE):
+    pending = _cart_taps.get(chat_id)
+    if pending is None:
+        pending = _cart_taps[chat_id] = {"changes": {}}
+        task = context.application.create_task(flush_cart_taps(chat_id, context))
+        _cart_flushes.add(task)
+        task.add_done_callback(_cart_flushes.discard)
+    pending["message"] = message
+
+    change = pending["changes"].setdefault(product_id, [False, 0])
+    if op == "rm":
+        change[:] = [True, 0]
+    else:
+        change[1] += 1 if op in ("add", "inc") else -1
+
+
+async def flush_cart_taps(chat_id, context: ContextTypes.DEFAULT_TYPE):
+    await asyncio.sleep(CART_TAP_WINDOW)
+    pending = _cart_taps.pop(chat_id)
+    try:
+        await apply_cart_changes(chat_id, {product_id: tuple(change) for product_id, change in pending["changes"].items()})
+    except Exception as e:
+        logger.error("cart update for chat %s failed: %s", chat_id, e)
+    await send_cart_message(chat_id, pending["message"], context)
+
+
+async def drain_cart_taps(application=None):
+    """Shutdown: wait until every buffered tap is applied (at most CART_TAP_WINDOW + one write)."""
+    while _cart_flushes:
+        await asyncio.gather(*list(_cart_flushes), return_exceptions=True)
+
+
+
+
 # ------------------ Delivery Helper ------------------
 async def send_delivery_status(chat_id, order_id, context: ContextTypes.DEFAULT_TYPE):
-    from delivery.models import Delivery
-    try:
-        delivery = await sync_to_async(Delivery.objects.get)(order_id=order_id)
-        text = (
-            f"📦 **Order #{order_id} Delivery Status**\n\n"
-            f"Status: {delivery.status}\n"
-            f"Current Location: {delivery.current_location}\n"
-            f"ETA: {delivery.eta or 'Not available'}"
-        )
-        await safe_send_text(chat_id, context, text, parse_mode="Markdown")
-    except Delivery.DoesNotExist:
+    # primary, not replica: we read tracking_message_id and write it right back
+    delivery = await sync_to_async(get_tracked_delivery)(order_id, chat_id)
+    if not delivery:
         await safe_send_text(chat_id, context, f"🚨 Delivery info not found for Order #{order_id}")
+        return
+
+    eta_params = await sync_to_async(get_eta_params)()  # in-memory, reloaded every few minutes
+    text = build_tracking_text(delivery, eta_params)
+
+    # 1️⃣ one status message per order -> edit it in place
+    if delivery.tracking_message_id:
+        try:
+            await context.bot.edit_message_text(
+                chat_id=chat_id, message_id=delivery.tracking_message_id, text=text, parse_mode="HTML"
+            )
+            return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            logger.debug("tracking message %s not editable: %s", delivery.tracking_message_id, e)
+
+    # 2️⃣ first time (or the old message is gone) -> send + pin
+    try:
+        msg = await context.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+    except Exception as e:
+        logger.error("Failed to send tracking message to %s: %s", chat_id, e)
+        return
+    await sync_to_async(save_tracking_message)(delivery, msg.message_id)
+    try:
+        await context.bot.pin_chat_message(chat_id=chat_id, message_id=msg.message_id, disable_notification=True)
+    except Exception as e:
+        logger.debug("pin_chat_message failed: %s", e)
 
 
 
@@ -171,14 +407,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat.id
     print("MERCHANT_CHAT_ID:", chat_id) 
 
-    # ---------- 1) Send Shop Logo ----------
-    logo_path = "static/images/logo.jpg"   # put your logo file in static/images folder
+    # "🛒 Open in shop" on an inline search result -> t.me/<bot>?start=prod_<id>
+    if context.args and context.args[0].startswith("prod_") and context.args[0][5:].isdigit():
+        product = await sync_to_async(Product.objects.using(replica_alias()).filter(id=int(context.args[0][5:]), is_active=True).first)()
+        if product:
+            await send_product(chat_id, context, product)
+            return
 
+    # ---------- 1) Send Shop Logo ----------
     try:
-        if os.path.exists(logo_path):
+        if os.path.exists(LOGO_PATH):
             await context.bot.send_photo(
                 chat_id=chat_id,
-                photo=open(logo_path, "rb")
+                photo=open(LOGO_PATH, "rb")
             )
     except Exception as e:
         logger.error(f"Failed to send logo: {e}")
@@ -220,19 +461,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def shop(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cats = await sync_to_async(list)(Category.objects.all())
+    cats = await sync_to_async(list)(Category.objects.using(replica_alias()).all())
     if not cats:
         await safe_send_text(update.message.chat.id, context, "No categories available yet.")
         return
-    buttons = [[InlineKeyboardButton(c.name, callback_data=f"cat_{c.id}")] for c in cats]
-    await safe_send_text(update.message.chat.id, context, "Choose category:", reply_markup=InlineKeyboardMarkup(buttons))
+    text, markup = categories_view(cats)
+    await safe_send_text(update.message.chat.id, context, text, reply_markup=markup)
 
 async def cart_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat.id
-    cart = await sync_to_async(get_or_create_active_cart)(chat_id)
-    items = await sync_to_async(cart.items.exists)()
+    cart = await get_active_cart(chat_id)
 
-    if not items:
+    if not cart or not cart.item_count:
         await safe_send_text(chat_id, context, "🛒 Your cart is empty.")
         return
 
@@ -261,10 +501,15 @@ async def fallback_to_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ------------------ Checkout Conversation ------------------
-NAME, PHONE, ADDRESS, EMAIL, CONFIRM = range(5)
+NAME, PHONE, ADDRESS, EMAIL, SLOT, CONFIRM, PROFILE = range(7)
+
+# everything a checkout conversation keeps in user_data
+CHECKOUT_KEYS = ("name", "phone", "address", "latitude", "longitude", "email", "slot_id", "slot_label", "slot_labels", "profile")
 
 async def checkout_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['in_conversation'] = True
+    # one token per checkout conversation -> a repeated "✅ Yes, proceed" never makes a 2nd order
+    context.user_data['checkout_token'] = uuid.uuid4().hex
 
     # Support both message and callback query
     if update.message:
@@ -275,17 +520,74 @@ async def checkout_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         return ConversationHandler.END  # Should never happen
 
-    from shop.services.cart_service import get_or_create_active_cart
-    cart = await get_or_create_active_cart(chat_id)
+    cart = await get_active_cart(chat_id)
 
-    if not cart or not await sync_to_async(cart.items.exists)():
+    if not cart or not cart.item_count:
         await safe_send_text(chat_id, context, "🛒 Your cart is empty. Add products first.")
         return ConversationHandler.END
 
-    await safe_send_text(chat_id, context, "Please enter your *full name*:", parse_mode="Markdown")
+    for key in CHECKOUT_KEYS:
+        context.user_data.pop(key, None)
+
+    # 👤 Returning customer -> one tap on the saved details, straight to the confirmation
+    profile = await sync_to_async(get_customer_profile)(chat_id)
+    if profile:
+        context.user_data["profile"] = profile
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ Use saved details", callback_data="checkout_saved")],
+            [InlineKeyboardButton("✏️ Enter new details", callback_data="checkout_new")]
+        ])
+        text = (
+            "👤 Deliver with your saved details?\n\n"
+            f"👤 Name: {profile['customer_name']}\n"
+            f"📱 Phone: {profile['phone']}\n"
+            f"📍 Address: {profile['address']}\n"
+            f"📧 Email: {profile.get('email') or '—'}"
+        )
+        await safe_send_text(chat_id, context, text, reply_markup=keyboard)
+        return PROFILE
+
+    return await ask_name(chat_id, context)
+
+
+async def ask_name(chat_id, context: ContextTypes.DEFAULT_TYPE):
+    keyboard = ReplyKeyboardMarkup(
+        [[KeyboardButton("📱 Share my contact", request_contact=True)]],
+        resize_keyboard=True, one_time_keyboard=True
+    )
+    await safe_send_text(chat_id, context, "Please enter your *full name* or share your contact:", reply_markup=keyboard, parse_mode="Markdown")
     return NAME
 
 
+async def checkout_use_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    profile = context.user_data.get("profile")
+    if not profile:
+        return await ask_name(query.message.chat.id, context)
+
+    context.user_data["name"] = profile["customer_name"]
+    context.user_data["phone"] = profile["phone"]
+    context.user_data["email"] = profile.get("email")
+
+    # the zones may have changed since the last order
+    latitude, longitude = profile.get("latitude"), profile.get("longitude")
+    if latitude is not None and not await sync_to_async(is_deliverable)(latitude, longitude):
+        await query.edit_message_text(OUTSIDE_ZONE_TEXT)
+        return ADDRESS
+
+    context.user_data["address"] = profile["address"]
+    context.user_data["latitude"], context.user_data["longitude"] = latitude, longitude
+    return await checkout_confirm_msg(query, context)
+
+
+async def checkout_new_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    context.user_data.pop("profile", None)
+    return await ask_name(query.message.chat.id, context)
+
+
 
 async def checkout_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name = update.message.text.strip()
@@ -295,10 +597,30 @@ async def checkout_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return NAME
 
     context.user_data["name"] = name
-    await safe_send_text(update.message.chat.id, context, "📱 Please enter your phone number:")
+    if context.user_data.get("phone"):  # already taken from the shared contact
+        return await ask_address(update.message.chat.id, context)
+    await safe_send_text(update.message.chat.id, context, "📱 Please enter your phone number:", reply_markup=ReplyKeyboardRemove())
     return PHONE
 
 
+async def checkout_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    contact = update.message.contact
+    chat_id = update.message.chat.id
+
+    if contact.user_id != update.effective_user.id:
+        await safe_send_text(chat_id, context, "❌ Please share your own contact, or type your full name:")
+        return NAME
+
+    context.user_data["phone"] = "+" + contact.phone_number.lstrip("+")
+    name = " ".join(filter(None, [contact.first_name, contact.last_name]))
+    if not NAME_REGEX.match(name):
+        await safe_send_text(chat_id, context, "📱 Got your number. Please enter your *full name* (letters only):", reply_markup=ReplyKeyboardRemove(), parse_mode="Markdown")
+        return NAME
+
+    context.user_data["name"] = name
+    return await ask_address(chat_id, context)
+
+
 
 async def checkout_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     phone = update.message.text.strip()
@@ -308,10 +630,20 @@ async def checkout_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return PHONE
 
     context.user_data["phone"] = phone
-    await safe_send_text(update.message.chat.id, context, "📍 Please enter your address:")
+    return await ask_address(update.message.chat.id, context)
+
+
+async def ask_address(chat_id, context: ContextTypes.DEFAULT_TYPE):
+    keyboard = ReplyKeyboardMarkup(
+        [[KeyboardButton("📍 Share my location", request_location=True)]],
+        resize_keyboard=True, one_time_keyboard=True
+    )
+    await safe_send_text(chat_id, context, "📍 Please enter your address or share your location:", reply_markup=keyboard)
     return ADDRESS
 
 
+OUTSIDE_ZONE_TEXT = "😔 Sorry, we don't deliver to this area yet.\nPlease enter another address or share another location:"
+
 
 async def checkout_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
     address = update.message.text.strip()
@@ -320,8 +652,29 @@ async def checkout_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await safe_send_text(update.message.chat.id, context, "❌ Address is too short.\nPlease enter a valid address:")
         return ADDRESS
 
+    # known address -> check the delivery zones now instead of cancelling after payment
+    point = await sync_to_async(geocode_cached)(address)
+    if point and not await sync_to_async(is_deliverable)(*point):
+        await safe_send_text(update.message.chat.id, context, OUTSIDE_ZONE_TEXT)
+        return ADDRESS
+
     context.user_data["address"] = address
-    await safe_send_text(update.message.chat.id,context,"📧 (Optional) Enter your email or type /skip")
+    context.user_data["latitude"], context.user_data["longitude"] = point or (None, None)
+    await safe_send_text(update.message.chat.id, context, "📧 (Optional) Enter your email or type /skip", reply_markup=ReplyKeyboardRemove())
+    return EMAIL
+
+
+async def checkout_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    location = update.message.location
+
+    if not await sync_to_async(is_deliverable)(location.latitude, location.longitude):
+        await safe_send_text(update.message.chat.id, context, OUTSIDE_ZONE_TEXT)
+        return ADDRESS
+
+    context.user_data["address"] = f"📍 {location.latitude:.5f}, {location.longitude:.5f}"
+    context.user_data["latitude"] = location.latitude
+    context.user_data["longitude"] = location.longitude
+    await safe_send_text(update.message.chat.id, context, "📧 (Optional) Enter your email or type /skip", reply_markup=ReplyKeyboardRemove())
     return EMAIL
 
 
@@ -333,12 +686,48 @@ async def checkout_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return EMAIL
 
     context.user_data["email"] = email
-    return await checkout_confirm_msg(update, context)
+    return await checkout_slot_prompt(update, context)
 
 
 async def skip_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["email"] = None
-    return await checkout_confirm_msg(update, context)
+    return await checkout_slot_prompt(update, context)
+
+
+async def checkout_slot_prompt(src, context: ContextTypes.DEFAULT_TYPE, text="🕒 Choose your delivery time:"):
+    # places left come from the Redis counters -> no row lock, nothing is booked before confirmation
+    slots = await sync_to_async(upcoming_slots)()
+    if not slots:
+        context.user_data["slot_id"] = None
+        context.user_data["slot_label"] = None
+        return await checkout_confirm_msg(src, context)
+
+    keyboard = [
+        [InlineKeyboardButton(f"{slot} ({left} left)", callback_data=f"slot_{slot.id}")]
+        for slot, left in slots if left > 0
+    ]
+    keyboard.append([InlineKeyboardButton("🚀 As soon as possible", callback_data="slot_asap")])
+    context.user_data["slot_labels"] = {str(slot.id): str(slot) for slot, _ in slots}
+
+    if isinstance(src, Update):
+        await src.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    else:
+        await src.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    return SLOT
+
+
+async def checkout_slot(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    slot_id = query.data.split("_", 1)[1]
+    if slot_id == "asap":
+        context.user_data["slot_id"] = None
+        context.user_data["slot_label"] = None
+    else:
+        context.user_data["slot_id"] = int(slot_id)
+        context.user_data["slot_label"] = context.user_data.get("slot_labels", {}).get(slot_id)
+    return await checkout_confirm_msg(query, context)
 
 
 async def checkout_confirm_msg(src, context: ContextTypes.DEFAULT_TYPE):
@@ -348,12 +737,13 @@ async def checkout_confirm_msg(src, context: ContextTypes.DEFAULT_TYPE):
         f"👤 Name: {data['name']}\n"
         f"📱 Phone: {data['phone']}\n"
         f"📍 Address: {data['address']}\n"
-        f"📧 Email: {data.get('email') or '—'}\n\n"
+        f"📧 Email: {data.get('email') or '—'}\n"
+        f"🕒 Delivery: {data.get('slot_label') or 'As soon as possible'}\n\n"
         "Is this information correct?"
     )
     keyboard = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("✅ Yes, proceed", callback_data="confirm_checkout"),
+            InlineKeyboardButton("✅ Yes, proceed", callback_data=f"confirm_checkout:{data['checkout_token']}"),
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_checkout")
         ]
     ])
@@ -365,6 +755,53 @@ async def checkout_confirm_msg(src, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+# a repeated confirmation waits this long for the first one's payment link before asking again
+# (the first run hit a Stripe error; the payment view locks the order, so asking again is safe)
+CHECKOUT_LINK_WAIT = timedelta(seconds=60)
+
+
+# Stripe Checkout link for an order (the payment view reuses the order's open session)
+async def create_payment_link(order_id):
+    async with httpx.AsyncClient() as client:
+        resp = await client.post(f"{SITE_URL}/payment/create-checkout-session/{order_id}/")
+        resp.raise_for_status()
+        return resp.json().get("url")
+
+
+async def send_payment_link(chat_id, context: ContextTypes.DEFAULT_TYPE, token, order_id, pay_url=None):
+    try:
+        if not pay_url:
+            pay_url = await create_payment_link(order_id)
+            await sync_to_async(finish_checkout)(token, payment_url=pay_url)
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("💳 Pay Now", url=pay_url)]
+        ])
+        await safe_send_text(chat_id, context, f"🛒 Order #{order_id} created! Click below to pay:", reply_markup=keyboard)
+
+    except Exception as e:
+        await safe_send_text(chat_id, context, f"Payment initiation failed: {str(e)}")
+
+
+async def repeat_checkout(chat_id, context: ContextTypes.DEFAULT_TYPE, token, confirmation):
+    """A repeated confirmation of a token: the first one's order and link, never a second order / session."""
+    if confirmation.order_id:
+        status = await sync_to_async(
+            Order.objects.filter(id=confirmation.order_id).values_list("status", flat=True).first
+        )()
+        if status != "pending":
+            # paid / cancelled meanwhile -> its status, not a payment link
+            await safe_send_text(chat_id, context, order_status_message(confirmation.order_id, status), parse_mode="HTML")
+            return
+
+    if confirmation.payment_url:
+        await send_payment_link(chat_id, context, token, confirmation.order_id, confirmation.payment_url)
+    elif confirmation.order_id and timezone.now() - confirmation.created_at > CHECKOUT_LINK_WAIT:
+        await send_payment_link(chat_id, context, token, confirmation.order_id)
+    else:
+        # the first tap is still creating the order / its payment page
+        await safe_send_text(chat_id, context, "⏳ Your order is being created, one moment…")
+
+
 async def checkout_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['in_conversation'] = False
     query = update.callback_query
@@ -372,52 +809,117 @@ async def checkout_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     chat_id = query.message.chat.id
     data = context.user_data
-    
-    cart = await get_or_create_active_cart(chat_id)
-    items = await sync_to_async(list)(cart.items.select_related("product"))
 
-    if not items:
-        await safe_send_text(chat_id, context, "Your cart is empty. Use /shop to start again.")
+    # 🔁 Double tap / redelivered update: the token was already confirmed -> same order, same link
+    try:
+        token = uuid.UUID(query.data.partition(":")[2]).hex
+    except ValueError:
+        return ConversationHandler.END
+    claimed, confirmation = await sync_to_async(claim_checkout)(token, chat_id)
+    if not claimed:
+        if confirmation:
+            await repeat_checkout(chat_id, context, token, confirmation)
         return ConversationHandler.END
 
-    # 1️⃣ Create Django Order
-    order = await sync_to_async(Order.objects.create)(
-        chat_id=chat_id,
-        customer_name=data["name"],
-        phone=data["phone"],
-        address=data["address"],
-        email=data.get("email")
-    )
+    try:
+        return await place_order(query, context, chat_id, data, token)
+    finally:
+        # stopped before an order was committed (empty cart, no stock, slot full, error) -> token
+        # reusable; once create_checkout_order committed, the claim carries its order_id and stays
+        await sync_to_async(drop_checkout_claim)(token)
+
+
+def create_checkout_order(token, items, lines, **fields):
+    """
+    The order, its lines (+ total / summary from them), its stock reservations and the token's
+    order_id in ONE transaction: a failure part way leaves nothing behind but the Redis holds
+    the caller gives back, and a committed order is always found by a repeated confirmation.
+    """
+    with transaction.atomic():
+        order = Order(**fields)
+        # from the lines copied at confirmation, not cart.total: a cart tap flushed meanwhile may have moved that
+        order.total = sum(item.price * item.quantity for item in items)
+        order.set_items_summary(items)
+        order.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item.product, quantity=item.quantity, price=item.price,
+                      order_created_at=order.created_at)
+            for item in items
+        ])
+        # released if unpaid after STOCK_RESERVATION_MINUTES
+        record_reservations(order, lines)
+        # from here on a repeated confirmation just gets this order's payment link
+        finish_checkout(token, order_id=order.id)
+    return order
 
-    total = Decimal("0.00")
 
+async def place_order(query, context: ContextTypes.DEFAULT_TYPE, chat_id, data, token):
+    if data.get("checkout_token") != token:
+        # an old conversation's button: its details are gone
+        await safe_send_text(chat_id, context, "⌛ This checkout has expired. Use /checkout to start again.")
+        return ConversationHandler.END
+
+    cart = await get_active_cart(chat_id)
+    items = await sync_to_async(list)(cart.items.select_related("product")) if cart and cart.item_count else []
+    if not items:
+        await safe_send_text(chat_id, context, "Your cart is empty. Use /shop to start again.")
+        return ConversationHandler.END
+
+    # 0️⃣ Hold the stock (atomic Redis counters: every line or none, no Product row lock)
+    lines = {}
     for item in items:
-        subtotal = item.price * item.quantity
-        total += subtotal
+        lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+    short = await sync_to_async(reserve_stock)(lines)
+    if short:
+        name = next(item.product.name for item in items if item.product_id == short)
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🧺 View Cart", callback_data="view_cart")]])
+        await query.edit_message_text(
+            f"😔 Sorry, there is not enough stock of *{name}* for your order.\nPlease update your cart.",
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
+        return ConversationHandler.END
 
-        await sync_to_async(OrderItem.objects.create)( order=order,product=item.product, quantity=item.quantity,price=item.price)
-              
-    order.total = total
-    await sync_to_async(order.save)()
+    # 0️⃣ Take a place in the delivery slot (atomic Redis counter, never oversubscribed)
+    slot_id = data.get("slot_id")
+    if slot_id and not await sync_to_async(book_slot)(slot_id):
+        await sync_to_async(unreserve_stock)(lines)
+        context.user_data['in_conversation'] = True
+        return await checkout_slot_prompt(query, context, "😔 That delivery time just filled up.\n🕒 Please choose another one:")
+
+    # 1️⃣ Create the Django Order (one transaction, see create_checkout_order)
+    try:
+        order = await sync_to_async(create_checkout_order)(
+            token, items, lines,
+            chat_id=chat_id,
+            customer_name=data["name"],
+            phone=data["phone"],
+            address=data["address"],
+            latitude=data.get("latitude"),
+            longitude=data.get("longitude"),
+            email=data.get("email"),
+            delivery_slot_id=slot_id
+        )
+    except Exception:
+        await sync_to_async(unreserve_stock)(lines)
+        if slot_id:
+            await sync_to_async(release_slot)(slot_id)
+        raise
+
+    context.chat_data["ordered_at"] = time.time()  # /track reads this chat from the primary for a moment
+    # next checkout: one tap on these details
+    await sync_to_async(save_customer_profile)(
+        chat_id, customer_name=data["name"], phone=data["phone"], address=data["address"],
+        latitude=data.get("latitude"), longitude=data.get("longitude"), email=data.get("email"),
+    )
 
     cart.is_active = False
-    await sync_to_async(cart.save)()
+    # not a full save: item_count / total on this instance may be stale by now
+    await sync_to_async(cart.save)(update_fields=["is_active", "updated_at"])
 
 
     # 2️⃣ Call Django create_checkout_session (Stripe)
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(f"{SITE_URL}/payment/create-checkout-session/{order.id}/")
-            resp.raise_for_status()
-            data = resp.json()
-            pay_url = data.get("url")
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("💳 Pay Now", url=pay_url)]
-            ])
-        await safe_send_text(chat_id, context, f"🛒 Order #{order.id} created! Click below to pay:", reply_markup=keyboard)
-
-    except Exception as e:
-        await safe_send_text(chat_id, context, f"Payment initiation failed: {str(e)}")
+    await send_payment_link(chat_id, context, token, order.id)
 
     return ConversationHandler.END
 
@@ -431,7 +933,7 @@ async def checkout_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['in_conversation'] = False
 
     # 🧹 Clear checkout data (optional but clean)
-    for key in ("name", "phone", "address", "email"):
+    for key in CHECKOUT_KEYS:
         context.user_data.pop(key, None)
 
     keyboard = InlineKeyboardMarkup([
@@ -452,9 +954,23 @@ async def checkout_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+def latest_order(chat_id, ordered_at=None):
+    """
+    The chat's newest order, from the replica -- from the primary while the replica may still
+    lag behind it: this chat checked out (`ordered_at`, time.time()) or the order is brand new.
+    """
+    orders = Order.objects.filter(chat_id=chat_id).order_by('-created_at')
+    if ordered_at and time.time() - ordered_at < REPLICA_LAG_SECONDS:
+        return orders.first()
+    order = orders.using(replica_alias()).first()
+    if order is None or order.created_at > timezone.now() - timedelta(seconds=REPLICA_LAG_SECONDS):
+        order = orders.first()
+    return order
+
+
 async def track_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_user.id
-    order = await sync_to_async(Order.objects.filter(chat_id=chat_id).order_by('-created_at').first)()
+    order = await sync_to_async(latest_order)(chat_id, context.chat_data.get("ordered_at"))
 
     if not order:
         return await update.message.reply_text("You don’t have any orders yet.")
@@ -479,25 +995,35 @@ async def track_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
-async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_user.id
-    orders = await sync_to_async(Order.objects.filter)(chat_id=chat_id)
+def render_orders_page(orders, has_newer, has_older):
+    """Order-history page text + ⬅️/➡️ keyboard (HTML parse mode)."""
+    blocks = [
+        (
+            f"🆔 <b>Order #{order.id}</b> — {order.status}\n"
+            f"🧾 {order.item_count} item(s): {html.escape(order.summary or '—')}\n"
+            f"💵 {order.total} SAR · 📅 {order.created_at.strftime('%Y-%m-%d')}"
+        )
+        for order in orders
+    ]
+    text = "📦 <b>Your Orders:</b>\n\n" + "\n--------------------------\n".join(blocks)
+
+    nav = []
+    if has_newer:
+        nav.append(InlineKeyboardButton("⬅️ Newer", callback_data=f"orders_new_{encode_order_cursor(orders[0])}"))
+    if has_older:
+        nav.append(InlineKeyboardButton("Older ➡️", callback_data=f"orders_old_{encode_order_cursor(orders[-1])}"))
+    return text, InlineKeyboardMarkup([nav]) if nav else None
 
-    if not orders.exists():
-        return await update.message.reply_text("You have no orders yet.")
 
-    msg = "📦 *Your Previous Orders:*\n\n"
+async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    orders, has_newer, has_older = await get_order_history_page(chat_id)
 
-    for order in orders.order_by('-created_at')[:10]:
-        msg += f"""
-                    🆔 Order ID: `{order.id}`
-                    Status: {order.status}
-                    Total: {order.total} SAR
-                    Date: {order.created_at.strftime('%Y-%m-%d')}
-                    --------------------------
-                """
+    if not orders:
+        return await update.message.reply_text("You have no orders yet.")
 
-    await update.message.reply_text(msg, parse_mode="HTML")
+    text, markup = render_orders_page(orders, has_newer, has_older)
+    await update.message.reply_text(text, reply_markup=markup, parse_mode="HTML")
 
 
 
@@ -516,30 +1042,38 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
     # ---------- Category ----------
-    if data.startswith("cat_"):
-        cat_id = data.split("_", 1)[1]
-
-        category = await sync_to_async(Category.objects.get)(id=cat_id)
-        cat_name = category.name
-
-        products = await sync_to_async(list)(
-            Product.objects.filter(category=category, is_active=True)
-        )
-
-        if not products:
-            await query.edit_message_text("No products in this category.")
+    # cat_<id> -> first page, catp_<id>_<n|p>_<product id> -> the page after / before that product
+    if data.startswith(("cat_", "catp_")):
+        if data.startswith("cat_"):
+            cat_id, direction, cursor = int(data.split("_", 1)[1]), "n", None
+        else:
+            _, cat_id, direction, cursor = data.split("_")
+            cat_id, cursor = int(cat_id), int(cursor)
+
+        page = await sync_to_async(get_category_page)(cat_id, cursor, back=(direction == "p"))
+
+        if not page or not page["products"]:
+            await show_catalog(query, context, "No products in this category.", InlineKeyboardMarkup(
+                [[InlineKeyboardButton("Back to categories", callback_data="back_cats")]]
+            ))
             return
 
+        products = page["products"]
         buttons = [
-            [InlineKeyboardButton(f"{p.name} - ${p.price}", callback_data=f"prod_{p.id}")]
-            for p in products
+            [InlineKeyboardButton(f"{name} - ${price}", callback_data=f"prod_{product_id}")]
+            for product_id, name, price in products
         ]
+        nav = []
+        if page["has_prev"]:
+            nav.append(InlineKeyboardButton("◀️", callback_data=f"catp_{cat_id}_p_{products[0][0]}"))
+        if page["has_next"]:
+            nav.append(InlineKeyboardButton("▶️", callback_data=f"catp_{cat_id}_n_{products[-1][0]}"))
+        if nav:
+            buttons.append(nav)
 
-        await query.edit_message_text(
-            f"📦 Products in **{cat_name}** category:",
-            reply_markup=InlineKeyboardMarkup(buttons),
-            parse_mode="Markdown"
-        )
+        buttons.append([InlineKeyboardButton("Back to categories", callback_data="back_cats")])
+
+        await show_catalog(query, context, f"📦 Products in **{page['category']}** category:", InlineKeyboardMarkup(buttons))
         return
 
 
@@ -547,56 +1081,42 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ---------- Product ----------
     if data.startswith("prod_"):
         prod_id = data.split("_", 1)[1]
-        product = await sync_to_async(Product.objects.get)(id=prod_id)
-        text = f"*{product.name}*\nPrice: ${product.price}\n\n{product.description or ''}"
-        buttons = [
-            [InlineKeyboardButton("➕ Add to cart", callback_data=f"add_{prod_id}")],
-            [InlineKeyboardButton("Back to categories", callback_data="back_cats")]
-        ]
-        if getattr(product.image, "path", None) and os.path.exists(product.image.path):
-            bio = await resize_image_for_telegram(product.image.path)
-            if bio:
-                try:
-                    await query.message.reply_photo(photo=bio, caption=text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
-                    return
-                except Exception as e:
-                    logger.debug("reply_photo failed: %s", e)
-        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(buttons))
+        product = await sync_to_async(Product.objects.using(replica_alias()).get)(id=prod_id)
+        text, markup = product_view(product)
+        await show_catalog(query, context, text, markup, product=product)
         return
 
 
     # ---------- Cart Operations ----------
+    # already answered above -> the tap feels instant; the change itself is batched
     if data.startswith(("add_", "inc_", "dec_", "rm_")):
         op, prod_id = data.split("_", 1)
-
-        cart = await get_or_create_active_cart(chat_id)
-        item = await get_cart_item(cart, prod_id)
-
-        if op in ("add", "inc"):
-            await add_product_to_cart(cart, prod_id, 1)
-
-        elif op == "dec" and item:
-            if item.quantity > 1:
-                item.quantity -= 1
-                await sync_to_async(item.save)()
-            else:
-                await sync_to_async(item.delete)()
-
-        elif op == "rm" and item:
-            await sync_to_async(item.delete)()
-
-        await send_cart_message(chat_id, query.message, context)
+        queue_cart_tap(chat_id, op, int(prod_id), query.message, context)
         return
 
 
     # ---------- Back to categories ----------
     if data == "back_cats":
-        categories = await sync_to_async(list)(Category.objects.all())
-        buttons = [[InlineKeyboardButton(c.name, callback_data=f"cat_{c.id}")] for c in categories]
-        await query.message.reply_text("Choose category:", reply_markup=InlineKeyboardMarkup(buttons))
+        categories = await sync_to_async(list)(Category.objects.using(replica_alias()).all())
+        text, markup = categories_view(categories)
+        await show_catalog(query, context, text, markup)
         return
     
     
+    # ---------- Order history pages ----------
+    if data.startswith("orders_"):
+        _, direction, cursor = data.split("_", 2)
+        orders, has_newer, has_older = await get_order_history_page(
+            chat_id, decode_order_cursor(cursor), newer=(direction == "new")
+        )
+        if not orders:
+            await query.edit_message_text("You have no more orders.")
+            return
+        text, markup = render_orders_page(orders, has_newer, has_older)
+        await query.edit_message_text(text, reply_markup=markup, parse_mode="HTML")
+        return
+
+
     # ---------- Track Order ----------
     if data.startswith("track_"):
         order_id = data.split("_")[1]
@@ -606,9 +1126,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # from payment/views.py ---  reply_markup  -- callback_data
     # ---------- Shop button ----------
     if data == "shop":
-        categories = await sync_to_async(list)(Category.objects.all())
-        buttons = [[InlineKeyboardButton(c.name, callback_data=f"cat_{c.id}")] for c in categories]
-        await query.message.reply_text("🛒 Choose a category:", reply_markup=InlineKeyboardMarkup(buttons))
+        categories = await sync_to_async(list)(Category.objects.using(replica_alias()).all())
+        text, markup = categories_view(categories, "🛒 Choose a category:")
+        await query.message.reply_text(text, reply_markup=markup)
         return
 
 
@@ -622,13 +1142,52 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     
     
-# ------------------ Startup ------------------
-def main():
-    if not BOT_TOKEN:
-        print("BOT_TOKEN not found in environment variables.")
-        return
+# ------------------ DB connection health ------------------
+async def db_health_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # The bot has no request cycle, so do what Django does per request: drop the
+    # persistent connection if it is broken or older than CONN_MAX_AGE.
+    # sync_to_async runs it on the same thread the ORM calls use.
+    await sync_to_async(close_old_connections)()
+
+
+
+
+
+# ------------------ Inline search ------------------
+# "@ourbot milk" in any chat (inline mode must be switched on with BotFather's /setinline).
+# Products whose image Telegram already has come back as photos (file_id, no upload).
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    inline_query = update.inline_query
+    products = await sync_to_async(search_products)(inline_query.query)
+
+    results = []
+    for product in products:
+        text = f"*{product['name']}*\nPrice: ${product['price']}"
+        markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🛒 Open in shop", url=f"https://t.me/{context.bot.username}?start=prod_{product['id']}")
+        ]])
+        if product["photo"]:
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(product["id"]), photo_file_id=product["photo"], title=product["name"],
+                description=product["description"], caption=text, parse_mode="Markdown", reply_markup=markup,
+            ))
+        else:
+            results.append(InlineQueryResultArticle(
+                id=str(product["id"]), title=product["name"],
+                description=f"${product['price']} · {product['description']}",
+                input_message_content=InputTextMessageContent(text, parse_mode="Markdown"), reply_markup=markup,
+            ))
+
+    await inline_query.answer(results, cache_time=30)
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+
+
+
+# ------------------ Startup ------------------
+def register_handlers(app):
+    """Attach the bot's handler set (shared by `python bot.py` and bot_worker.py)."""
+    # 0️⃣ runs before every update, in its own group so it never stops the others
+    app.add_handler(TypeHandler(Update, db_health_check), group=-1)
 
     # --- ConversationHandler for checkout ---
     conv_handler = ConversationHandler(
@@ -637,15 +1196,26 @@ def main():
             CallbackQueryHandler(checkout_start, pattern="^checkout_now$")
         ],
         states={
-            NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, checkout_name)],
+            PROFILE: [
+                CallbackQueryHandler(checkout_use_profile, pattern="^checkout_saved$"),
+                CallbackQueryHandler(checkout_new_details, pattern="^checkout_new$")
+            ],
+            NAME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, checkout_name),
+                MessageHandler(filters.CONTACT, checkout_contact)
+            ],
             PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, checkout_phone)],
-            ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checkout_address)],
+            ADDRESS: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, checkout_address),
+                MessageHandler(filters.LOCATION, checkout_location)
+            ],
             EMAIL: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, checkout_email),
                 CommandHandler("skip", skip_email)
             ],
+            SLOT: [CallbackQueryHandler(checkout_slot, pattern="^slot_")],
             CONFIRM: [
-                CallbackQueryHandler(checkout_confirm, pattern="^confirm_checkout$"),
+                CallbackQueryHandler(checkout_confirm, pattern="^confirm_checkout:"),
                 CallbackQueryHandler(checkout_cancel, pattern="^cancel_checkout$")
             ],
         },
@@ -660,13 +1230,26 @@ def main():
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("shop", shop))
     app.add_handler(CommandHandler("cart", cart_cmd))
+    app.add_handler(CommandHandler("orders", my_orders))
+    app.add_handler(InlineQueryHandler(inline_search))
 
     # 3️⃣ Callback buttons LAST
+    # a repeated "✅ Yes, proceed" arrives after the conversation ended -> same order + link again
+    app.add_handler(CallbackQueryHandler(checkout_confirm, pattern="^confirm_checkout:"))
     app.add_handler(CallbackQueryHandler(button_handler))
     
     # 4️⃣ Text fallback for random text LAST OF ALL
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, fallback_to_start))
 
+
+def main():
+    if not BOT_TOKEN:
+        print("BOT_TOKEN not found in environment variables.")
+        return
+
+    app = ApplicationBuilder().token(BOT_TOKEN).post_stop(drain_cart_taps).build()
+    register_handlers(app)
+
     print("🤖 Bot running...")
     app.run_polling()
 
@@ -0,0 +1,232 @@
+# bot_worker.py
+#  multi-process bot (instead of a single "python bot.py"):
+#    python bot_worker.py ingress   -> ONE process: long-polls Telegram and publishes updates to Redis
+#    python bot_worker.py worker    -> N processes (any host): each runs the bot handlers for its partitions
+#  instead of the ingress poller you can point Telegram's webhook at  /telegram/webhook/  (core/views.py)
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+
+import bot  # ✅ sets up Django and exposes register_handlers()
+from core.bot_stream import (
+    CONSUMER_GROUP, WORKERS_KEY, stream_key, lease_key, publish_update, assign_partitions,
+)
+from core.redis_client import get_redis
+from django.conf import settings
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+from telegram import Bot, Update
+from telegram.error import NetworkError
+from telegram.ext import ApplicationBuilder
+
+
+logger = logging.getLogger("bot_worker")
+
+
+# a worker that misses heartbeats for WORKER_TTL seconds is dropped from the ring,
+# its partition leases expire after LEASE_MS and are taken over by the new owners
+HEARTBEAT_INTERVAL = 3
+WORKER_TTL = 15
+LEASE_MS = 20000
+READ_COUNT = 20
+READ_BLOCK_MS = 1000
+
+
+# compare-and-renew / compare-and-delete, so a worker never touches a lease it lost
+RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+
+
+# ------------------ Ingress ------------------
+async def run_ingress():
+    client = get_redis()
+
+    async with Bot(bot.BOT_TOKEN) as tg:
+        await tg.delete_webhook()
+        offset = None
+        print("📥 Ingress polling Telegram...")
+
+        while True:
+            try:
+                updates = await tg.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+            except NetworkError as e:
+                logger.warning("get_updates failed: %s", e)
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                publish_update(client, update.to_dict())
+                # only move the offset once the update is safely in Redis
+                offset = update.update_id + 1
+
+
+
+
+# ------------------ Worker ------------------
+class PartitionWorker:
+    def __init__(self, app, client):
+        self.app = app
+        self.redis = client
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.owned = set()
+        self.renew_lease = client.register_script(RENEW_LEASE)
+        self.release_lease = client.register_script(RELEASE_LEASE)
+
+    async def keepalive(self):
+        """Heartbeat + lease renewal, independent of how long a batch takes to handle."""
+        while True:
+            now = time.time()
+            await self.redis.zadd(WORKERS_KEY, {self.worker_id: now})
+            await self.redis.zremrangebyscore(WORKERS_KEY, 0, now - WORKER_TTL)
+            for partition in list(self.owned):
+                await self.renew_lease(keys=[lease_key(partition)], args=[self.worker_id, LEASE_MS])
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def rebalance(self):
+        workers = await self.redis.zrange(WORKERS_KEY, 0, -1)
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        wanted = set(assign_partitions(workers).get(self.worker_id, []))
+
+        # hand back what moved to another worker (called between batches; buffered cart taps are
+        # applied first, the new owner must not see a chat's later taps before them)
+        if self.owned - wanted:
+            await bot.drain_cart_taps()
+        for partition in self.owned - wanted:
+            await self.release_lease(keys=[lease_key(partition)], args=[self.worker_id])
+            logger.info("released partition %s", partition)
+
+        owned = set()
+        for partition in wanted:
+            if partition in self.owned:
+                renewed = await self.renew_lease(keys=[lease_key(partition)], args=[self.worker_id, LEASE_MS])
+                if renewed:
+                    owned.add(partition)
+                continue
+
+            # the previous owner may still hold the lease until it notices / it expires
+            if await self.redis.set(lease_key(partition), self.worker_id, nx=True, px=LEASE_MS):
+                self.owned.add(partition)
+                await self.take_over(partition)
+                owned.add(partition)
+                logger.info("acquired partition %s", partition)
+
+        self.owned = owned
+
+    async def take_over(self, partition):
+        """Claim what the previous owner left un-acked and handle it before any new update."""
+        stream = stream_key(partition)
+        try:
+            await self.redis.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        cursor = "0-0"
+        while True:
+            result = await self.redis.xautoclaim(
+                stream, CONSUMER_GROUP, self.worker_id, min_idle_time=0, start_id=cursor, justid=True
+            )
+            cursor = result[0]
+            if cursor == "0-0":
+                break
+
+        while True:
+            result = await self.redis.xreadgroup(
+                CONSUMER_GROUP, self.worker_id, {stream: "0"}, count=READ_COUNT
+            )
+            entries = result[0][1] if result else []
+            if not entries:
+                break
+            await self.handle(stream, entries)
+
+    async def handle(self, stream, entries):
+        for entry_id, fields in entries:
+            # trimmed entries come back without fields
+            if fields:
+                try:
+                    update = Update.de_json(json.loads(fields["update"]), self.app.bot)
+                    await self.app.process_update(update)
+                except Exception as e:
+                    logger.exception("Failed to process update %s: %s", entry_id, e)
+            await self.redis.xack(stream, CONSUMER_GROUP, entry_id)
+
+    async def run(self):
+        keepalive = asyncio.create_task(self.keepalive())
+        print(f"🤖 Worker {self.worker_id} running...")
+
+        try:
+            while True:
+                await self.rebalance()
+                if not self.owned:
+                    await asyncio.sleep(HEARTBEAT_INTERVAL)
+                    continue
+
+                result = await self.redis.xreadgroup(
+                    CONSUMER_GROUP,
+                    self.worker_id,
+                    {stream_key(p): ">" for p in self.owned},
+                    count=READ_COUNT,
+                    block=READ_BLOCK_MS,
+                )
+                for stream, entries in result or []:
+                    await self.handle(stream, entries)
+        finally:
+            keepalive.cancel()
+            await bot.drain_cart_taps()
+            for partition in self.owned:
+                await self.release_lease(keys=[lease_key(partition)], args=[self.worker_id])
+            await self.redis.zrem(WORKERS_KEY, self.worker_id)
+
+
+async def run_worker():
+    app = ApplicationBuilder().token(bot.BOT_TOKEN).build()
+    bot.register_handlers(app)
+    client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    # initialize + start: post_init / job queue run, app.create_task() tracks the handlers' background
+    # tasks and app.stop() waits for them -> nothing buffered (e.g. cart taps) is lost on shutdown
+    async with app:
+        await app.start()
+        try:
+            await PartitionWorker(app, client).run()
+        finally:
+            await app.stop()
+
+
+
+
+# ------------------ Startup ------------------
+def main():
+    if not bot.BOT_TOKEN:
+        print("BOT_TOKEN not found in environment variables.")
+        return
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else ""
+    if mode == "ingress":
+        asyncio.run(run_ingress())
+    elif mode == "worker":
+        asyncio.run(run_worker())
+    else:
+        print("usage: python bot_worker.py [ingress|worker]")
+
+
+if __name__ == "__main__":
+    main()
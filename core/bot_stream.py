@@ -0,0 +1,100 @@
+# core/bot_stream.py
+"""
+Shared pieces of the multi-process bot deployment.
+
+    ingress (poller or webhook) --XADD--> bot:updates:<partition> --XREADGROUP--> worker
+
+- A chat is always hashed to the same partition, and a partition is owned by
+  exactly one live worker at a time, so updates of one chat are handled in order.
+- Partitions are spread over the live workers with rendezvous hashing, so when a
+  worker joins or leaves only the partitions it wins/loses move.
+
+This module must stay free of bot.py / telegram.ext imports (Django and Celery import it).
+"""
+import json
+import hashlib
+import zlib
+
+from django.conf import settings
+
+
+STREAM_PREFIX = "bot:updates"
+CONSUMER_GROUP = "bot-workers"
+WORKERS_KEY = "bot:workers"
+LEASE_PREFIX = "bot:partition-owner"
+
+# keep the streams bounded, entries are acked within seconds anyway
+STREAM_MAXLEN = 10000
+
+
+def stream_key(partition):
+    return f"{STREAM_PREFIX}:{partition}"
+
+
+def lease_key(partition):
+    return f"{LEASE_PREFIX}:{partition}"
+
+
+def partition_for(chat_id, partitions=None):
+    """Stable chat_id -> partition mapping (same result in every process)."""
+    partitions = partitions or settings.BOT_STREAM_PARTITIONS
+    return zlib.crc32(str(chat_id).encode()) % partitions
+
+
+def extract_chat_id(data):
+    """
+    Find the chat (or user, for chat-less updates like inline queries) a raw
+    Telegram update belongs to. Returns None when there is nothing to key on.
+    """
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if key in data:
+            return data[key]["chat"]["id"]
+
+    query = data.get("callback_query")
+    if query:
+        message = query.get("message")
+        if message:
+            return message["chat"]["id"]
+        return query["from"]["id"]
+
+    for key in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query"):
+        if key in data:
+            return data[key]["from"]["id"]
+
+    for key in ("my_chat_member", "chat_member", "chat_join_request"):
+        if key in data:
+            return data[key]["chat"]["id"]
+
+    return None
+
+
+def publish_update(client, data):
+    """Append a raw update (dict from Telegram) to its chat's partition stream."""
+    chat_id = extract_chat_id(data)
+    partition = partition_for(chat_id if chat_id is not None else data.get("update_id", 0))
+    client.xadd(
+        stream_key(partition),
+        {"update": json.dumps(data)},
+        maxlen=STREAM_MAXLEN,
+        approximate=True,
+    )
+    return partition
+
+
+def assign_partitions(workers, partitions=None):
+    """
+    Rendezvous (highest random weight) hashing: every partition goes to the
+    worker with the highest hash(worker, partition). Returns {worker: [partitions]}.
+    """
+    partitions = partitions or settings.BOT_STREAM_PARTITIONS
+    assignment = {worker: [] for worker in workers}
+    if not workers:
+        return assignment
+
+    for partition in range(partitions):
+        owner = max(
+            workers,
+            key=lambda worker: hashlib.md5(f"{worker}:{partition}".encode()).digest(),
+        )
+        assignment[owner].append(partition)
+    return assignment
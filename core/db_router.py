@@ -0,0 +1,46 @@
+# core/db_router.py
+"""
+Primary / replica routing.
+
+- every write (and every migration) goes to "default" = the primary
+- every read stays on the primary unless the caller asks for the replica with
+  `.using(replica_alias())`: catalog browsing / search, order history, order tracking,
+  delivery status. Write paths (stock counters, cart prices, validation, celery jobs)
+  never see replica lag.
+- rows younger than REPLICA_LAG_SECONDS may not have reached the replica yet: callers that
+  just wrote (e.g. /track right after checkout) read those from the primary
+
+Without a "replica" entry in DATABASES everything simply runs on "default".
+"""
+from django.conf import settings
+
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+# generous upper bound of the replication lag
+REPLICA_LAG_SECONDS = 5
+
+
+def replica_alias():
+    if REPLICA not in settings.DATABASES:
+        return PRIMARY
+    return REPLICA
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # related lookups follow the instance they start from
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,86 @@
+# core/mixins.py
+"""
+DirtyFieldsMixin -- for models that validate themselves on save (shop Product / Order / OrderItem).
+
+- remembers the column values as loaded from the DB (or as last saved / refreshed -- only the
+  columns actually written / reloaded, other in-memory edits stay dirty)
+- save() of an existing row validates and writes only the changed columns
+  (update_fields is derived), and does nothing at all when nothing changed
+- an explicit save(update_fields=[...]) validates just those fields
+- inside clean(), `self.validates("field")` tells whether that field is being saved
+- foreign keys whose object is already loaded are not re-fetched to validate them
+
+New rows are still validated and inserted in full.
+"""
+from django.db import models
+
+
+class DirtyFieldsMixin(models.Model):
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot = dict(zip(field_names, values))
+        return instance
+
+    def _take_snapshot(self, fields=None):
+        """Remember the current values of `fields` (names or attnames) as the DB state; every loaded field when None."""
+        if fields is None or not hasattr(self, "_snapshot"):
+            self._snapshot = {}
+        concrete = self._meta.concrete_fields
+        if fields is not None:
+            names = set(fields)
+            concrete = [field for field in concrete if field.name in names or field.attname in names]
+        self._snapshot.update({
+            field.attname: getattr(self, field.attname)
+            for field in concrete if field.attname in self.__dict__
+        })
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # reloaded columns match the DB again
+        self._take_snapshot(fields)
+
+    def get_dirty_fields(self):
+        """Names of the fields changed since load / last save; None for a row that isn't saved yet."""
+        if self._state.adding or not hasattr(self, "_snapshot"):
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            # deferred and never assigned -> not in __dict__ -> unchanged
+            if field.attname in self.__dict__
+            and (field.attname not in self._snapshot or getattr(self, field.attname) != self._snapshot[field.attname])
+        ]
+
+    def validates(self, name):
+        fields = getattr(self, "_validating", None)
+        return fields is None or name in fields
+
+    def clean_changed(self, fields=None):
+        """full_clean() restricted to `fields` (every field when None)."""
+        all_fields = {field.name for field in self._meta.concrete_fields}
+        checked = all_fields if fields is None else {self._meta.get_field(name).name for name in fields}
+        exclude = (all_fields - checked) | {
+            field.name for field in self._meta.concrete_fields if field.is_relation and field.is_cached(self)
+        }
+        self._validating = checked
+        try:
+            self.full_clean(exclude=exclude)
+        finally:
+            del self._validating
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                auto_now = [field.name for field in self._meta.concrete_fields if getattr(field, "auto_now", False)]
+                update_fields = kwargs["update_fields"] = dirty + [name for name in auto_now if name not in dirty]
+
+        self.clean_changed(update_fields)
+        super().save(*args, **kwargs)
+        self._take_snapshot(update_fields)
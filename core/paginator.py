@@ -0,0 +1,63 @@
+# core/paginator.py
+# Admin paginator for tables too big for COUNT(*) on every changelist page:
+#   - no filter / search -> the planner's row estimate (pg_class.reltuples, summed over partitions)
+#   - filter / search    -> exact COUNT(*) if it finishes within ADMIN_COUNT_TIMEOUT_MS, else the EXPLAIN estimate
+# Tables under ADMIN_ESTIMATE_THRESHOLD rows are always counted exactly.
+import json
+
+from django.core.paginator import Paginator
+from django.db import OperationalError, connections, transaction
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+ADMIN_ESTIMATE_THRESHOLD = 100_000
+ADMIN_COUNT_TIMEOUT_MS = 200
+
+TABLE_ESTIMATE_SQL = """
+SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+FROM pg_class c
+WHERE c.oid = %s::regclass
+   OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+"""
+
+
+
+
+def table_estimate(table, using):
+    with connections[using].cursor() as cursor:
+        cursor.execute(TABLE_ESTIMATE_SQL, [table, table])
+        return cursor.fetchone()[0]
+
+
+def explain_estimate(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        estimate = table_estimate(queryset.model._meta.db_table, queryset.db)
+        if estimate < ADMIN_ESTIMATE_THRESHOLD:
+            return super().count
+        if not queryset.query.where:
+            return estimate
+
+        with transaction.atomic(using=queryset.db):
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [ADMIN_COUNT_TIMEOUT_MS])
+            try:
+                with transaction.atomic(using=queryset.db):
+                    return queryset.count()
+            except OperationalError:
+                return explain_estimate(queryset)
@@ -0,0 +1,22 @@
+# core/redis_client.py
+import redis
+from django.conf import settings
+
+
+_client = None
+
+
+def get_redis():
+    """Return the process-wide Redis client (one connection pool per process)."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def redis_available():
+    """True when the Redis server answers (the tests that need one are skipped otherwise)."""
+    try:
+        return bool(get_redis().ping())
+    except redis.exceptions.RedisError:
+        return False
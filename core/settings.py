@@ -14,6 +14,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 from environs import Env
+from celery.schedules import crontab
 
 # 🔥 **مكتبة environs تعتمد داخليًا على مكتبة python-dotenv
 #  لهذا يجب تنزيل المكتبتين 
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # full-text / trigram lookups (shop.services.search_service)
+    'django.contrib.postgres',
     # shop - app 
     "shop.apps.ShopConfig",
     # payment - app 
@@ -109,9 +112,23 @@ DATABASES = {
         "PASSWORD": env("POSTGRES_PASSWORD"),
         "HOST": env("POSTGRES_HOST", "localhost"),
         "PORT": env("POSTGRES_PORT", "5432"),
+        # persistent per-process connections (bot, web, celery workers), re-checked before reuse
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", 300),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# READ REPLICA (optional) -- catalog / order history / tracking reads, see core/db_router.py
+if env("POSTGRES_REPLICA_HOST", None):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": env("POSTGRES_REPLICA_HOST"),
+        "PORT": env("POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.db_router.PrimaryReplicaRouter"]
+
 # print("DATABASES=",DATABASES)
 
 
@@ -210,6 +227,149 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
 
+# REDIS -- shared by the bot workers and the app-level caches/counters
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+# BOT WORKERS -- multi-process mode, see bot_worker.py
+# updates are hashed by chat_id into this many Redis streams (changing it remaps chats, drain the streams first)
+BOT_STREAM_PARTITIONS = int(os.getenv("BOT_STREAM_PARTITIONS", 32))
+# secret_token given to Telegram's setWebhook, checked by /telegram/webhook/ (unset -> the webhook refuses every request)
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+
+
+# DELIVERY TRACKING -- at most one edit of a customer's pinned tracking message per N seconds
+DELIVERY_TRACKING_MIN_INTERVAL = int(os.getenv("DELIVERY_TRACKING_MIN_INTERVAL", 10))
+
+
+# COURIER LOCATIONS -- POST /delivery/locations/ with header "X-Courier-Token" = the courier's own token
+# (Courier admin -> "Issue API token"); COURIER_API_TOKEN is the dispatcher token for GET /delivery/<id>/route/
+COURIER_API_TOKEN = os.getenv("COURIER_API_TOKEN")
+# buffered pings are written to Postgres every N seconds (latest ping per delivery only)
+LOCATION_FLUSH_INTERVAL = int(os.getenv("LOCATION_FLUSH_INTERVAL", 5))
+# route history (DeliveryRoute): appended every N seconds, thinned to one point per
+# ROUTE_DOWNSAMPLE_SECONDS after ROUTE_DOWNSAMPLE_AFTER_DAYS, deleted after ROUTE_RETENTION_DAYS
+LOCATION_HISTORY_FLUSH_INTERVAL = int(os.getenv("LOCATION_HISTORY_FLUSH_INTERVAL", 30))
+ROUTE_DOWNSAMPLE_AFTER_DAYS = int(os.getenv("ROUTE_DOWNSAMPLE_AFTER_DAYS", 7))
+ROUTE_DOWNSAMPLE_SECONDS = int(os.getenv("ROUTE_DOWNSAMPLE_SECONDS", 60))
+ROUTE_RETENTION_DAYS = int(os.getenv("ROUTE_RETENTION_DAYS", 90))
+
+
+# COURIER ASSIGNMENT -- delivery.tasks.assign_couriers_task, every minute
+# new deliveries start at the warehouse; couriers further away than COURIER_MAX_DISTANCE_KM are never picked
+WAREHOUSE_LATITUDE = env.float("WAREHOUSE_LATITUDE", None)
+WAREHOUSE_LONGITUDE = env.float("WAREHOUSE_LONGITUDE", None)
+COURIER_MAX_DISTANCE_KM = env.float("COURIER_MAX_DISTANCE_KM", 15.0)
+
+
+# ETA MODEL -- refit daily from the last ETA_TRAINING_DAYS of deliveries,
+# each process re-reads the fitted parameters at most every ETA_MODEL_RELOAD_SECONDS
+ETA_TRAINING_DAYS = int(os.getenv("ETA_TRAINING_DAYS", 90))
+ETA_MODEL_RELOAD_SECONDS = int(os.getenv("ETA_MODEL_RELOAD_SECONDS", 600))
+
+
+# DELIVERY ZONES -- checkout only accepts points inside an active DeliveryZone (none configured = everywhere)
+# zones are rasterized into DELIVERY_ZONE_CELL_DEG cells (~500 m); processes notice zone edits within ZONE_INDEX_CHECK_SECONDS
+DELIVERY_ZONE_CELL_DEG = env.float("DELIVERY_ZONE_CELL_DEG", 0.005)
+ZONE_INDEX_CHECK_SECONDS = int(os.getenv("ZONE_INDEX_CHECK_SECONDS", 30))
+
+
+# DELIVERY SLOTS -- checkout offers the slots of the next SLOT_BOOKING_DAYS days that start at least
+# SLOT_BOOKING_LEAD_MINUTES from now; live capacity is in Redis, copied to Postgres every SLOT_RECONCILE_INTERVAL seconds
+SLOT_BOOKING_DAYS = int(os.getenv("SLOT_BOOKING_DAYS", 2))
+SLOT_BOOKING_LEAD_MINUTES = int(os.getenv("SLOT_BOOKING_LEAD_MINUTES", 60))
+SLOT_RECONCILE_INTERVAL = int(os.getenv("SLOT_RECONCILE_INTERVAL", 300))
+
+
+# STOCK RESERVATIONS -- checkout holds stock for STOCK_RESERVATION_MINUTES; the Stripe session expires with the
+# reservation (Stripe's minimum session lifetime is 30 minutes, the reservation is stretched to match),
+# paid reservations are subtracted from Product.stock in one batch every STOCK_FLUSH_INTERVAL seconds
+STOCK_RESERVATION_MINUTES = int(os.getenv("STOCK_RESERVATION_MINUTES", 30))
+STOCK_FLUSH_INTERVAL = int(os.getenv("STOCK_FLUSH_INTERVAL", 10))
+
+
+# CART COMPACTION -- shop.tasks.compact_carts_task, daily: empty carts idle for CART_EMPTY_GRACE_HOURS and
+# checked-out carts older than CART_INACTIVE_DAYS are deleted, carts idle for CART_ABANDONED_DAYS are archived
+CART_EMPTY_GRACE_HOURS = int(os.getenv("CART_EMPTY_GRACE_HOURS", 24))
+CART_INACTIVE_DAYS = int(os.getenv("CART_INACTIVE_DAYS", 7))
+CART_ABANDONED_DAYS = int(os.getenv("CART_ABANDONED_DAYS", 30))
+
+
+# CHECKOUT CONFIRMATIONS -- double-tap guard rows (shop.CheckoutConfirmation), purged daily once older than
+# CHECKOUT_CONFIRMATION_DAYS (by then the order is paid or its reservation long expired)
+CHECKOUT_CONFIRMATION_DAYS = int(os.getenv("CHECKOUT_CONFIRMATION_DAYS", 2))
+
+
+# CUSTOMER PROFILES -- saved checkout details per chat, cached in Redis for CUSTOMER_PROFILE_CACHE_SECONDS
+CUSTOMER_PROFILE_CACHE_SECONDS = int(os.getenv("CUSTOMER_PROFILE_CACHE_SECONDS", 7 * 24 * 3600))
+
+
+# ORDER PARTITIONS -- shop_order / shop_orderitem are partitioned by month; ORDER_PARTITIONS_AHEAD future
+# months are created daily, "manage.py order_partitions --archive" moves months older than
+# ORDER_PARTITION_KEEP_MONTHS into the ORDER_ARCHIVE_SCHEMA schema
+ORDER_PARTITIONS_AHEAD = int(os.getenv("ORDER_PARTITIONS_AHEAD", 3))
+ORDER_PARTITION_KEEP_MONTHS = int(os.getenv("ORDER_PARTITION_KEEP_MONTHS", 24))
+ORDER_ARCHIVE_SCHEMA = os.getenv("ORDER_ARCHIVE_SCHEMA", "archive")
+
+
+# BULK NOTIFICATIONS -- admin bulk status changes message customers at most TELEGRAM_BULK_RATE per second
+# (Telegram allows ~30/s per bot)
+TELEGRAM_BULK_RATE = env.float("TELEGRAM_BULK_RATE", 25.0)
+
+
+# CELERY BEAT -- periodic jobs, in terminal use "celery -A core beat -l info"
+CELERY_BEAT_SCHEDULE = {
+    "flush-courier-location-pings": {
+        "task": "delivery.tasks.flush_location_pings_task",
+        "schedule": LOCATION_FLUSH_INTERVAL,
+    },
+    "flush-courier-location-history": {
+        "task": "delivery.tasks.flush_location_history_task",
+        "schedule": LOCATION_HISTORY_FLUSH_INTERVAL,
+    },
+    "assign-couriers": {
+        "task": "delivery.tasks.assign_couriers_task",
+        "schedule": 60,
+    },
+    "fit-eta-model": {
+        "task": "delivery.tasks.fit_eta_model_task",
+        "schedule": crontab(hour=2, minute=30),
+    },
+    "reconcile-delivery-slots": {
+        "task": "delivery.tasks.reconcile_slot_counters_task",
+        "schedule": SLOT_RECONCILE_INTERVAL,
+    },
+    "apply-paid-stock-reservations": {
+        "task": "shop.tasks.apply_paid_reservations_task",
+        "schedule": STOCK_FLUSH_INTERVAL,
+    },
+    "release-expired-stock-reservations": {
+        "task": "shop.tasks.release_expired_reservations_task",
+        "schedule": 60,
+    },
+    "ensure-order-partitions": {
+        "task": "shop.tasks.ensure_order_partitions_task",
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "compact-carts": {
+        "task": "shop.tasks.compact_carts_task",
+        "schedule": crontab(hour=4, minute=0),
+    },
+    "purge-checkout-confirmations": {
+        "task": "shop.tasks.purge_checkout_confirmations_task",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    "reconcile-cart-totals": {
+        "task": "shop.tasks.reconcile_cart_totals_task",
+        "schedule": crontab(minute=15),
+    },
+    "compact-courier-location-history": {
+        "task": "delivery.tasks.compact_location_history_task",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
+
+
 # ADMIN/MERCHANT chat_id 
 """async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat.id
@@ -18,11 +18,14 @@ from django.contrib import admin
 from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import telegram_webhook
 
 
 urlpatterns = [ 
     path('admin/', admin.site.urls),
     path("payment/", include("payment.urls", namespace='payment')),
+    path("delivery/", include("delivery.urls", namespace='delivery')),
+    path("telegram/webhook/", telegram_webhook, name="telegram-webhook"),
     
     
     
@@ -0,0 +1,9 @@
+# core/validators.py
+# Input patterns shared by the bot (checkout steps), the models (clean) and the API serializers.
+# Compiled once at import.
+import re
+
+
+NAME_REGEX = re.compile(r"^[A-Za-z\s]{2,}$")
+PHONE_REGEX = re.compile(r"^\+?\d{7,15}$")
+EMAIL_REGEX = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
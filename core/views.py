@@ -0,0 +1,31 @@
+# core/views.py
+import hmac
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from core.bot_stream import publish_update
+from core.redis_client import get_redis
+
+
+
+# ------------------ TELEGRAM WEBHOOK (ingress for bot_worker.py) ------------------
+@require_POST
+@csrf_exempt
+def telegram_webhook(request):
+    # no secret configured -> refuse everything, otherwise anyone could post updates for any chat
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not hmac.compare_digest(token.encode(), secret.encode()):
+        return HttpResponseForbidden("Invalid secret token")
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid JSON payload")
+
+    publish_update(get_redis(), data)
+    return HttpResponse(status=200)
@@ -1,8 +1,56 @@
-from django.contrib import admin
-from .models import Delivery
+from django.contrib import admin, messages
+from core.paginator import EstimatedCountPaginator
+from .models import Courier, Delivery, DeliverySlot, DeliveryZone, GeocodeCache
+from .services.location_service import issue_courier_token
 
 @admin.register(Delivery)
 class DeliveryAdmin(admin.ModelAdmin):
-    list_display = ("order", "status", "current_location", "eta", "updated_at")
+    list_display = ("order", "status", "courier", "current_location", "eta", "updated_at")
+    list_select_related = ("order", "courier")
     list_filter = ("status",)
     search_fields = ("order__id",)
+    # no <select> with every order / courier on the change page
+    raw_id_fields = ("order", "courier")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # an order number -> index lookup instead of ILIKE over the id cast to text
+        term = search_term.strip().lstrip("#")
+        if term.isdigit():
+            return queryset.filter(order_id=int(term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(Courier)
+class CourierAdmin(admin.ModelAdmin):
+    list_display = ("name", "phone", "is_available", "max_active_deliveries")
+    list_filter = ("is_available",)
+    search_fields = ("name", "phone")
+    actions = ["issue_api_token"]
+
+    @admin.action(description="Issue API token (replaces the old one)")
+    def issue_api_token(self, request, queryset):
+        # shown once: only the hash is stored
+        for courier in queryset:
+            token = issue_courier_token(courier)
+            self.message_user(request, f"{courier.name}: {token}", messages.WARNING)
+
+
+@admin.register(DeliveryZone)
+class DeliveryZoneAdmin(admin.ModelAdmin):
+    list_display = ("name", "is_active")
+    list_filter = ("is_active",)
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ("query", "latitude", "longitude", "created_at")
+    search_fields = ("query",)
+
+
+@admin.register(DeliverySlot)
+class DeliverySlotAdmin(admin.ModelAdmin):
+    list_display = ("date", "start_time", "end_time", "capacity", "booked", "is_active")
+    list_filter = ("is_active", "date")
+    readonly_fields = ("booked",)
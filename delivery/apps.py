@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class DeliveryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'delivery'
+
+    def ready(self):
+        # import signals
+        try:
+            import delivery.signals  # noqa: F401
+        except Exception as e:
+            print("Error importing delivery.signals:", e)
@@ -0,0 +1,46 @@
+# delivery/management/commands/bench_assignment.py
+#  in terminal use "python manage.py bench_assignment --deliveries 5000 --couriers 1000"
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from delivery.services.assignment_service import distance_matrix_km, solve_assignment
+
+
+class Command(BaseCommand):
+    help = "Benchmark the courier assignment engine on random deliveries/couriers (no database needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--deliveries", type=int, default=5000)
+        parser.add_argument("--couriers", type=int, default=1000)
+        parser.add_argument("--capacity", type=int, default=3)
+        parser.add_argument("--max-distance", type=float, default=15.0)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        # a ~40 x 40 km city
+        center_lat, center_lng, spread = 24.71, 46.67, 0.18
+        d_lat = center_lat + rng.uniform(-spread, spread, options["deliveries"])
+        d_lng = center_lng + rng.uniform(-spread, spread, options["deliveries"])
+        c_lat = center_lat + rng.uniform(-spread, spread, options["couriers"])
+        c_lng = center_lng + rng.uniform(-spread, spread, options["couriers"])
+        capacity = np.full(options["couriers"], options["capacity"])
+
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            distances = distance_matrix_km(d_lat, d_lng, c_lat, c_lng)
+            assignment = solve_assignment(distances, capacity, options["max_distance"])
+            timings.append(time.perf_counter() - started)
+
+        assigned = assignment >= 0
+        mean_km = distances[np.flatnonzero(assigned), assignment[assigned]].mean() if assigned.any() else 0
+        self.stdout.write(
+            f"{options['deliveries']} deliveries x {options['couriers']} couriers "
+            f"(capacity {options['capacity']}): assigned {assigned.sum()}, mean distance {mean_km:.2f} km\n"
+            f"best {min(timings) * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms "
+            f"over {options['repeat']} runs"
+        )
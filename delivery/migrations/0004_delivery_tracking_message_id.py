@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0003_rename_estimated_delivery_time_delivery_eta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='tracking_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
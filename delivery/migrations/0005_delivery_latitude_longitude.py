@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0004_delivery_tracking_message_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='location_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:38
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0005_delivery_latitude_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('times', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('lats', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('lngs', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None)),
+                ('downsampled', models.BooleanField(default=False)),
+                ('delivery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='delivery.delivery')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['day'], name='delivery_route_day_brin')],
+                'constraints': [models.UniqueConstraint(fields=('delivery', 'day'), name='unique_delivery_route_day')],
+            },
+        ),
+    ]
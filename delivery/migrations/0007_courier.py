@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0006_deliveryroute'),
+        ('shop', '0005_order_item_count_order_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Courier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('phone', models.CharField(blank=True, max_length=40)),
+                ('chat_id', models.BigIntegerField(blank=True, help_text='Telegram chat for assignment notices', null=True)),
+                ('is_available', models.BooleanField(default=True)),
+                ('max_active_deliveries', models.PositiveIntegerField(default=3)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='assigned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='courier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='delivery.courier'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('courier__isnull', True)), fields=['status'], name='delivery_unassigned_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+def backfill_delivered_at(apps, schema_editor):
+    # best guess for old rows: the last change of a delivered delivery is its delivery
+    Delivery = apps.get_model("delivery", "Delivery")
+    Delivery.objects.filter(status="delivered", delivered_at__isnull=True).update(delivered_at=models.F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0007_courier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtaModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fitted_at', models.DateTimeField(auto_now_add=True)),
+                ('samples', models.PositiveIntegerField()),
+                ('params', models.JSONField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_delivered_at, migrations.RunPython.noop),
+    ]
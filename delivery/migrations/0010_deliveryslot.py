@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0009_deliveryzone_geocodecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliverySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('capacity', models.PositiveIntegerField(default=20)),
+                ('booked', models.PositiveIntegerField(default=0, editable=False)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['date', 'start_time'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'start_time'), name='delivery_slot_unique_start')],
+            },
+        ),
+    ]
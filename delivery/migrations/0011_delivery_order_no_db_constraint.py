@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0010_deliveryslot'),
+        ('shop', '0009_cart_updated_at_cartarchive'),
+    ]
+
+    operations = [
+        # shop_order becomes a partitioned table (shop 0010): its primary key is (id, created_at),
+        # so Postgres cannot enforce a foreign key on order_id alone
+        migrations.AlterField(
+            model_name='delivery',
+            name='order',
+            field=models.OneToOneField(db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='shop.order'),
+        ),
+    ]
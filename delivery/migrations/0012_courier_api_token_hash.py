@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0011_delivery_order_no_db_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='api_token_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
@@ -1,7 +1,29 @@
 from django.db import models
+from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex
 from shop.models import Order
 
 
+class Courier(models.Model):
+    name = models.CharField(max_length=200)
+    phone = models.CharField(max_length=40, blank=True)
+    chat_id = models.BigIntegerField(blank=True, null=True, help_text="Telegram chat for assignment notices")
+    is_available = models.BooleanField(default=True)
+    # how many not-yet-delivered deliveries the courier can carry at once
+    max_active_deliveries = models.PositiveIntegerField(default=3)
+    # last known position (updated from the pings of the courier's deliveries)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    # sha256 of the courier's own API token (X-Courier-Token of the location pings), see the admin action
+    api_token_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+
+    def __str__(self):
+        return self.name
+
+
+
 # eta - estimated_delivery_time
 class Delivery(models.Model):
     STATUS_CHOICES = [
@@ -10,11 +32,134 @@ class Delivery(models.Model):
         ("on_the_way", "On the Way"),
         ("delivered", "Delivered")
     ]
-    order = models.OneToOneField(Order, on_delete=models.CASCADE,null=True)
+    # shop_order is partitioned -> no database-level FK (see shop/models.py)
+    order = models.OneToOneField(Order, on_delete=models.CASCADE,null=True, db_constraint=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="preparing",null=True)
     current_location = models.CharField(max_length=255, blank=True,null=True)
     eta = models.CharField(max_length=100, blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True,null=True)
+    # last courier position, written in batches by the location flusher (delivery/tasks.py)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    location_updated_at = models.DateTimeField(blank=True, null=True)
+    # training data of the ETA model (delivery/services/eta_service.py)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    # set by the assignment engine (delivery/services/assignment_service.py)
+    courier = models.ForeignKey(Courier, on_delete=models.SET_NULL, null=True, blank=True, related_name="deliveries")
+    assigned_at = models.DateTimeField(blank=True, null=True)
+    # the customer's pinned status message, edited in place on every change
+    tracking_message_id = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # the assignment engine's "open and unassigned" scan
+            models.Index(fields=["status"], condition=models.Q(courier__isnull=True), name="delivery_unassigned_idx"),
+        ]
+
+    def __str__(self):
+        # order_id: no query, and the order may have been archived (shop/services/partition_service.py)
+        return f"Delivery for Order #{self.order_id} - {self.status}"
+
+    def save(self, *args, **kwargs):
+        if self.status == "delivered" and not self.delivered_at:
+            self.delivered_at = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "delivered_at"}
+        super().save(*args, **kwargs)
+
+
+
+# Courier track history: one append-only row per delivery per UTC day.
+# Points are parallel int4 arrays (12 bytes a point): seconds since midnight and micro-degrees.
+# Old days are downsampled and expired by delivery.tasks.compact_location_history_task.
+class DeliveryRoute(models.Model):
+    delivery = models.ForeignKey(Delivery, on_delete=models.CASCADE, related_name="routes")
+    day = models.DateField()
+    times = ArrayField(models.IntegerField(), default=list)
+    lats = ArrayField(models.IntegerField(), default=list)
+    lngs = ArrayField(models.IntegerField(), default=list)
+    downsampled = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["delivery", "day"], name="unique_delivery_route_day"),
+        ]
+        indexes = [
+            # rows arrive in day order -> a tiny BRIN index serves the compaction scans
+            BrinIndex(fields=["day"], name="delivery_route_day_brin"),
+        ]
+
+    def __str__(self):
+        return f"Route of Delivery #{self.delivery_id} on {self.day} ({len(self.times)} points)"
+
+
+
+# Fitted ETA parameters -- the newest row is the live model (refit daily by celery beat)
+class EtaModel(models.Model):
+    fitted_at = models.DateTimeField(auto_now_add=True)
+    samples = models.PositiveIntegerField()
+    params = models.JSONField()
 
     def __str__(self):
-        return f"Delivery for Order #{self.order.id} - {self.status}"
\ No newline at end of file
+        return f"ETA model {self.fitted_at:%Y-%m-%d %H:%M} ({self.samples} deliveries)"
+
+
+
+# Where we deliver. Checked at checkout through an in-memory grid index (delivery/services/zone_service.py)
+class DeliveryZone(models.Model):
+    name = models.CharField(max_length=100)
+    # [[lat, lng], [lat, lng], ...] -- the ring is closed automatically
+    polygon = models.JSONField(help_text='Vertices as [[lat, lng], ...], at least 3')
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        points = self.polygon
+        if not isinstance(points, list) or len(points) < 3:
+            raise ValidationError({"polygon": "A zone needs at least 3 vertices."})
+        for point in points:
+            if (
+                not isinstance(point, (list, tuple)) or len(point) != 2
+                or not all(isinstance(v, (int, float)) for v in point)
+                or not -90 <= point[0] <= 90 or not -180 <= point[1] <= 180
+            ):
+                raise ValidationError({"polygon": f"Invalid vertex {point!r}, expected [lat, lng]."})
+
+
+
+# Local address -> coordinates cache used by the checkout zone check (no geocoding API call in the chat)
+class GeocodeCache(models.Model):
+    query = models.CharField(max_length=255, unique=True, help_text="Normalized address (lowercase, single spaces)")
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.query
+
+
+
+# Delivery time window picked at checkout. Live capacity is a Redis counter
+# (delivery/services/slot_service.py); `booked` is its periodic copy in Postgres.
+class DeliverySlot(models.Model):
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    capacity = models.PositiveIntegerField(default=20)
+    booked = models.PositiveIntegerField(default=0, editable=False)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["date", "start_time"]
+        constraints = [
+            models.UniqueConstraint(fields=["date", "start_time"], name="delivery_slot_unique_start"),
+        ]
+
+    def __str__(self):
+        return f"{self.date:%a %d %b} {self.start_time:%H:%M}–{self.end_time:%H:%M}"
+
+    def clean(self):
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError({"end_time": "End time must be after start time."})
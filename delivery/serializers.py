@@ -7,3 +7,12 @@ class DeliverySerializer(serializers.ModelSerializer):
     class Meta:
         model = Delivery
         fields = ["order_id", "status", "current_location", "eta", "updated_at"]
+
+
+# one courier location ping (POST /delivery/locations/ accepts a list of them)
+class LocationPingSerializer(serializers.Serializer):
+    delivery_id = serializers.IntegerField(min_value=1)
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+    location = serializers.CharField(max_length=255, required=False, allow_blank=True)
@@ -0,0 +1,140 @@
+# delivery/services/assignment_service.py
+# Batch courier assignment: every open, unassigned delivery gets the nearest courier with free capacity.
+#   1. distances  -> one NumPy distance matrix (deliveries x couriers), equirectangular approximation
+#                    (not haversine): off by < 0.3% up to 50 km at latitudes up to 60°, far less within a city
+#   2. candidates -> the k nearest couriers per delivery (argpartition)
+#   3. greedy     -> shortest candidate pairs first, while the courier has capacity
+#   (deliveries whose k nearest all filled up are retried against the remaining couriers)
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from delivery.models import Courier, Delivery
+
+
+EARTH_RADIUS_KM = 6371.0
+CANDIDATES_PER_DELIVERY = 8
+
+# deliveries still waiting for a courier
+OPEN_STATUSES = ("preparing",)
+
+
+
+
+def distance_matrix_km(d_lat, d_lng, c_lat, c_lng):
+    """
+    Distances in km, shape (len(deliveries), len(couriers)); inputs in degrees.
+    Equirectangular approximation: within a city it is off by far less than a street
+    block and costs no trigonometry per pair.
+    """
+    # float32 halves the memory traffic of the (n x m) matrix; metres of precision are plenty
+    d_lat, d_lng, c_lat, c_lng = (np.radians(np.asarray(a, dtype=np.float32)) for a in (d_lat, d_lng, c_lat, c_lng))
+    dlat = d_lat[:, None] - c_lat[None, :]
+    dlng = d_lng[:, None] - c_lng[None, :]
+    dlng *= np.cos(d_lat)[:, None]
+    distances = np.hypot(dlat, dlng, out=dlat)
+    distances *= np.float32(EARTH_RADIUS_KM)
+    return distances
+
+
+def solve_assignment(distances, capacity, max_distance_km=None):
+    """
+    distances: (n_deliveries, n_couriers) km, capacity: free slots per courier.
+    Returns an int array: courier column per delivery, -1 when none is in range / free.
+    """
+    n_deliveries, n_couriers = distances.shape
+    assignment = np.full(n_deliveries, -1, dtype=np.int64)
+    if n_deliveries == 0 or n_couriers == 0:
+        return assignment
+
+    cost = np.array(distances, dtype=np.float32)
+    if max_distance_km is not None:
+        cost[cost > max_distance_km] = np.inf
+    free = np.asarray(capacity, dtype=np.int64).copy()
+    cost[:, free <= 0] = np.inf
+
+    pending = np.arange(n_deliveries)
+    k = min(CANDIDATES_PER_DELIVERY, n_couriers)
+    while pending.size and (free > 0).any():
+        sub = cost[pending]
+        if k < n_couriers:
+            candidates = np.argpartition(sub, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(n_couriers), (pending.size, n_couriers))
+        rows = np.repeat(pending, k)
+        cols = candidates.ravel()
+        pair_cost = cost[rows, cols]
+
+        in_range = np.isfinite(pair_cost)
+        rows, cols, pair_cost = rows[in_range], cols[in_range], pair_cost[in_range]
+        if not rows.size:
+            break
+
+        # greedy: the globally shortest pairs win
+        slots = int(free.sum())
+        order = np.argsort(pair_cost, kind="stable")
+        for delivery, courier in zip(rows[order].tolist(), cols[order].tolist()):
+            if assignment[delivery] == -1 and free[courier] > 0:
+                assignment[delivery] = courier
+                free[courier] -= 1
+                slots -= 1
+                if not slots:
+                    break
+
+        # full couriers drop out; losers retry against the next-nearest free couriers
+        cost[:, np.unique(cols[free[cols] <= 0])] = np.inf
+        pending = pending[assignment[pending] == -1]
+        if pending.size:
+            pending = pending[np.isfinite(cost[pending]).any(axis=1)]
+
+    return assignment
+
+
+
+
+def assign_pending_deliveries():
+    """
+    Assign all open, unassigned deliveries in one transaction. Rows another worker (or the
+    admin) is touching are skipped and picked up on the next run. Returns {courier: [delivery, ...]}.
+    """
+    with transaction.atomic():
+        deliveries = list(
+            Delivery.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(courier__isnull=True, status__in=OPEN_STATUSES,
+                    latitude__isnull=False, longitude__isnull=False)
+            .only("id", "latitude", "longitude", "order_id")
+        )
+        if not deliveries:
+            return {}
+
+        couriers = list(
+            Courier.objects.filter(is_available=True, latitude__isnull=False, longitude__isnull=False)
+            .annotate(active=Count("deliveries", filter=~Q(deliveries__status="delivered")))
+        )
+        if not couriers:
+            return {}
+
+        distances = distance_matrix_km(
+            [d.latitude for d in deliveries], [d.longitude for d in deliveries],
+            [c.latitude for c in couriers], [c.longitude for c in couriers],
+        )
+        capacity = [max(c.max_active_deliveries - c.active, 0) for c in couriers]
+        assignment = solve_assignment(distances, capacity, settings.COURIER_MAX_DISTANCE_KM)
+
+        now = timezone.now()
+        assigned = {}
+        changed = []
+        for delivery, column in zip(deliveries, assignment):
+            if column < 0:
+                continue
+            courier = couriers[column]
+            delivery.courier_id = courier.id
+            delivery.assigned_at = now
+            changed.append(delivery)
+            assigned.setdefault(courier, []).append(delivery)
+
+        Delivery.objects.bulk_update(changed, ["courier", "assigned_at"], batch_size=500)
+
+    return assigned
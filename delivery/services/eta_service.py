@@ -0,0 +1,106 @@
+# delivery/services/eta_service.py
+# Data-driven ETA: minutes from order creation to delivery, predicted from
+#   hour of day (one-hot) + day of week (one-hot) + number of items
+# Fitted offline (ridge regression over the delivered-order history, fit_eta_model),
+# kept in process memory so a track_ tap never pays a query for it.
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from delivery.models import Delivery, EtaModel
+
+
+MIN_TRAINING_SAMPLES = 30
+RIDGE_LAMBDA = 1.0
+# one-hot hour (24) + one-hot weekday (7) + item_count
+N_FEATURES = 24 + 7 + 1
+
+_cache = {"params": None, "loaded_at": 0.0}
+
+
+
+
+def build_features(created_ts, item_counts):
+    """Design matrix from unix timestamps (UTC) and item counts -- no Python loop per row."""
+    created_ts = np.asarray(created_ts, dtype=np.int64)
+    n = created_ts.size
+    rows = np.arange(n)
+    features = np.zeros((n, N_FEATURES), dtype=np.float64)
+    features[rows, (created_ts // 3600) % 24] = 1.0
+    # 1970-01-01 was a Thursday (weekday 3)
+    features[rows, 24 + (created_ts // 86400 + 3) % 7] = 1.0
+    features[:, 31] = np.asarray(item_counts, dtype=np.float64)
+    return features
+
+
+def fit_eta_model():
+    """Fit on the last ETA_TRAINING_DAYS of delivered orders and store a new EtaModel row (or None)."""
+    since = timezone.now() - timedelta(days=settings.ETA_TRAINING_DAYS)
+    history = list(
+        Delivery.objects.filter(delivered_at__gte=since, order__isnull=False)
+        .values_list("order__created_at", "delivered_at", "order__item_count")
+    )
+    if len(history) < MIN_TRAINING_SAMPLES:
+        return None
+
+    created_ts = np.array([created.timestamp() for created, _, _ in history], dtype=np.int64)
+    delivered_ts = np.array([delivered.timestamp() for _, delivered, _ in history], dtype=np.int64)
+    item_counts = np.array([count for _, _, count in history], dtype=np.float64)
+    minutes = (delivered_ts - created_ts) / 60.0
+
+    # drop clock mistakes and orders that sat for days (they are not what the customer waits for)
+    keep = (minutes > 0) & (minutes <= np.percentile(minutes, 99))
+    if keep.sum() < MIN_TRAINING_SAMPLES:
+        return None
+    X = build_features(created_ts[keep], item_counts[keep])
+    y = minutes[keep]
+
+    # ridge regression around the mean: (X'X + λI) w = X'(y - mean)
+    intercept = y.mean()
+    weights = np.linalg.solve(X.T @ X + RIDGE_LAMBDA * np.eye(N_FEATURES), X.T @ (y - intercept))
+    residuals = y - intercept - X @ weights
+
+    params = {
+        "intercept": float(intercept),
+        "hour": weights[:24].tolist(),
+        "weekday": weights[24:31].tolist(),
+        "item_count": float(weights[31]),
+        "mae_minutes": float(np.abs(residuals).mean()),
+    }
+    return EtaModel.objects.create(samples=int(keep.sum()), params=params)
+
+
+
+
+def get_eta_params():
+    """Live model parameters from process memory; re-read at most every ETA_MODEL_RELOAD_SECONDS."""
+    now = time.monotonic()
+    if now - _cache["loaded_at"] > settings.ETA_MODEL_RELOAD_SECONDS:
+        latest = EtaModel.objects.order_by("-fitted_at").only("params").first()
+        _cache["params"] = latest.params if latest else None
+        _cache["loaded_at"] = now
+    return _cache["params"]
+
+
+def predict_minutes(params, created_at, item_count):
+    hour = int(created_at.timestamp() // 3600) % 24
+    weekday = (int(created_at.timestamp() // 86400) + 3) % 7
+    minutes = params["intercept"] + params["hour"][hour] + params["weekday"][weekday]
+    minutes += params["item_count"] * item_count
+    return max(minutes, 1.0)
+
+
+def estimate_eta_text(delivery, params):
+    """ETA line for a delivery loaded with its order (no query); None if it cannot be estimated."""
+    if not params or not delivery.order_id or delivery.status == "delivered":
+        return None
+
+    order = delivery.order
+    eta = order.created_at + timedelta(minutes=predict_minutes(params, order.created_at, order.item_count))
+    remaining = (eta - timezone.now()).total_seconds() / 60
+    if remaining < 1:
+        return "any minute now"
+    return f"~{timezone.localtime(eta):%H:%M} (in about {round(remaining)} min)"
@@ -0,0 +1,143 @@
+# delivery/services/location_service.py
+# Write-behind buffer for courier location pings:
+#   API -> Redis hash (latest ping per delivery) -> flusher -> one bulk_update per interval
+#   API -> Redis list (every ping)               -> route_service.flush_location_history -> DeliveryRoute
+import hashlib
+import json
+import secrets
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from redis.exceptions import ResponseError
+
+from core.redis_client import get_redis
+from delivery.models import Courier, Delivery
+from delivery.services.route_service import HISTORY_KEY, encode_history_ping
+
+
+LATEST_KEY = "delivery:pings:latest"
+FLUSHING_KEY = "delivery:pings:flushing"
+
+# keep a ping only if it is newer than the one already buffered for that delivery
+BUFFER_IF_NEWER = """
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[1], ARGV[i])
+    if (not current) or cjson.decode(current)['ts'] < tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+    end
+end
+return #ARGV / 3
+"""
+
+LOCATION_FIELDS = ["latitude", "longitude", "current_location", "location_updated_at", "updated_at"]
+
+
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_courier_token(courier):
+    """New API token for the courier (replaces the old one). Only its hash is stored -- show it once."""
+    token = secrets.token_urlsafe(32)
+    Courier.objects.filter(id=courier.id).update(api_token_hash=token_hash(token))
+    return token
+
+
+def authenticate_courier(token):
+    if not token:
+        return None
+    return Courier.objects.filter(api_token_hash=token_hash(token)).first()
+
+
+def owned_pings(courier, pings):
+    """The pings for deliveries assigned to `courier`; a courier never moves someone else's delivery."""
+    delivery_ids = {ping["delivery_id"] for ping in pings}
+    owned = set(Delivery.objects.filter(id__in=delivery_ids, courier=courier).values_list("id", flat=True))
+    return [ping for ping in pings if ping["delivery_id"] in owned]
+
+
+def buffer_location_pings(pings):
+    """
+    pings: validated LocationPingSerializer data (many deliveries, any order).
+    The newest ping per delivery goes to the latest-state buffer, every ping to the
+    route history. Returns how many deliveries were touched.
+    """
+    now = timezone.now()
+    latest = {}
+    history = []
+    for ping in pings:
+        # a device clock in the future would make every later real ping look stale
+        recorded_at = min(ping.get("recorded_at") or now, now)
+        ts = recorded_at.timestamp()
+        history.append(encode_history_ping(ping["delivery_id"], ts, ping["latitude"], ping["longitude"]))
+        current = latest.get(ping["delivery_id"])
+        if current is None or current["ts"] < ts:
+            latest[ping["delivery_id"]] = {
+                "ts": ts,
+                "lat": ping["latitude"],
+                "lng": ping["longitude"],
+                "label": ping.get("location") or "",
+            }
+
+    if not latest:
+        return 0
+
+    args = []
+    for delivery_id, ping in latest.items():
+        args += [delivery_id, ping["ts"], json.dumps(ping)]
+
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.eval(BUFFER_IF_NEWER, 1, LATEST_KEY, *args)
+    pipe.rpush(HISTORY_KEY, *history)
+    pipe.execute()
+    return len(latest)
+
+
+def take_buffered_pings():
+    """
+    Move the buffer aside and return {delivery_id: ping}. A batch left behind by a
+    crashed flush is returned again first; call `ack_flushed_pings()` once written.
+    """
+    client = get_redis()
+    if not client.exists(FLUSHING_KEY):
+        try:
+            client.rename(LATEST_KEY, FLUSHING_KEY)
+        except ResponseError:
+            return {}  # nothing buffered
+    return {int(delivery_id): json.loads(ping) for delivery_id, ping in client.hgetall(FLUSHING_KEY).items()}
+
+
+def ack_flushed_pings():
+    get_redis().delete(FLUSHING_KEY)
+
+
+def apply_pings(pings):
+    """Write the latest position of every delivery in one bulk_update. Returns the changed deliveries."""
+    now = timezone.now()
+    changed = []
+
+    for delivery in Delivery.objects.select_related("order").filter(id__in=pings):
+        ping = pings[delivery.id]
+        recorded_at = datetime.fromtimestamp(ping["ts"], tz=dt_timezone.utc)
+        # a late batch must never move a courier back in time
+        if delivery.location_updated_at and delivery.location_updated_at >= recorded_at:
+            continue
+
+        delivery.latitude = ping["lat"]
+        delivery.longitude = ping["lng"]
+        delivery.current_location = ping["label"] or f"{ping['lat']:.5f}, {ping['lng']:.5f}"
+        delivery.location_updated_at = recorded_at
+        delivery.updated_at = now
+        changed.append(delivery)
+
+    Delivery.objects.bulk_update(changed, LOCATION_FIELDS, batch_size=500)
+
+    # a courier is where the parcel is -> keeps the assignment engine's positions fresh
+    couriers = {
+        delivery.courier_id: Courier(id=delivery.courier_id, latitude=delivery.latitude, longitude=delivery.longitude)
+        for delivery in changed if delivery.courier_id
+    }
+    Courier.objects.bulk_update(couriers.values(), ["latitude", "longitude"], batch_size=500)
+    return changed
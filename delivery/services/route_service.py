@@ -0,0 +1,140 @@
+# delivery/services/route_service.py
+# Courier track history (DeliveryRoute): append in batches, downsample old days, read a route in one query.
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from redis.exceptions import ResponseError
+
+from core.db_router import replica_alias
+from core.redis_client import get_redis
+from delivery.models import Delivery, DeliveryRoute
+
+
+# every accepted ping is RPUSHed here by location_service.buffer_location_pings as "id,ts,lat,lng"
+HISTORY_KEY = "delivery:pings:history"
+HISTORY_FLUSHING_KEY = "delivery:pings:history:flushing"
+
+MICRO = 1_000_000
+APPEND_BATCH_SIZE = 1000
+COMPACT_BATCH_SIZE = 200
+
+
+APPEND_SQL = """
+INSERT INTO delivery_deliveryroute (delivery_id, day, times, lats, lngs, downsampled)
+VALUES {values}
+ON CONFLICT (delivery_id, day) DO UPDATE SET
+    times = delivery_deliveryroute.times || EXCLUDED.times,
+    lats = delivery_deliveryroute.lats || EXCLUDED.lats,
+    lngs = delivery_deliveryroute.lngs || EXCLUDED.lngs
+"""
+
+
+
+
+def encode_history_ping(delivery_id, ts, lat, lng):
+    return f"{delivery_id},{ts:.3f},{lat:.6f},{lng:.6f}"
+
+
+def flush_location_history():
+    """Append every buffered ping to its (delivery, day) row with batched INSERT .. ON CONFLICT."""
+    client = get_redis()
+    if not client.exists(HISTORY_FLUSHING_KEY):
+        try:
+            client.rename(HISTORY_KEY, HISTORY_FLUSHING_KEY)
+        except ResponseError:
+            return 0  # nothing buffered
+
+    points = []
+    for raw in client.lrange(HISTORY_FLUSHING_KEY, 0, -1):
+        delivery_id, ts, lat, lng = raw.split(",")
+        points.append((int(delivery_id), float(ts), float(lat), float(lng)))
+
+    # unknown deliveries would fail the whole statement on the FK
+    known = set(Delivery.objects.filter(id__in={p[0] for p in points}).values_list("id", flat=True))
+
+    rows = defaultdict(lambda: ([], [], []))
+    for delivery_id, ts, lat, lng in sorted(points, key=lambda p: p[1]):
+        if delivery_id not in known:
+            continue
+        moment = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        times, lats, lngs = rows[(delivery_id, moment.date())]
+        times.append(int((moment - midnight).total_seconds()))
+        lats.append(round(lat * MICRO))
+        lngs.append(round(lng * MICRO))
+
+    rows = list(rows.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), APPEND_BATCH_SIZE):
+            batch = rows[start:start + APPEND_BATCH_SIZE]
+            values = ", ".join(["(%s, %s, %s, %s, %s, false)"] * len(batch))
+            params = []
+            for (delivery_id, day), (times, lats, lngs) in batch:
+                params += [delivery_id, day, times, lats, lngs]
+            cursor.execute(APPEND_SQL.format(values=values), params)
+
+    client.delete(HISTORY_FLUSHING_KEY)
+    return len(points)
+
+
+
+
+def get_route(delivery_id, day=None):
+    """[(datetime, lat, lng), ...] in time order -- one query (optionally a single day)."""
+    routes = DeliveryRoute.objects.using(replica_alias()).filter(delivery_id=delivery_id).order_by("day")
+    if day:
+        routes = routes.filter(day=day)
+
+    points = []
+    for route in routes:
+        midnight = datetime(route.day.year, route.day.month, route.day.day, tzinfo=dt_timezone.utc)
+        day_points = sorted(zip(route.times, route.lats, route.lngs))
+        points += [
+            (midnight + timedelta(seconds=seconds), lat / MICRO, lng / MICRO)
+            for seconds, lat, lng in day_points
+        ]
+    return points
+
+
+def downsample(times, lats, lngs, bucket_seconds):
+    """Keep the last point of every `bucket_seconds` window (input in any order)."""
+    kept = {}
+    for seconds, lat, lng in sorted(zip(times, lats, lngs)):
+        kept[seconds // bucket_seconds] = (seconds, lat, lng)
+    points = [kept[bucket] for bucket in sorted(kept)]
+    return [p[0] for p in points], [p[1] for p in points], [p[2] for p in points]
+
+
+def compact_location_history():
+    """
+    Bounded storage: downsample days older than ROUTE_DOWNSAMPLE_AFTER_DAYS and drop
+    days older than ROUTE_RETENTION_DAYS. Works in small batches, returns counts.
+    """
+    today = timezone.now().date()
+    downsample_before = today - timedelta(days=settings.ROUTE_DOWNSAMPLE_AFTER_DAYS)
+    expire_before = today - timedelta(days=settings.ROUTE_RETENTION_DAYS)
+
+    deleted = 0
+    while True:
+        ids = list(DeliveryRoute.objects.filter(day__lt=expire_before).values_list("id", flat=True)[:COMPACT_BATCH_SIZE])
+        if not ids:
+            break
+        deleted += DeliveryRoute.objects.filter(id__in=ids).delete()[0]
+
+    downsampled = 0
+    while True:
+        batch = list(DeliveryRoute.objects.filter(day__lt=downsample_before, downsampled=False)[:COMPACT_BATCH_SIZE])
+        if not batch:
+            break
+        for route in batch:
+            route.times, route.lats, route.lngs = downsample(
+                route.times, route.lats, route.lngs, settings.ROUTE_DOWNSAMPLE_SECONDS
+            )
+            route.downsampled = True
+        DeliveryRoute.objects.bulk_update(batch, ["times", "lats", "lngs", "downsampled"])
+        downsampled += len(batch)
+
+    return {"downsampled": downsampled, "deleted": deleted}
@@ -0,0 +1,174 @@
+# delivery/services/slot_service.py
+# Delivery slot capacity without a hot row lock:
+#   - the live "places left" of every slot is one Redis counter, taken with an atomic Lua DECR
+#     (O(1), never below zero, thousands of checkouts for the lunch slot never wait on each other)
+#   - Order.delivery_slot is the durable record of a booking
+#   - reconcile_slot_counters() copies the counters into DeliverySlot.booked every few minutes,
+#     and a missing counter (Redis flushed / expired) is re-seeded from the orders in Postgres
+#   - an unpaid order gives its place back when its stock reservation expires
+#     (the expiry sweep cancels it -> release_order_slot() via the status signal)
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.redis_client import get_redis
+from delivery.models import DeliverySlot
+from shop.models import Order, StockReservation
+
+
+LEFT_KEY = "delivery:slot:{}:left"
+
+# -2 = counter missing (caller seeds it), -1 = full, otherwise places left after this booking
+TAKE_SLOT = """
+local left = redis.call('GET', KEYS[1])
+if not left then
+    if ARGV[1] == '' then return -2 end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    left = ARGV[1]
+end
+if tonumber(left) <= 0 then return -1 end
+return redis.call('DECR', KEYS[1])
+"""
+
+# give a place back (never above capacity); a missing counter is re-seeded from Postgres anyway
+RELEASE_SLOT = """
+local left = redis.call('GET', KEYS[1])
+if left and tonumber(left) < tonumber(ARGV[1]) then
+    return redis.call('INCR', KEYS[1])
+end
+return -1
+"""
+
+# admin changed the capacity: shift the live counter by the difference
+ADJUST_SLOT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+
+
+
+def left_key(slot_id):
+    return LEFT_KEY.format(slot_id)
+
+
+def slot_ends_at(slot):
+    return timezone.make_aware(datetime.combine(slot.date, slot.end_time))
+
+
+def counter_ttl(slot):
+    """Counters outlive their slot by a day (late cancellations), then Redis drops them."""
+    return max(int((slot_ends_at(slot) - timezone.now()).total_seconds()), 0) + 86400
+
+
+def holding():
+    """Orders that hold a place: not cancelled, and if still unpaid, only while their stock reservation is held."""
+    reserved = StockReservation.objects.filter(order_id=OuterRef("id"), status="reserved")
+    return ~Q(status="cancelled") & (~Q(status="pending") | Exists(reserved))
+
+
+def slot_taken(slot_ids):
+    """{slot_id: orders holding a place}, one grouped query."""
+    rows = (
+        Order.objects.filter(holding(), delivery_slot_id__in=slot_ids)
+        .values("delivery_slot_id").annotate(taken=Count("id")).values_list("delivery_slot_id", "taken")
+    )
+    return dict(rows)
+
+
+def seed_value(slot):
+    taken = slot_taken([slot.id]).get(slot.id, 0)
+    return max(slot.capacity - taken, 0)
+
+
+def take_slot(client, slot_id, seed="", ttl=0):
+    """Raw atomic booking on the counter: places left afterwards, -1 when full, -2 when not seeded."""
+    return int(client.eval(TAKE_SLOT, 1, left_key(slot_id), seed, ttl))
+
+
+def book_slot(slot_id):
+    """
+    Take one place of the slot; True on success, False when it is full / gone.
+    One Redis round trip normally; the seed query only runs when the counter is missing.
+    """
+    client = get_redis()
+    result = take_slot(client, slot_id)
+    if result == -2:
+        slot = DeliverySlot.objects.filter(id=slot_id, is_active=True).first()
+        if slot is None:
+            return False
+        result = take_slot(client, slot_id, seed_value(slot), counter_ttl(slot))
+    return result >= 0
+
+
+def release_slot(slot_id):
+    capacity = DeliverySlot.objects.filter(id=slot_id).values_list("capacity", flat=True).first()
+    if capacity is not None:
+        get_redis().eval(RELEASE_SLOT, 1, left_key(slot_id), capacity)
+
+
+def release_order_slot(order):
+    """Give the order's place back exactly once (clearing the FK is the guard against double releases)."""
+    if not order.delivery_slot_id:
+        return
+    slot_id = order.delivery_slot_id
+    if Order.objects.filter(id=order.id, delivery_slot_id=slot_id).update(delivery_slot=None):
+        order.delivery_slot_id = None
+        release_slot(slot_id)
+
+
+def adjust_slot_capacity(slot_id, delta):
+    get_redis().eval(ADJUST_SLOT, 1, left_key(slot_id), delta)
+
+
+
+
+def upcoming_slots():
+    """Bookable slots of the next SLOT_BOOKING_DAYS days, as [(slot, places_left), ...] -- one query + one MGET."""
+    now = timezone.localtime()
+    lead = now + timedelta(minutes=settings.SLOT_BOOKING_LEAD_MINUTES)
+    slots = [
+        slot for slot in DeliverySlot.objects.filter(
+            is_active=True, date__gte=now.date(), date__lte=now.date() + timedelta(days=settings.SLOT_BOOKING_DAYS)
+        )
+        if timezone.make_aware(datetime.combine(slot.date, slot.start_time)) >= lead
+    ]
+    if not slots:
+        return []
+
+    counters = get_redis().mget([left_key(slot.id) for slot in slots])
+    return [
+        (slot, int(left) if left is not None else max(slot.capacity - slot.booked, 0))
+        for slot, left in zip(slots, counters)
+    ]
+
+
+def reconcile_slot_counters():
+    """Copy the live counters of open slots into DeliverySlot.booked; seed missing counters. Returns slots touched."""
+    today = timezone.localdate()
+    slots = list(DeliverySlot.objects.filter(date__gte=today - timedelta(days=1)))
+    if not slots:
+        return 0
+    taken = slot_taken([slot.id for slot in slots])
+
+    client = get_redis()
+    counters = client.mget([left_key(slot.id) for slot in slots])
+    changed = []
+    for slot, left in zip(slots, counters):
+        if left is None:
+            # lost counter: Postgres is the truth
+            booked = taken.get(slot.id, 0)
+            client.set(left_key(slot.id), max(slot.capacity - booked, 0), ex=counter_ttl(slot), nx=True)
+        else:
+            booked = max(slot.capacity - int(left), 0)
+        if booked != slot.booked:
+            slot.booked = booked
+            changed.append(slot)
+
+    DeliverySlot.objects.bulk_update(changed, ["booked"], batch_size=500)
+    return len(slots)
@@ -0,0 +1,104 @@
+# delivery/services/tracking_service.py
+# One pinned status message per order, edited in place when the delivery changes.
+# Changes are coalesced per chat: at most one refresh every DELIVERY_TRACKING_MIN_INTERVAL seconds.
+import html
+
+from django.conf import settings
+
+from core.redis_client import get_redis
+from delivery.models import Delivery
+from shop.models import Order
+from delivery.services.eta_service import estimate_eta_text
+
+
+# a change to any of these refreshes the customer's tracking message
+TRACKED_FIELDS = ("status", "current_location", "eta")
+
+
+def _pending_key(chat_id):
+    return f"delivery:tracking:pending:{chat_id}"
+
+
+def _throttle_key(chat_id):
+    return f"delivery:tracking:throttle:{chat_id}"
+
+
+
+
+def build_tracking_text(delivery, eta_params=None):
+    """
+    HTML text of the tracking message (same text from the bot and from Celery).
+    A manually entered `eta` wins over the model estimate (eta_service.get_eta_params()).
+    """
+    eta = delivery.eta or estimate_eta_text(delivery, eta_params) or "Not available"
+    return (
+        f"📦 <b>Order #{delivery.order_id} Delivery Status</b>\n\n"
+        f"Status: {delivery.get_status_display() or '—'}\n"
+        f"Current Location: {html.escape(delivery.current_location or '—')}\n"
+        f"ETA: {html.escape(eta)}"
+    )
+
+
+def get_tracked_delivery(order_id, chat_id):
+    """Delivery + its order in one query, only if the order belongs to chat_id."""
+    return (
+        Delivery.objects.select_related("order")
+        .filter(order_id=order_id, order__chat_id=chat_id)
+        .first()
+    )
+
+
+def get_tracked_deliveries(delivery_ids):
+    return list(Delivery.objects.select_related("order").filter(id__in=delivery_ids))
+
+
+def save_tracking_message(delivery, message_id):
+    # .update() -> does not fire post_save, so it never schedules another refresh
+    Delivery.objects.filter(pk=delivery.pk).update(tracking_message_id=message_id)
+    delivery.tracking_message_id = message_id
+
+
+
+
+def order_chat_ids(deliveries):
+    """{order_id: chat_id} -- from already loaded orders, else one values query (never full Order rows)."""
+    chat_ids = {d.order_id: d.order.chat_id for d in deliveries if d.order_id and Delivery.order.is_cached(d)}
+    missing = {d.order_id for d in deliveries if d.order_id and d.order_id not in chat_ids}
+    if missing:
+        chat_ids.update(Order.objects.filter(id__in=missing).values_list("id", "chat_id"))
+    return chat_ids
+
+
+def schedule_tracking_refresh(delivery, chat_id):
+    """
+    Mark the delivery as changed. The first change in a window schedules the
+    refresh task; later changes in the same window just join it.
+    """
+    from delivery.tasks import refresh_tracking_messages_task
+
+    interval = settings.DELIVERY_TRACKING_MIN_INTERVAL
+    client = get_redis()
+
+    pipe = client.pipeline()
+    pipe.sadd(_pending_key(chat_id), delivery.pk)
+    pipe.set(_throttle_key(chat_id), 1, nx=True, ex=interval * 2)
+    _, first_in_window = pipe.execute()
+
+    if first_in_window:
+        refresh_tracking_messages_task.apply_async(args=[chat_id], countdown=interval)
+
+
+def pop_pending_deliveries(chat_id):
+    """Take the deliveries changed since the last refresh and reopen the window (atomically)."""
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.smembers(_pending_key(chat_id))
+    pipe.delete(_pending_key(chat_id))
+    pipe.delete(_throttle_key(chat_id))
+    delivery_ids, _, _ = pipe.execute()
+    return [int(delivery_id) for delivery_id in delivery_ids]
+
+
+def restore_pending_deliveries(chat_id, delivery_ids):
+    """A refresh that failed (and will retry) puts its deliveries back."""
+    if delivery_ids:
+        get_redis().sadd(_pending_key(chat_id), *delivery_ids)
@@ -0,0 +1,136 @@
+# delivery/services/zone_service.py
+# "Do we deliver to (lat, lng)?" in microseconds, without touching the database:
+#   - the zone polygons are rasterized once into a grid of DELIVERY_ZONE_CELL_DEG cells
+#   - a cell no polygon edge crosses is entirely inside (or outside) -> answered by a dict lookup
+#   - only cells on a zone border fall back to an exact point-in-polygon test
+# Every process keeps its own index; saving/deleting a zone bumps a version in Redis
+# and the processes rebuild on their next check (at most ZONE_INDEX_CHECK_SECONDS later).
+import math
+import re
+import time
+
+from django.conf import settings
+
+from core.redis_client import get_redis
+from delivery.models import DeliveryZone, GeocodeCache
+
+
+VERSION_KEY = "delivery:zones:version"
+
+_cache = {"index": None, "version": None, "checked_at": 0.0}
+
+
+
+
+def point_in_polygon(lat, lng, polygon):
+    """Ray casting; polygon is a list of (lat, lng)."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lng_i = polygon[i]
+        lat_j, lng_j = polygon[j]
+        if (lng_i > lng) != (lng_j > lng):
+            crossing = lat_i + (lng - lng_i) * (lat_j - lat_i) / (lng_j - lng_i)
+            if lat < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+class ZoneIndex:
+    def __init__(self, zones, cell_deg):
+        """zones: [(zone_id, [(lat, lng), ...]), ...]"""
+        self.cell = cell_deg
+        self.zones = {zone_id: polygon for zone_id, polygon in zones}
+        self.inside = {}    # (row, col) -> zone_id, cell fully inside that zone
+        self.border = {}    # (row, col) -> [zone_id, ...], cell crossed by those zones' edges
+        for zone_id, polygon in zones:
+            self._add(zone_id, polygon)
+
+    def _cell_of(self, lat, lng):
+        return math.floor(lat / self.cell), math.floor(lng / self.cell)
+
+    def _add(self, zone_id, polygon):
+        # 1. border cells: walk every edge in steps shorter than a cell
+        border = set()
+        for (lat_a, lng_a), (lat_b, lng_b) in zip(polygon, polygon[1:] + polygon[:1]):
+            steps = max(1, math.ceil(max(abs(lat_b - lat_a), abs(lng_b - lng_a)) / (self.cell / 2)))
+            for step in range(steps + 1):
+                t = step / steps
+                row, col = self._cell_of(lat_a + (lat_b - lat_a) * t, lng_a + (lng_b - lng_a) * t)
+                # neighbours too: a segment between two samples can clip a corner cell
+                for d_row in (-1, 0, 1):
+                    for d_col in (-1, 0, 1):
+                        border.add((row + d_row, col + d_col))
+        for cell in border:
+            self.border.setdefault(cell, []).append(zone_id)
+
+        # 2. other cells of the bounding box are uniform -> their centre decides
+        lats = [p[0] for p in polygon]
+        lngs = [p[1] for p in polygon]
+        row_min, col_min = self._cell_of(min(lats), min(lngs))
+        row_max, col_max = self._cell_of(max(lats), max(lngs))
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                if (row, col) in border or (row, col) in self.inside:
+                    continue
+                if point_in_polygon((row + 0.5) * self.cell, (col + 0.5) * self.cell, polygon):
+                    self.inside[(row, col)] = zone_id
+
+    def locate(self, lat, lng):
+        """Zone id containing the point, or None."""
+        cell = self._cell_of(lat, lng)
+        zone_id = self.inside.get(cell)
+        if zone_id is not None:
+            return zone_id
+        for zone_id in self.border.get(cell, ()):
+            if point_in_polygon(lat, lng, self.zones[zone_id]):
+                return zone_id
+        return None
+
+
+
+
+def build_zone_index():
+    zones = [
+        (zone.id, [tuple(point) for point in zone.polygon])
+        for zone in DeliveryZone.objects.filter(is_active=True)
+    ]
+    return ZoneIndex(zones, settings.DELIVERY_ZONE_CELL_DEG)
+
+
+def get_zone_index():
+    now = time.monotonic()
+    if _cache["index"] is None or now - _cache["checked_at"] > settings.ZONE_INDEX_CHECK_SECONDS:
+        version = get_redis().get(VERSION_KEY)
+        if _cache["index"] is None or version != _cache["version"]:
+            _cache["index"] = build_zone_index()
+            _cache["version"] = version
+        _cache["checked_at"] = now
+    return _cache["index"]
+
+
+def invalidate_zone_index():
+    """Called when zones change: this process rebuilds now, the others on their next check."""
+    _cache["index"] = None
+    get_redis().incr(VERSION_KEY)
+
+
+def is_deliverable(lat, lng):
+    """True if (lat, lng) is inside an active zone. No zones configured -> no restriction."""
+    index = get_zone_index()
+    if not index.zones:
+        return True
+    return index.locate(lat, lng) is not None
+
+
+
+
+def normalize_address(address):
+    return re.sub(r"\s+", " ", address.strip().lower())
+
+
+def geocode_cached(address):
+    """(lat, lng) from the local geocode cache, or None when the address is unknown."""
+    hit = GeocodeCache.objects.filter(query=normalize_address(address)[:255]).values_list("latitude", "longitude").first()
+    return hit
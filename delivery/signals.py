@@ -0,0 +1,82 @@
+# delivery/signals.py
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from shop.models import Order
+from .models import Delivery, DeliverySlot, DeliveryZone
+from .services.tracking_service import TRACKED_FIELDS, order_chat_ids, schedule_tracking_refresh
+from .services.zone_service import invalidate_zone_index
+from .services.slot_service import adjust_slot_capacity, release_order_slot
+
+
+def _tracked_values(instance):
+    # __dict__ only -> never loads deferred fields
+    return {field: instance.__dict__[field] for field in TRACKED_FIELDS if field in instance.__dict__}
+
+
+@receiver(post_init, sender=Delivery)
+def remember_tracked_fields(sender, instance: Delivery, **kwargs):
+    instance._tracked_snapshot = _tracked_values(instance)
+
+
+@receiver(post_save, sender=Delivery)
+def delivery_changed(sender, instance: Delivery, created, update_fields=None, **kwargs):
+    """Push status / location / ETA changes to the customer's pinned tracking message."""
+    if update_fields is not None and not set(update_fields) & set(TRACKED_FIELDS):
+        return  # e.g. courier / coordinates only: nothing the message shows
+    before = instance._tracked_snapshot
+    after = _tracked_values(instance)
+    instance._tracked_snapshot = after
+
+    if created or not instance.order_id:
+        return
+    if all(field in before and before[field] == value for field, value in after.items()):
+        return
+
+    try:
+        chat_id = order_chat_ids([instance]).get(instance.order_id)
+        if chat_id:
+            schedule_tracking_refresh(instance, chat_id)
+    except Exception as e:
+        print("❌ Failed to schedule tracking refresh:", e)
+
+
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def delivery_zones_changed(sender, instance: DeliveryZone, **kwargs):
+    """Rebuild the in-memory zone index (here now, in the bot processes on their next check)."""
+    try:
+        invalidate_zone_index()
+    except Exception as e:
+        print("❌ Failed to invalidate the delivery zone index:", e)
+
+
+
+@receiver(post_init, sender=DeliverySlot)
+def remember_slot_capacity(sender, instance: DeliverySlot, **kwargs):
+    instance._capacity_snapshot = instance.__dict__.get("capacity")
+
+
+@receiver(post_save, sender=DeliverySlot)
+def slot_capacity_changed(sender, instance: DeliverySlot, created, **kwargs):
+    """Shift the live Redis counter when the admin changes a slot's capacity."""
+    before, instance._capacity_snapshot = instance._capacity_snapshot, instance.capacity
+    if created or before is None or before == instance.capacity:
+        return
+    try:
+        adjust_slot_capacity(instance.id, instance.capacity - before)
+    except Exception as e:
+        print("❌ Failed to adjust slot capacity:", e)
+
+
+@receiver(post_save, sender=Order)
+def order_cancelled_release_slot(sender, instance: Order, created, update_fields=None, **kwargs):
+    """A cancelled order gives its delivery slot back."""
+    if created or not update_fields or "status" not in update_fields:
+        return
+    if instance.status != "cancelled" or not instance.delivery_slot_id:
+        return
+    try:
+        release_order_slot(instance)
+    except Exception as e:
+        print("❌ Failed to release delivery slot:", e)
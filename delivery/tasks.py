@@ -0,0 +1,120 @@
+# delivery/tasks.py
+import requests
+from celery import shared_task
+from django.conf import settings
+
+from delivery.services.tracking_service import (
+    build_tracking_text, get_tracked_deliveries, order_chat_ids, pop_pending_deliveries,
+    restore_pending_deliveries, save_tracking_message, schedule_tracking_refresh,
+)
+from delivery.services.location_service import take_buffered_pings, apply_pings, ack_flushed_pings
+from delivery.services.route_service import flush_location_history, compact_location_history
+from delivery.services.assignment_service import assign_pending_deliveries
+from delivery.services.eta_service import fit_eta_model, get_eta_params
+from delivery.services.slot_service import reconcile_slot_counters
+from shop.tasks import send_telegram_message_task
+
+
+def _telegram(method, payload):
+    url = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/{method}"
+    return requests.post(url, json=payload, timeout=30).json()
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
+def refresh_tracking_messages_task(self, chat_id):
+    """Edit (or create + pin) the tracking message of every delivery of chat_id changed in this window."""
+    delivery_ids = pop_pending_deliveries(chat_id)
+    try:
+        eta_params = get_eta_params()
+        for delivery in get_tracked_deliveries(delivery_ids):
+            text = build_tracking_text(delivery, eta_params)
+
+            if delivery.tracking_message_id:
+                result = _telegram("editMessageText", {
+                    "chat_id": chat_id,
+                    "message_id": delivery.tracking_message_id,
+                    "text": text,
+                    "parse_mode": "HTML",
+                })
+                if result.get("ok") or "message is not modified" in result.get("description", ""):
+                    continue
+                print("editMessageText failed, sending a new tracking message:", result)
+
+            result = _telegram("sendMessage", {"chat_id": chat_id, "text": text, "parse_mode": "HTML"})
+            if not result.get("ok"):
+                print("Telegram response:", result)
+                continue
+
+            message_id = result["result"]["message_id"]
+            save_tracking_message(delivery, message_id)
+            _telegram("pinChatMessage", {
+                "chat_id": chat_id,
+                "message_id": message_id,
+                "disable_notification": True,
+            })
+
+    except requests.exceptions.RequestException as e:
+        # the retry edits them (again -- "not modified" is fine)
+        restore_pending_deliveries(chat_id, delivery_ids)
+        raise self.retry(exc=e)
+
+
+
+
+@shared_task
+def flush_location_pings_task():
+    """Write-behind flush of courier pings (scheduled by celery beat, see CELERY_BEAT_SCHEDULE)."""
+    pings = take_buffered_pings()
+    if not pings:
+        return 0
+
+    changed = apply_pings(pings)
+    ack_flushed_pings()
+
+    # bulk_update skips post_save -> push the new location to the customers' tracking messages here
+    chat_ids = order_chat_ids(changed)
+    for delivery in changed:
+        if chat_ids.get(delivery.order_id):
+            schedule_tracking_refresh(delivery, chat_ids[delivery.order_id])
+    return len(changed)
+
+
+@shared_task
+def flush_location_history_task():
+    """Append buffered pings to the DeliveryRoute history (scheduled by celery beat)."""
+    return flush_location_history()
+
+
+@shared_task
+def compact_location_history_task():
+    """Downsample / expire old route history (scheduled daily by celery beat)."""
+    return compact_location_history()
+
+
+@shared_task
+def assign_couriers_task():
+    """Batch-assign open deliveries to the nearest free couriers (scheduled every minute by celery beat)."""
+    assigned = assign_pending_deliveries()
+
+    for courier, deliveries in assigned.items():
+        if not courier.chat_id:
+            continue
+        orders = ", ".join(f"#{delivery.order_id}" for delivery in deliveries)
+        send_telegram_message_task.delay(
+            chat_id=courier.chat_id,
+            text=f"🛵 <b>New deliveries assigned</b>\n\nOrders: {orders}",
+        )
+    return sum(len(deliveries) for deliveries in assigned.values())
+
+
+@shared_task
+def fit_eta_model_task():
+    """Refit the ETA model on the delivered-order history (scheduled daily by celery beat)."""
+    model = fit_eta_model()
+    return model.samples if model else 0
+
+
+@shared_task
+def reconcile_slot_counters_task():
+    """Copy the Redis slot counters into DeliverySlot.booked (scheduled by celery beat)."""
+    return reconcile_slot_counters()
@@ -1,3 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.redis_client import get_redis, redis_available
+from delivery.models import Courier, Delivery, DeliverySlot
+from delivery.services.slot_service import book_slot, left_key as slot_left_key, take_slot
+from shop.models import Category, Order, Product, StockReservation
+from shop.services.inventory_service import left_key as stock_left_key, record_reservations, release_expired_reservations
+
+
+class DeliveryAdminQueryCountTests(TestCase):
+    """The delivery admin must not issue queries per row (order / courier columns)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        cls.courier = Courier.objects.create(name="Courier", phone="+966500000001")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def make_delivery(self):
+        order = Order.objects.create(chat_id=1, customer_name="Test User", phone="+966500000000", address="Main street 1")
+        return Delivery.objects.create(order=order, courier=self.courier, status="preparing")
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_constant(self):
+        url = reverse("admin:delivery_delivery_changelist")
+        self.make_delivery()
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_delivery()
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_order_number_search(self):
+        delivery = self.make_delivery()
+        self.make_delivery()
+        response = self.client.get(reverse("admin:delivery_delivery_changelist"), {"q": f"#{delivery.order_id}"})
+        self.assertEqual(list(response.context["cl"].result_list), [delivery])
+
+    def test_change_page_query_count_is_constant(self):
+        first = self.make_delivery()
+        for _ in range(20):
+            self.make_delivery()
+        last = self.make_delivery()
+        self.assertEqual(
+            self.count_queries(reverse("admin:delivery_delivery_change", args=[last.id])),
+            self.count_queries(reverse("admin:delivery_delivery_change", args=[first.id])),
+        )
+
+
+@skipUnless(redis_available(), "needs Redis")
+class SlotExpiryTests(TestCase):
+    """An unpaid checkout holds its slot place only as long as its stock reservation (needs Redis)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Food", slug="food")
+        cls.product = Product.objects.create(category=category, name="Pizza", price=10, stock=1000)
+
+    def setUp(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.slot = DeliverySlot.objects.create(date=tomorrow, start_time=time(12), end_time=time(13), capacity=1)
+        keys = [slot_left_key(self.slot.id), stock_left_key(self.product.id)]
+        get_redis().delete(*keys)
+        self.addCleanup(get_redis().delete, *keys)
+
+    def book_order(self):
+        self.assertTrue(book_slot(self.slot.id))
+        order = Order.objects.create(
+            chat_id=1, customer_name="Test User", phone="+966500000000", address="Main street 1", delivery_slot=self.slot
+        )
+        record_reservations(order, {self.product.id: 1})
+        return order
+
+    def expire_reservations(self):
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        return release_expired_reservations()
+
+    def test_book_expire_release(self):
+        order = self.book_order()
+        self.assertFalse(book_slot(self.slot.id))
+
+        self.assertEqual(self.expire_reservations(), [order.id])
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.delivery_slot_id), ("cancelled", None))
+        self.assertTrue(book_slot(self.slot.id))
+
+    def test_paid_order_keeps_its_place(self):
+        order = self.book_order()
+        Order.objects.filter(id=order.id).update(status="done")
+        self.expire_reservations()
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.delivery_slot_id), ("done", self.slot.id))
+        self.assertFalse(book_slot(self.slot.id))
+
+    def test_reseeded_counter_ignores_expired_unpaid_orders(self):
+        self.book_order()
+        StockReservation.objects.update(status="released")
+        get_redis().delete(slot_left_key(self.slot.id))
+        self.assertTrue(book_slot(self.slot.id))
+
+
+@skipUnless(redis_available(), "needs Redis")
+class SlotBookingConcurrencyTests(TestCase):
+    """Many buyers racing for one slot: never more bookings than places (needs Redis)."""
+
+    CAPACITY = 20
+    BUYERS = 200
+    THREADS = 32
+
+    def setUp(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.slot = DeliverySlot.objects.create(
+            date=tomorrow, start_time=time(12), end_time=time(13), capacity=self.CAPACITY
+        )
+        get_redis().delete(slot_left_key(self.slot.id))
+        self.addCleanup(get_redis().delete, slot_left_key(self.slot.id))
+
+    def race(self, buy):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            results = list(pool.map(buy, range(self.BUYERS)))
+        return sum(results), int(get_redis().get(slot_left_key(self.slot.id)))
+
+    def test_booked_slot_is_never_oversubscribed(self):
+        # the first booking seeds the counter from Postgres (this test's transaction), the threads
+        # then only touch Redis -- like every checkout after the first
+        self.assertTrue(book_slot(self.slot.id))
+        booked, left = self.race(lambda _: book_slot(self.slot.id))
+        self.assertEqual(booked, self.CAPACITY - 1)
+        self.assertEqual(left, 0)
 
-# Create your tests here.
+    def test_concurrent_seeding_is_never_oversubscribed(self):
+        # every buyer finds the counter missing and passes the seed at the same time
+        booked, left = self.race(lambda _: take_slot(get_redis(), self.slot.id, self.CAPACITY, 60) >= 0)
+        self.assertEqual(booked, self.CAPACITY)
+        self.assertEqual(left, 0)
@@ -0,0 +1,13 @@
+# delivery/urls.py
+
+from django.urls import path
+from . import views
+
+
+app_name = "delivery"
+
+urlpatterns = [
+    # courier apps
+    path("locations/", views.ingest_locations, name="ingest-locations"),
+    path("<int:delivery_id>/route/", views.delivery_route, name="delivery-route"),
+]
@@ -1,3 +1,81 @@
-from django.shortcuts import render
+# delivery/views.py
+import hmac
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .serializers import LocationPingSerializer
+from .services.location_service import authenticate_courier, buffer_location_pings, owned_pings
+from .services.route_service import get_route
+
+
+MAX_PINGS_PER_REQUEST = 1000
+
+
+def _has_fleet_token(request):
+    token = settings.COURIER_API_TOKEN
+    sent = request.headers.get("X-Courier-Token", "")
+    return bool(token) and hmac.compare_digest(sent.encode(), token.encode())
+
+
+
+# ------------------ COURIER LOCATION PINGS ------------------
+# body: {"pings": [{"delivery_id": 1, "latitude": 24.71, "longitude": 46.67, "recorded_at": "..."}, ...]}
+# X-Courier-Token = the courier's own token (admin action "Issue API token"); only pings for the
+# courier's own deliveries are kept.
+# pings are only buffered in Redis here, delivery.tasks.flush_location_pings_task writes them to Postgres
+@require_POST
+@csrf_exempt
+def ingest_locations(request):
+    courier = authenticate_courier(request.headers.get("X-Courier-Token"))
+    if courier is None:
+        return JsonResponse({"error": "Invalid courier token"}, status=403)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON payload"}, status=400)
+
+    pings = data.get("pings") if isinstance(data, dict) else None
+    if not isinstance(pings, list):
+        return JsonResponse({"error": "Expected a 'pings' list"}, status=400)
+    if len(pings) > MAX_PINGS_PER_REQUEST:
+        return JsonResponse({"error": f"At most {MAX_PINGS_PER_REQUEST} pings per request"}, status=400)
+
+    serializer = LocationPingSerializer(data=pings, many=True)
+    if not serializer.is_valid():
+        return JsonResponse({"error": "Invalid pings", "details": serializer.errors}, status=400)
+
+    pings = owned_pings(courier, serializer.validated_data)
+    rejected = len(serializer.validated_data) - len(pings)
+    accepted = buffer_location_pings(pings)
+    return JsonResponse({"accepted": accepted, "rejected": rejected}, status=202)
+
+
+
+# ------------------ DELIVERY ROUTE ------------------
+# GET /delivery/<id>/route/[?day=YYYY-MM-DD] -> {"points": [[iso_time, lat, lng], ...]}
+# dispatcher view: X-Courier-Token = the fleet token COURIER_API_TOKEN
+@require_GET
+def delivery_route(request, delivery_id):
+    if not _has_fleet_token(request):
+        return JsonResponse({"error": "Invalid courier token"}, status=403)
+
+    day = request.GET.get("day")
+    if day:
+        try:
+            day = parse_date(day)
+        except ValueError:
+            day = None
+        if not day:
+            return JsonResponse({"error": "day must be YYYY-MM-DD"}, status=400)
+
+    points = get_route(delivery_id, day)
+    return JsonResponse({
+        "delivery_id": delivery_id,
+        "points": [[moment.isoformat(), lat, lng] for moment, lat, lng in points],
+    })
@@ -6,12 +6,18 @@
 # payment/views.py
 
 import os
+from datetime import timedelta
+
 import stripe
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from shop.models import Order, OrderItem
+from shop.services.inventory_service import extend_reservations, holds_reservations
+from shop.services.order_service import transition_order
 from shop.tasks import send_telegram_message_task
 from delivery.models import Delivery
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -21,6 +27,9 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 stripe.api_key = settings.STRIPE_SECRET_KEY
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Stripe refuses checkout sessions that expire sooner than this
+STRIPE_MIN_SESSION_MINUTES = 30
+
 
 
 # helper function -- build_payment_success_message -- will be used later in stripe_success function
@@ -64,38 +73,59 @@ def build_payment_success_buttons(order_id):
 # ------------------ CREATE CHECKOUT SESSION ------------------
 @csrf_exempt
 def create_checkout_session(request, order_id):
-    try:
-        order = Order.objects.get(id=order_id)
-    except Order.DoesNotExist:
-        return JsonResponse({"error": "Order not found"}, status=404)
-
-    items = OrderItem.objects.filter(order=order)
-    if not items:
-        return JsonResponse({"error": "No items in order"}, status=400)
-
-    line_items = []
-    for item in items:
-        line_items.append({
-            "price_data": {
-                "currency": "usd",
-                "product_data": {"name": item.product.name},
-                "unit_amount": int(item.price * 100),
-            },
-            "quantity": item.quantity,
-        })
-
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        mode="payment",
-        line_items=line_items,
-        success_url=f"{settings.BASE_URL}/payment/stripe-success-page/?session_id={{CHECKOUT_SESSION_ID}}&order_id={order.id}",
-        cancel_url=f"{settings.BASE_URL}/payment/stripe-cancel/?order_id={order.id}",
-    )
+    # the order row stays locked until its session id is saved: a concurrent call for the same
+    # order (double tap, retry) waits here, then reuses that session instead of opening a second one
+    with transaction.atomic():
+        try:
+            order = Order.objects.select_for_update().get(id=order_id)
+        except Order.DoesNotExist:
+            return JsonResponse({"error": "Order not found"}, status=404)
+
+        # a repeated call for the same order reuses its still-open session instead of opening another
+        if order.stripe_session_id:
+            try:
+                session = stripe.checkout.Session.retrieve(order.stripe_session_id)
+                if session.status == "open":
+                    return JsonResponse({"url": session.url, "id": session.id})
+            except stripe.error.StripeError:
+                pass
+
+        # the stock is only held while the reservation lives -> no new payment page once it was released
+        if order.status != "pending" or not holds_reservations(order):
+            return JsonResponse({"error": "Checkout expired, please order again"}, status=410)
+
+        items = OrderItem.objects.filter(order=order)
+        if not items:
+            return JsonResponse({"error": "No items in order"}, status=400)
+
+        line_items = []
+        for item in items:
+            line_items.append({
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {"name": item.product.name},
+                    "unit_amount": int(item.price * 100),
+                },
+                "quantity": item.quantity,
+            })
+
+        # the session dies with the reservation: nobody can pay for stock that was released and resold
+        expires_at = timezone.now() + timedelta(minutes=max(settings.STOCK_RESERVATION_MINUTES, STRIPE_MIN_SESSION_MINUTES))
+        session = stripe.checkout.Session.create(
+            payment_method_types=["card"],
+            mode="payment",
+            line_items=line_items,
+            expires_at=int(expires_at.timestamp()),
+            success_url=f"{settings.BASE_URL}/payment/stripe-success-page/?session_id={{CHECKOUT_SESSION_ID}}&order_id={order.id}",
+            cancel_url=f"{settings.BASE_URL}/payment/stripe-cancel/?order_id={order.id}",
+        )
+        # ... and the reservation lives at least as long as the session (Stripe's 30 minute minimum)
+        extend_reservations(order, expires_at)
 
-    order.stripe_session_id = session.id
-    order.save()
+        order.stripe_session_id = session.id
+        order.save(update_fields=["stripe_session_id"])
 
-    return JsonResponse({"url": session.url, "id": session.id})
+        return JsonResponse({"url": session.url, "id": session.id})
 
 
 # ------------------ STRIPE SUCCESS ------------------
@@ -117,15 +147,25 @@ def stripe_success(request):
     amount = session.amount_total / 100
     currency = session.currency.upper()
 
-    # Update order status
-    order.status = "done" if payment_status == "paid" else "pending"
-    order.save()
+    # pending -> done as one compare-and-set UPDATE: a cancel / webhook that got there first wins,
+    # a reload of this page finds the order already done (no second notice). Unpaid stays pending.
+    paid_now = None
+    if payment_status == "paid":
+        paid_now = transition_order(order.id, "done", only_from=("pending",))
+        order = paid_now or Order.objects.get(id=order.id)
 
-    if order.chat_id and payment_status == "paid":
+    if order.chat_id and paid_now:
         # Create delivery if not exists
         Delivery.objects.get_or_create(
             order=order,
-            defaults={"status": "preparing", "current_location": "Warehouse", "eta": None}
+            defaults={
+                "status": "preparing",
+                "current_location": "Warehouse",
+                "eta": None,
+                # the assignment engine matches couriers against this position
+                "latitude": settings.WAREHOUSE_LATITUDE,
+                "longitude": settings.WAREHOUSE_LONGITUDE,
+            }
         )
 
         # Prepare Telegram message with HTML and buttons
@@ -175,8 +215,11 @@ def stripe_cancel(request):
     except Order.DoesNotExist:
         return JsonResponse({"error": "Order not found"}, status=404)
 
-    order.status = "cancelled"
-    order.save()
+    # only an unpaid order is cancelled -- a success redirect / webhook that already paid it wins
+    cancelled = transition_order(order.id, "cancelled", only_from=("pending",))
+    if not cancelled:
+        return JsonResponse({"status": order.status, "order_id": order.id})
+    order = cancelled
 
     if order.chat_id:
         msg = (
@@ -16,6 +16,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
 from shop.models import Order, OrderItem
+from shop.services.order_service import transition_order
 
 logger = logging.getLogger(__name__)
 
@@ -199,31 +200,34 @@ def stripe_webhook(request):
         if not order_id:
             return HttpResponse(status=200)
 
-        order = Order.objects.filter(id=order_id).first()
-        if not order:
-            return HttpResponse(status=200)
-
-        order.stripe_session_id = data.get("id")
-        order.stripe_payment_intent_id = data.get("payment_intent")
+        stripe_fields = {
+            "stripe_session_id": data.get("id"),
+            "stripe_payment_intent_id": data.get("payment_intent"),
+        }
 
         # Payment status and message
         if data.get("payment_status") == "paid":
-            order.status = "done"
+            # pending -> done compare-and-set: a retried webhook / the success redirect may have done it already
+            order = transition_order(order_id, "done", only_from=("pending",), **stripe_fields)
+            if not order:
+                Order.objects.filter(id=order_id).update(**stripe_fields)
+                return HttpResponse(status=200)
             msg_text = (
                 f"🎉 Payment Success!\n"
                 f"Your order #{order.id} has been paid successfully.\n"
                 f"You can continue shopping → /shop"
             )
         else:
-            order.status = "pending"
+            # not paid: status stays as it is, only the stripe ids are written
+            if not Order.objects.filter(id=order_id).update(**stripe_fields):
+                return HttpResponse(status=200)
+            order = Order.objects.only("id", "chat_id").get(id=order_id)
             msg_text = (
                 f"⚠️ Payment Failed / Cancelled\n"
                 f"Don’t worry, you can try again using /checkout\n"
                 f"Or return to browsing → /shop"
             )
 
-        order.save()
-
         # Send Telegram message
         try:
             telegram_token = settings.BOT_TOKEN
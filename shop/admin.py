@@ -1,5 +1,10 @@
-from django.contrib import admin
-from .models import Category, Product, Order, OrderItem
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html
+from core.paginator import EstimatedCountPaginator
+from .models import CartArchive, Category, Product, Order, OrderItem, OrderStatusJob, StockReservation
+from .services.order_service import bulk_transition, refresh_order_summary, transition_order
+from .tasks import notify_status_job_task
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -12,15 +17,114 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ("is_active", "category")
     search_fields = ("name", "description")
 
+def bulk_status_action(status):
+    """
+    Admin action: one UPDATE for all selected orders (only those allowed to move to `status`),
+    then stock / slot side effects and customer notices run in a queued OrderStatusJob.
+    """
+    def action(modeladmin, request, queryset):
+        selected = list(queryset.values_list("id", flat=True))
+        changed = bulk_transition(selected, status)
+        skipped = len(selected) - len(changed)
+        if not changed:
+            modeladmin.message_user(request, f"No order can move to {status}.", messages.WARNING)
+            return
+
+        job = OrderStatusJob.objects.create(
+            status=status, order_ids=changed, total=len(changed), created_by=request.user,
+        )
+        notify_status_job_task.delay(job.id)
+        modeladmin.message_user(request, format_html(
+            '{} orders marked {} ({} skipped). Notifications: <a href="{}">job #{}</a>',
+            len(changed), status, skipped, reverse("admin:shop_orderstatusjob_change", args=[job.id]), job.id,
+        ))
+
+    action.__name__ = f"mark_{status}"
+    action.short_description = f"Mark selected orders as {status}"
+    return action
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     readonly_fields = ("product", "quantity", "price")
     extra = 0
 
+    def get_queryset(self, request):
+        # one query for all rows instead of one per row for product
+        return super().get_queryset(request).select_related("product")
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id", "customer_name", "phone", "status", "total", "created_at")
-    list_filter = ("status", "created_at")
-    search_fields = ("customer_name", "phone", "address")
+    list_display = ("id", "customer_name", "phone", "status", "total", "oversold", "created_at")
+    list_filter = ("status", "oversold", "created_at")
+    search_fields = ("customer_name", "phone", "address")  # trigram indexes, see Order.Meta
     inlines = [OrderItemInline]
     readonly_fields = ("created_at",)
+    raw_id_fields = ("delivery_slot",)
+    # millions of rows: estimated counts, and no second COUNT(*) for "x results (y total)"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [bulk_status_action(status) for status in ("accepted", "shipped", "done", "cancelled")]
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # offer only the statuses the order may move to from where it is
+        if obj is not None and "status" in form.base_fields:
+            form.base_fields["status"].choices = [
+                (value, label) for value, label in Order.STATUS_CHOICES
+                if value == obj.status or value in Order.TRANSITIONS[obj.status]
+            ]
+        return form
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+
+        # write only the edited columns; a status change is a compare-and-set transition
+        changed = [Order._meta.get_field(name).attname for name in form.changed_data]
+        if "status" not in changed:
+            obj.save(update_fields=changed)
+            return
+
+        fields = {name: getattr(obj, name) for name in changed if name != "status"}
+        if transition_order(obj.id, obj.status, **fields) is None:
+            current = Order.objects.filter(id=obj.id).values_list("status", flat=True).first()
+            self.message_user(
+                request, f"Order #{obj.id} is {current} now and can't move to {obj.status}; nothing was saved.",
+                messages.ERROR,
+            )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # lines added / removed in the inline -> the history's item_count / summary follow
+        if any(formset.has_changed() for formset in formsets):
+            refresh_order_summary(form.instance)
+
+
+@admin.register(OrderStatusJob)
+class OrderStatusJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "progress", "failed", "created_by", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("status", "order_ids", "total", "sent", "failed", "created_by", "created_at", "finished_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Sent")
+    def progress(self, obj):
+        return f"{obj.sent} / {obj.total}"
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("order", "product", "quantity", "status", "expires_at")
+    list_filter = ("status",)
+    search_fields = ("order__id", "product__name")
+    raw_id_fields = ("order", "product")
+
+
+@admin.register(CartArchive)
+class CartArchiveAdmin(admin.ModelAdmin):
+    list_display = ("chat_id", "created_at", "last_activity_at", "archived_at")
+    search_fields = ("chat_id",)
+    readonly_fields = ("chat_id", "created_at", "last_activity_at", "archived_at", "items")
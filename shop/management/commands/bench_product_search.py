@@ -0,0 +1,98 @@
+# shop/management/commands/bench_product_search.py
+#  in terminal use "python manage.py bench_product_search --seed 100000 --queries 500"
+# Latency of the inline product search, uncached (database) and cached (Redis). --seed first adds
+# that many synthetic products to a "Benchmark" category (removed again with --cleanup).
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.models import Category, Product
+from shop.services.search_service import _search_db, normalize_query, search_products
+
+
+WORDS = [
+    "milk", "fresh", "organic", "cheese", "bread", "apple", "banana", "chicken", "beef", "water",
+    "juice", "orange", "tomato", "potato", "yogurt", "butter", "eggs", "rice", "pasta", "coffee",
+    "tea", "honey", "salmon", "tuna", "lettuce", "carrot", "onion", "garlic", "lemon", "grape",
+]
+BENCH_SLUG = "search-benchmark"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Measure inline product search latency (p50 / p95), uncached and cached."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Create this many synthetic products first")
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument("--target-ms", type=float, default=20.0, help="Fail if the uncached p95 is above this")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic products and exit")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            deleted = Product.objects.filter(category__slug=BENCH_SLUG).delete()[0]
+            Category.objects.filter(slug=BENCH_SLUG).delete()
+            self.stdout.write(f"deleted {deleted} rows")
+            return
+
+        if options["seed"]:
+            self.seed(options["seed"])
+
+        rng = random.Random(42)
+        # what people type: one or two words, often still incomplete, now and then misspelt
+        queries = []
+        for _ in range(options["queries"]):
+            words = rng.sample(WORDS, rng.choice((1, 1, 2)))
+            query = " ".join(words)
+            if rng.random() < 0.5:
+                query = query[:rng.randint(2, len(query))]
+            elif rng.random() < 0.2:
+                position = rng.randrange(len(query))
+                query = query[:position] + query[position + 1:]
+            queries.append(query)
+
+        uncached = self.timed(lambda query: _search_db(normalize_query(query)), queries)
+        for query in queries:  # warm the cache
+            search_products(query)
+        cached = self.timed(search_products, queries)
+
+        for label, timings in (("uncached", uncached), ("cached", cached)):
+            self.stdout.write(
+                f"{label:>8}: p50 {percentile(timings, 50):.2f} ms, p95 {percentile(timings, 95):.2f} ms, "
+                f"max {max(timings):.2f} ms, mean {statistics.mean(timings):.2f} ms"
+            )
+
+        p95 = percentile(uncached, 95)
+        if p95 > options["target_ms"]:
+            raise CommandError(f"uncached p95 {p95:.2f} ms is above {options['target_ms']} ms")
+        self.stdout.write(self.style.SUCCESS(f"OK: uncached p95 {p95:.2f} ms over {Product.objects.count()} products"))
+
+    def timed(self, search, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def seed(self, count):
+        category, _ = Category.objects.get_or_create(slug=BENCH_SLUG, defaults={"name": "Benchmark"})
+        rng = random.Random(7)
+        batch = []
+        for number in range(count):
+            name = " ".join(rng.sample(WORDS, 3)).title() + f" {number}"
+            batch.append(Product(
+                category=category, name=name, price=rng.randint(1, 200),
+                description=" ".join(rng.choices(WORDS, k=12)), stock=100,
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        self.stdout.write(f"seeded {count} products")
@@ -0,0 +1,28 @@
+# shop/management/commands/order_partitions.py
+#  in terminal use "python manage.py order_partitions"                      -> create the coming months
+#                  "python manage.py order_partitions --archive --keep-months 24" -> also archive old months
+from django.core.management.base import BaseCommand
+
+from shop.services.partition_service import PARTITIONED_TABLES, archive_order_partitions, ensure_order_partitions, list_partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly Order/OrderItem partitions and optionally detach old ones to the archive schema."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=None, help="Months to create ahead (default: ORDER_PARTITIONS_AHEAD)")
+        parser.add_argument("--archive", action="store_true", help="Detach partitions older than --keep-months")
+        parser.add_argument("--keep-months", type=int, default=None, help="Default: ORDER_PARTITION_KEEP_MONTHS")
+
+    def handle(self, *args, **options):
+        for name in ensure_order_partitions(options["ahead"]):
+            self.stdout.write(f"created {name}")
+
+        if options["archive"]:
+            for name in archive_order_partitions(options["keep_months"]):
+                self.stdout.write(f"archived {name}")
+
+        for table in PARTITIONED_TABLES:
+            months = sorted(list_partitions(table))
+            span = f"{months[0][0]}-{months[0][1]:02d} .. {months[-1][0]}-{months[-1][1]:02d}" if months else "none"
+            self.stdout.write(self.style.SUCCESS(f"{table}: {len(months)} monthly partitions ({span})"))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:34
+
+from django.db import migrations, models
+
+
+def backfill_order_summaries(apps, schema_editor):
+    Order = apps.get_model("shop", "Order")
+    batch = []
+    for order in Order.objects.prefetch_related("items__product").iterator(chunk_size=500):
+        items = list(order.items.all())
+        order.item_count = sum(item.quantity for item in items)
+        summary = ", ".join(f"{item.product.name} x{item.quantity}" for item in items)
+        order.summary = summary if len(summary) <= 255 else summary[:254] + "…"
+        batch.append(order)
+        if len(batch) >= 500:
+            Order.objects.bulk_update(batch, ["item_count", "summary"])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ["item_count", "summary"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_cart_cartitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='summary',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['chat_id', '-created_at', '-id'], name='order_chat_history_idx'),
+        ),
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_order_item_count_order_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0010_deliveryslot'),
+        ('shop', '0006_order_latitude_longitude'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='delivery.deliveryslot'),
+        ),
+    ]
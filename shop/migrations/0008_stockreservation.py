@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_order_delivery_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('reserved', 'Reserved'), ('paid', 'Paid'), ('fulfilled', 'Fulfilled'), ('released', 'Released')], default='reserved', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.product')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['reserved', 'paid'])), fields=['status', 'expires_at'], name='reservation_open_idx')],
+            },
+        ),
+    ]
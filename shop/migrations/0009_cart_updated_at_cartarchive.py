@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:51
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_cart_activity(apps, schema_editor):
+    # existing carts: last activity unknown -> their creation time (not the migration time)
+    Cart = apps.get_model("shop", "Cart")
+    Cart.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(db_index=True)),
+                ('created_at', models.DateTimeField()),
+                ('last_activity_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('items', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_cart_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['is_active', 'updated_at'], name='cart_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:56
+#
+# Rebuilds shop_order / shop_orderitem as tables range-partitioned by month:
+#   shop_order      PARTITION BY RANGE (created_at),       PK (id, created_at)
+#   shop_orderitem  PARTITION BY RANGE (order_created_at), PK (id, order_created_at)
+# with one partition per month from the oldest order to 3 months ahead, plus a DEFAULT
+# partition as a safety net. Later months are created by shop/services/partition_service.py.
+# The tables are copied -> run it in a maintenance window on a big database. Irreversible.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+PARTITION_SQL = """
+-- 1. new partitioned parents with the same columns / defaults / checks
+ALTER TABLE shop_order RENAME TO shop_order_unpartitioned;
+CREATE TABLE shop_order (LIKE shop_order_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (created_at);
+ALTER TABLE shop_order ADD PRIMARY KEY (id, created_at);
+
+-- items carry their order's created_at as partition key
+ALTER TABLE shop_orderitem ADD COLUMN order_created_at timestamp with time zone;
+UPDATE shop_orderitem AS item SET order_created_at = o.created_at
+    FROM shop_order_unpartitioned AS o WHERE o.id = item.order_id;
+ALTER TABLE shop_orderitem RENAME TO shop_orderitem_unpartitioned;
+CREATE TABLE shop_orderitem (LIKE shop_orderitem_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (order_created_at);
+ALTER TABLE shop_orderitem ALTER COLUMN order_created_at SET NOT NULL;
+ALTER TABLE shop_orderitem ADD PRIMARY KEY (id, order_created_at);
+
+-- 2. monthly partitions (UTC months) + default partitions
+DO $$
+DECLARE
+    m timestamp := date_trunc('month', COALESCE((SELECT MIN(created_at) FROM shop_order_unpartitioned), now()) AT TIME ZONE 'UTC');
+    last_m timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    WHILE m <= last_m LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF shop_order FOR VALUES FROM (%L) TO (%L)',
+                       'shop_order_p' || to_char(m, 'YYYY_MM'), m AT TIME ZONE 'UTC', (m + interval '1 month') AT TIME ZONE 'UTC');
+        EXECUTE format('CREATE TABLE %I PARTITION OF shop_orderitem FOR VALUES FROM (%L) TO (%L)',
+                       'shop_orderitem_p' || to_char(m, 'YYYY_MM'), m AT TIME ZONE 'UTC', (m + interval '1 month') AT TIME ZONE 'UTC');
+        m := m + interval '1 month';
+    END LOOP;
+END $$;
+CREATE TABLE shop_order_default PARTITION OF shop_order DEFAULT;
+CREATE TABLE shop_orderitem_default PARTITION OF shop_orderitem DEFAULT;
+
+-- 3. copy the rows, drop the old tables (and the foreign keys that pointed at them)
+INSERT INTO shop_order SELECT * FROM shop_order_unpartitioned;
+INSERT INTO shop_orderitem SELECT * FROM shop_orderitem_unpartitioned;
+DROP TABLE shop_orderitem_unpartitioned;
+DROP TABLE shop_order_unpartitioned CASCADE;
+
+-- 4. ids keep counting from where they were
+CREATE SEQUENCE shop_order_id_seq OWNED BY shop_order.id;
+SELECT setval('shop_order_id_seq', COALESCE((SELECT MAX(id) FROM shop_order), 0) + 1, false);
+ALTER TABLE shop_order ALTER COLUMN id SET DEFAULT nextval('shop_order_id_seq');
+CREATE SEQUENCE shop_orderitem_id_seq OWNED BY shop_orderitem.id;
+SELECT setval('shop_orderitem_id_seq', COALESCE((SELECT MAX(id) FROM shop_orderitem), 0) + 1, false);
+ALTER TABLE shop_orderitem ALTER COLUMN id SET DEFAULT nextval('shop_orderitem_id_seq');
+
+-- 5. indexes and outgoing foreign keys (created on every partition)
+CREATE INDEX order_chat_history_idx ON shop_order (chat_id, created_at DESC, id DESC);
+CREATE INDEX shop_order_delivery_slot_id_idx ON shop_order (delivery_slot_id);
+ALTER TABLE shop_order ADD CONSTRAINT shop_order_delivery_slot_id_fk
+    FOREIGN KEY (delivery_slot_id) REFERENCES delivery_deliveryslot (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX shop_orderitem_order_id_idx ON shop_orderitem (order_id);
+CREATE INDEX shop_orderitem_product_id_idx ON shop_orderitem (product_id);
+ALTER TABLE shop_orderitem ADD CONSTRAINT shop_orderitem_product_id_fk
+    FOREIGN KEY (product_id) REFERENCES shop_product (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0011_delivery_order_no_db_constraint'),
+        ('shop', '0009_cart_updated_at_cartarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.order'),
+        ),
+        migrations.AlterField(
+            model_name='stockreservation',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.order'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='orderitem',
+                    name='order_created_at',
+                    field=models.DateTimeField(editable=False),
+                    preserve_default=False,
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(PARTITION_SQL),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_orderstatusjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutConfirmation',
+            fields=[
+                ('token', models.UUIDField(primary_key=True, serialize=False)),
+                ('chat_id', models.BigIntegerField()),
+                ('payment_url', models.URLField(blank=True, max_length=1000)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.order')),
+            ],
+        ),
+    ]
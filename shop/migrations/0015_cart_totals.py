@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:10
+
+from django.db import migrations, models
+
+
+# existing carts: totals from their items, in one statement
+BACKFILL_CART_TOTALS = """
+UPDATE shop_cart c
+SET item_count = s.item_count, total = s.total
+FROM (
+    SELECT cart_id, SUM(quantity) AS item_count, SUM(quantity * price) AS total
+    FROM shop_cartitem
+    GROUP BY cart_id
+) s
+WHERE c.id = s.cart_id
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_customerprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunSQL(BACKFILL_CART_TOTALS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_category_page_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='oversold',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_order_oversold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkoutconfirmation',
+            index=models.Index(fields=['chat_id'], name='checkout_chat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutconfirmation',
+            index=models.Index(fields=['created_at'], name='checkout_created_idx'),
+        ),
+    ]
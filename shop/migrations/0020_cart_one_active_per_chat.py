@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:12
+
+from django.db import migrations, models
+
+
+# older duplicates of a chat's active cart (possible before the constraint) are deactivated,
+# the compaction job archives them like any abandoned cart
+DEACTIVATE_DUPLICATES_SQL = """
+UPDATE shop_cart SET is_active = false
+WHERE is_active AND id NOT IN (
+    SELECT DISTINCT ON (chat_id) id FROM shop_cart WHERE is_active ORDER BY chat_id, updated_at DESC, id DESC
+)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_checkoutconfirmation_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEACTIVATE_DUPLICATES_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('chat_id',), name='cart_one_active_per_chat'),
+        ),
+    ]
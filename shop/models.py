@@ -3,9 +3,13 @@ import uuid
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models.functions import Upper
 # validation
-import re
 from django.core.exceptions import ValidationError
+from core.mixins import DirtyFieldsMixin
+from core.validators import EMAIL_REGEX, NAME_REGEX, PHONE_REGEX
 
 
 
@@ -19,7 +23,7 @@ class Category(models.Model):
 
 
 
-class Product(models.Model):
+class Product(DirtyFieldsMixin, models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -27,22 +31,44 @@ class Product(models.Model):
     stock = models.IntegerField(default=0)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Telegram's file_id of the image once the bot has uploaded it: re-sent / shown in inline
+    # results without another upload. Cleared when the image changes.
+    telegram_file_id = models.CharField(max_length=255, blank=True, editable=False)
+    # inline search (shop.services.search_service): name weighs more than description
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config="simple") + SearchVector("description", weight="B", config="simple"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_idx"),
+            # typo-tolerant fallback: word similarity on the name
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="product_name_trgm"),
+            # keyset pages of a category's products (shop.services.catalog_service)
+            models.Index(fields=["category", "id"], name="product_category_page_idx", condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.price} SAR)"
 
+    def save(self, *args, **kwargs):
+        # a new image -> the copy Telegram has is of the old one
+        dirty = self.get_dirty_fields()
+        if dirty and "image" in dirty:
+            self.telegram_file_id = ""
+        super().save(*args, **kwargs)
+
+    # validated on save -- only the changed fields (DirtyFieldsMixin)
     def clean(self):
-        if self.price < 0:
+        if self.validates("price") and self.price < 0:
             raise ValidationError({"price": "Price cannot be negative."})
-        if self.stock < 0:
+        if self.validates("stock") and self.stock < 0:
             raise ValidationError({"stock": "Stock cannot be negative."})
-        if not self.name.strip():
+        if self.validates("name") and not self.name.strip():
             raise ValidationError({"name": "Product name cannot be empty."})
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
 
 
 
@@ -50,11 +76,40 @@ class Cart(models.Model):
     chat_id = models.BigIntegerField(db_index=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # last add / change of an item (cart_service.apply_cart_changes) -> abandoned carts are found by this
+    updated_at = models.DateTimeField(auto_now=True)
+    # sum of the items' quantity / quantity * price, kept up to date by cart_service.apply_cart_changes
+    # (cart_service.reconcile_cart_totals repairs any drift)
+    item_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # one active cart per chat, even when two first taps race (cart_service.apply_cart_changes)
+            models.UniqueConstraint(fields=["chat_id"], condition=models.Q(is_active=True), name="cart_one_active_per_chat"),
+        ]
+        indexes = [
+            # the compaction job walks carts by (is_active, last activity)
+            models.Index(fields=["is_active", "updated_at"], name="cart_activity_idx"),
+        ]
 
     def __str__(self):
         return f"Cart {self.id} (chat_id={self.chat_id})"
 
 
+# Compact snapshot of an abandoned cart (one row instead of a Cart + its CartItems)
+class CartArchive(models.Model):
+    chat_id = models.BigIntegerField(db_index=True)
+    created_at = models.DateTimeField()
+    last_activity_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    # [[product_id, quantity, "price"], ...]
+    items = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Archived cart (chat_id={self.chat_id}, {len(self.items)} items)"
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart,on_delete=models.CASCADE,related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -69,7 +124,10 @@ class CartItem(models.Model):
 
 
 
-class Order(models.Model):
+# shop_order / shop_orderitem are range-partitioned by month (migration 0010, shop/services/partition_service.py).
+# The database primary keys are (id, created_at) / (id, order_created_at), so foreign keys
+# pointing at them are not enforced by Postgres (db_constraint=False) -- the ORM still cascades.
+class Order(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('pending','Pending'),
         ('accepted','Accepted'),
@@ -77,6 +135,15 @@ class Order(models.Model):
         ('cancelled','Cancelled'),
         ('done','Done'),
     ]
+    # status -> statuses it may move to. Status changes go through
+    # shop.services.order_service.transition_order / bulk_transition (compare-and-set UPDATEs)
+    TRANSITIONS = {
+        'pending': ('accepted', 'done', 'cancelled'),
+        'accepted': ('shipped', 'cancelled'),
+        'shipped': ('done',),
+        'done': (),
+        'cancelled': (),
+    }
 
     chat_id = models.BigIntegerField() 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -86,6 +153,13 @@ class Order(models.Model):
     address = models.TextField(blank=True)
     phone = models.CharField(max_length=40, blank=True)
     email = models.EmailField(blank=True, null=True)  # Add this line
+    # delivery point, when known at checkout (shared location / cached geocode)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    # capacity is taken in Redis before the order exists, see delivery/services/slot_service.py
+    delivery_slot = models.ForeignKey(
+        "delivery.DeliverySlot", on_delete=models.SET_NULL, null=True, blank=True, related_name="orders"
+    )
 
     # stripe fields
     stripe_session_id = models.CharField(
@@ -94,61 +168,174 @@ class Order(models.Model):
     stripe_payment_intent_id = models.CharField(
         max_length=255, blank=True, null=True, help_text="Stripe PaymentIntent ID"
     )
+
+    # denormalized for the bot's order history (a page never touches OrderItem)
+    item_count = models.PositiveIntegerField(default=0)
+    summary = models.CharField(max_length=255, blank=True)
+    # paid after its stock reservation was released and the units were sold again (refund or restock)
+    oversold = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of one customer's history: (created_at, id) DESC
+            models.Index(fields=["chat_id", "-created_at", "-id"], name="order_chat_history_idx"),
+            # admin search: icontains is UPPER(col) LIKE UPPER('%x%') -> trigram indexes on UPPER(col)
+            GinIndex(OpClass(Upper("customer_name"), name="gin_trgm_ops"), name="order_customer_name_trgm"),
+            GinIndex(OpClass(Upper("phone"), name="gin_trgm_ops"), name="order_phone_trgm"),
+            GinIndex(OpClass(Upper("address"), name="gin_trgm_ops"), name="order_address_trgm"),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.status} - {self.total} SAR"
 
+    def set_items_summary(self, items):
+        """Fill item_count / summary from the order lines (anything with .product and .quantity)."""
+        self.item_count = sum(item.quantity for item in items)
+        summary = ", ".join(f"{item.product.name} x{item.quantity}" for item in items)
+        max_length = self._meta.get_field("summary").max_length
+        self.summary = summary if len(summary) <= max_length else summary[:max_length - 1] + "…"
+
 
+    # validated on save -- only the changed fields (DirtyFieldsMixin)
     def clean(self):
         # 1️⃣ Name validation (letters and spaces, min 2 chars)
-        if self.customer_name:
-            if not re.match(r"^[A-Za-z\s]{2,}$", self.customer_name):
+        if self.customer_name and self.validates("customer_name"):
+            if not NAME_REGEX.match(self.customer_name):
                 raise ValidationError({"customer_name": "Name must contain letters only and at least 2 characters."})
 
         # 2️⃣ Phone validation (7–15 digits, optional +)
-        if self.phone:
-            if not re.match(r"^\+?\d{7,15}$", self.phone):
+        if self.phone and self.validates("phone"):
+            if not PHONE_REGEX.match(self.phone):
                 raise ValidationError({"phone": "Invalid phone number format."})
 
         # 3️⃣ Email validation (optional)
-        if self.email:
-            if not re.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", self.email):
+        if self.email and self.validates("email"):
+            if not EMAIL_REGEX.match(self.email):
                 raise ValidationError({"email": "Invalid email format."})
 
         # 4️⃣ Address validation (min 5 chars)
-        if self.address and len(self.address.strip()) < 5:
+        if self.address and self.validates("address") and len(self.address.strip()) < 5:
             raise ValidationError({"address": "Address is too short."})
 
-    def save(self, *args, **kwargs):
-        # Ensure validation runs on save
-        self.full_clean()
-        super().save(*args, **kwargs)
-
 
 
 
-class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+class OrderItem(DirtyFieldsMixin, models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_constraint=False)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # partition key: copy of order.created_at, so an order's items live in the same month partition
+    order_created_at = models.DateTimeField(editable=False)
 
     def __str__(self):
-        return f"{self.quantity} × {self.product.name} (Order #{self.order.id})"
+        # order_id, not order.id: the admin inline renders this for every row
+        return f"{self.quantity} × {self.product.name} (Order #{self.order_id})"
 
     def clean(self):
         # Quantity must be at least 1
-        if self.quantity < 1:
+        if self.validates("quantity") and self.quantity < 1:
             raise ValidationError({"quantity": "Quantity must be at least 1."})
         
         # Price must be >= 0
-        if self.price < 0:
+        if self.validates("price") and self.price < 0:
             raise ValidationError({"price": "Price cannot be negative."})
 
-        # Stock check
-        if self.product and self.quantity > self.product.stock:
-            raise ValidationError({"quantity": f"Quantity exceeds available stock ({self.product.stock})."})
+        # Stock check (reads the product -> only when quantity / product is being saved)
+        if (self.validates("quantity") or self.validates("product")) and self.product_id:
+            if self.quantity > self.product.stock:
+                raise ValidationError({"quantity": f"Quantity exceeds available stock ({self.product.stock})."})
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.order_created_at is None:
+            self.order_created_at = self.order.created_at
+        super().save(*args, **kwargs)
+
+
+
+# Delivery details a customer last checked out with (shop.services.customer_service):
+# a returning customer confirms them with one tap instead of typing them again
+class CustomerProfile(models.Model):
+    chat_id = models.BigIntegerField(unique=True)
+    customer_name = models.CharField(max_length=200, blank=True)
+    phone = models.CharField(max_length=40, blank=True)
+    address = models.TextField(blank=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    email = models.EmailField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.customer_name or '—'} (chat_id={self.chat_id})"
+
+
+
+# One confirmed checkout conversation (bot.checkout_confirm). Its token travels in the
+# "✅ Yes, proceed" callback_data: a double tap / redelivered update finds this row and gets the
+# same order + payment link back instead of a second order. Kept apart from Order because a
+# unique index on the partitioned shop_order would have to include created_at.
+class CheckoutConfirmation(models.Model):
+    token = models.UUIDField(primary_key=True)
+    chat_id = models.BigIntegerField()
+    # empty while the first confirmation is still creating the order
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name="+", db_constraint=False)
+    payment_url = models.URLField(max_length=1000, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["chat_id"], name="checkout_chat_idx"),
+            # the daily purge (order_service.purge_checkout_confirmations)
+            models.Index(fields=["created_at"], name="checkout_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Checkout {self.token} → order #{self.order_id or '…'}"
+
+
+
+# One admin bulk status change: the orders moved in one UPDATE, the customers notified by
+# rate-spaced Celery subtasks (shop.tasks.notify_status_job_task) that fill in the progress
+class OrderStatusJob(models.Model):
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_ids = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.total} orders → {self.status} ({self.sent + self.failed}/{self.total} notified)"
+
+
+
+
+# Stock held for an order between checkout confirmation and payment.
+# Live availability is a Redis counter per product (shop/services/inventory_service.py);
+# Product.stock only drops when paid reservations are applied in batches.
+class StockReservation(models.Model):
+    STATUS_CHOICES = [
+        ('reserved', 'Reserved'),      # holding stock until expires_at
+        ('paid', 'Paid'),              # order paid, not yet subtracted from Product.stock
+        ('fulfilled', 'Fulfilled'),    # subtracted from Product.stock
+        ('released', 'Released'),      # cancelled / expired, stock given back
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations', db_constraint=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='reserved')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the expiry sweep and the stock flush only ever look at open reservations
+            models.Index(fields=["status", "expires_at"], name="reservation_open_idx",
+                         condition=models.Q(status__in=["reserved", "paid"])),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} × {self.product_id} for order #{self.order_id} ({self.status})"
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from shop.models import Order, OrderItem, Product
+from core.validators import NAME_REGEX, PHONE_REGEX
 
 
 
@@ -69,14 +70,12 @@ class OrderSerializer(serializers.ModelSerializer):
 
     # Field-level validations
     def validate_customer_name(self, value):
-        import re
-        if not re.match(r'^[A-Za-z\s]{2,}$', value):
+        if not NAME_REGEX.match(value):
             raise serializers.ValidationError("Enter a valid full name (letters and spaces only).")
         return value
 
     def validate_phone(self, value):
-        import re
-        if not re.match(r'^\+?\d{7,15}$', value):
+        if not PHONE_REGEX.match(value):
             raise serializers.ValidationError("Enter a valid phone number (7–15 digits, optional +).")
         return value
 
@@ -100,12 +99,14 @@ class OrderSerializer(serializers.ModelSerializer):
         items_data = validated_data.pop('items')
         order = Order.objects.create(**validated_data)
         total = 0
+        order_items = []
         for item_data in items_data:
             product = item_data['product']
             quantity = item_data['quantity']
             price = item_data['price']
-            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price)
+            order_items.append(OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price))
             total += price * quantity
         order.total = total
-        order.save()
+        order.set_items_summary(order_items)
+        order.save(update_fields=["total", "item_count", "summary"])
         return order
@@ -1,71 +1,181 @@
 # shop/services/cart_service.py
-from shop.models import Cart,CartItem, Product
-from asgiref.sync import sync_to_async
-
-
-
-# Get or create active cart
-@sync_to_async
-def get_or_create_active_cart(chat_id):
-    cart = Cart.objects.filter(chat_id=chat_id, is_active=True).first()
-    if cart:
-        return cart
-    return Cart.objects.create(chat_id=chat_id)
-
-
-
-
-
-# Add a product to the cart
-@sync_to_async
-def add_product_to_cart(cart, product_id, qty=1):
-    product = Product.objects.get(id=product_id, is_active=True)
-    item = CartItem.objects.filter(cart=cart, product=product).first()
-    if item:
-        item.quantity += qty
-        item.save()
-    else:
-        CartItem.objects.create(cart=cart, product=product, quantity=qty, price=product.price)
+from datetime import timedelta
 
+from django.conf import settings
+from decimal import Decimal
 
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from shop.models import Cart, CartArchive, CartItem, Product
+from asgiref.sync import sync_to_async
 
 
-
-
-# Change product quantity
-# @sync_to_async
-# @transaction.atomic
-# def change_product_quantity(cart, product_id, delta):
-#     item = CartItem.objects.filter(cart=cart, product_id=product_id).first()
-#     if not item:
-#         return
-#     item.quantity += delta
-#     if item.quantity <= 0:
-#         item.delete()
-#     else:
-#         item.save()
-
-
-
+COMPACT_BATCH_SIZE = 500
 
 
 
-# Remove product from cart
+# Active cart or None -- browsing, /cart and /checkout never create one
 @sync_to_async
-def remove_from_cart(cart, product_id):
-    item = CartItem.objects.filter(cart=cart, product_id=product_id).first()
-    if item:
-        item.delete()
-
-
+def get_active_cart(chat_id):
+    return Cart.objects.filter(chat_id=chat_id, is_active=True).first()
 
 
+# A burst of cart taps (bot.queue_cart_tap) in ONE transaction.
+# changes: {product_id: (remove, delta)} -- remove drops the line first, delta is the net of the ➕ / ➖ taps.
+# Only a positive delta creates a cart / a line. Cart.item_count / total move by the same amounts
+# in the same transaction. Returns the cart (None if there is none).
 @sync_to_async
-def get_cart_item(cart, product_id):
-    return CartItem.objects.filter(cart=cart, product_id=product_id).first()
-
-
-# @sync_to_async
-# def get_cart_items(cart):
-#     return list(CartItem.objects.filter(cart=cart))
\ No newline at end of file
+def apply_cart_changes(chat_id, changes):
+    with transaction.atomic():
+        # the row lock also keeps the compaction job (skip_locked) away from this cart
+        cart = Cart.objects.select_for_update().filter(chat_id=chat_id, is_active=True).first()
+        if cart is None:
+            if not any(delta > 0 for _, delta in changes.values()):
+                return None
+            # a racing first tap of the same chat may create it first (one active cart per chat)
+            Cart.objects.get_or_create(chat_id=chat_id, is_active=True)
+            cart = Cart.objects.select_for_update().get(chat_id=chat_id, is_active=True)
+
+        items = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(cart=cart, product_id__in=list(changes))
+        }
+        products = Product.objects.filter(
+            id__in=[product_id for product_id, (_, delta) in changes.items() if product_id not in items and delta > 0],
+            is_active=True,
+        ).in_bulk()
+
+        count_delta, total_delta = 0, Decimal("0.00")
+        for product_id, (remove, delta) in changes.items():
+            item = items.get(product_id)
+            before = item.quantity if item else 0
+            quantity = max((0 if remove else before) + delta, 0)
+            if quantity == 0:
+                if item:
+                    item.delete()
+            elif item:
+                item.quantity = quantity
+                item.save(update_fields=["quantity"])
+            elif product_id in products:
+                product = products[product_id]
+                item = CartItem.objects.create(cart=cart, product=product, quantity=quantity, price=product.price)
+            else:
+                continue
+            count_delta += quantity - before
+            total_delta += (quantity - before) * item.price
+
+        Cart.objects.filter(id=cart.id).update(
+            item_count=F("item_count") + count_delta, total=F("total") + total_delta, updated_at=timezone.now()
+        )
+        cart.refresh_from_db(fields=["item_count", "total", "updated_at"])
+    return cart
+
+
+
+
+# ------------------ Totals consistency ------------------
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _line_sums(prefix=""):
+    """(item count, total) aggregates over cart lines; prefix "items__" when starting from Cart."""
+    return (
+        Coalesce(Sum(f"{prefix}quantity"), 0),
+        Coalesce(Sum(F(f"{prefix}quantity") * F(f"{prefix}price"), output_field=MONEY), Decimal("0.00"), output_field=MONEY),
+    )
+
+
+def reconcile_cart_totals():
+    """
+    Repair active carts whose item_count / total disagree with their items (an item deleted by a
+    product cascade, a manual edit, ...). Each repair re-reads the cart under its row lock, so a
+    concurrent cart mutation is never overwritten. Returns the number of carts fixed.
+    """
+    real_count, real_total = _line_sums("items__")
+    drifted = list(
+        Cart.objects.filter(is_active=True)
+        .annotate(real_count=real_count, real_total=real_total)
+        .exclude(item_count=F("real_count"), total=F("real_total"))
+        .values_list("id", flat=True)
+    )
+    fixed = 0
+    for cart_id in drifted:
+        with transaction.atomic():
+            if not Cart.objects.select_for_update().filter(id=cart_id).exists():
+                continue
+            count, total = _line_sums()
+            real = CartItem.objects.filter(cart_id=cart_id).aggregate(count=count, total=total)
+            fixed += Cart.objects.filter(id=cart_id).update(item_count=real["count"], total=real["total"])
+    return fixed
+
+
+
+
+# ------------------ Compaction ------------------
+def _delete_batches(carts):
+    """Delete the matching carts (and their items) in short transactions. Returns rows deleted."""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                carts.select_for_update(skip_locked=True, of=("self",)).values_list("id", flat=True)[:COMPACT_BATCH_SIZE]
+            )
+            if not ids:
+                break
+            deleted += Cart.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+
+def _archive_batches(carts):
+    """Snapshot the matching carts into CartArchive, then delete them. Returns (carts archived, rows deleted)."""
+    archived = deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                carts.select_for_update(skip_locked=True, of=("self",))
+                .prefetch_related("items")[:COMPACT_BATCH_SIZE]
+            )
+            if not batch:
+                break
+            CartArchive.objects.bulk_create([
+                CartArchive(
+                    chat_id=cart.chat_id,
+                    created_at=cart.created_at,
+                    last_activity_at=cart.updated_at,
+                    items=[[item.product_id, item.quantity, str(item.price)] for item in cart.items.all()],
+                )
+                for cart in batch
+            ])
+            deleted += Cart.objects.filter(id__in=[cart.id for cart in batch]).delete()[0]
+            archived += len(batch)
+    return archived, deleted
+
+
+def compact_carts():
+    """
+    Bounded Cart / CartItem tables (scheduled daily by celery beat):
+      - empty carts idle for CART_EMPTY_GRACE_HOURS      -> deleted
+      - checked-out carts older than CART_INACTIVE_DAYS  -> deleted (the Order keeps the lines)
+      - active carts idle for CART_ABANDONED_DAYS        -> archived to CartArchive, then deleted
+    Returns the rows reclaimed per kind.
+    """
+    now = timezone.now()
+    empty = _delete_batches(Cart.objects.filter(
+        items__isnull=True, updated_at__lt=now - timedelta(hours=settings.CART_EMPTY_GRACE_HOURS)
+    ))
+    inactive = _delete_batches(Cart.objects.filter(
+        is_active=False, updated_at__lt=now - timedelta(days=settings.CART_INACTIVE_DAYS)
+    ))
+    archived, abandoned = _archive_batches(Cart.objects.filter(
+        is_active=True, updated_at__lt=now - timedelta(days=settings.CART_ABANDONED_DAYS)
+    ))
+    return {
+        "empty_rows": empty,
+        "inactive_rows": inactive,
+        "abandoned_rows": abandoned,
+        "archived_carts": archived,
+        "total_rows": empty + inactive + abandoned,
+    }
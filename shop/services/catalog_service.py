@@ -0,0 +1,69 @@
+# shop/services/catalog_service.py
+# Product list of a category, one page at a time (bot: cat_<id>, then ◀️ / ▶️):
+#   - keyset pages on id (partial index product_category_page_idx), never an OFFSET, never the whole category
+#   - a rendered page is cached in Redis; the key carries the category's version, which any save / delete
+#     of one of its products (or of the category) bumps -> stale pages are simply never read again
+import json
+
+from core.db_router import replica_alias
+from core.redis_client import get_redis
+from shop.models import Category, Product
+
+
+CATEGORY_PAGE_SIZE = 8
+CATEGORY_PAGE_CACHE_SECONDS = 600
+
+
+def version_key(category_id):
+    return f"shop:catalog:{category_id}:version"
+
+
+
+
+def _load_category_page(category_id, cursor, back):
+    name = Category.objects.using(replica_alias()).filter(id=category_id).values_list("name", flat=True).first()
+    if name is None:
+        return None
+
+    qs = Product.objects.using(replica_alias()).filter(category_id=category_id, is_active=True)
+    if cursor is None:
+        qs = qs.order_by("id")
+    elif back:
+        qs = qs.filter(id__lt=cursor).order_by("-id")
+    else:
+        qs = qs.filter(id__gt=cursor).order_by("id")
+
+    # one extra row tells us whether there is another page in that direction
+    rows = [[product_id, product_name, str(price)] for product_id, product_name, price in qs.values_list("id", "name", "price")[:CATEGORY_PAGE_SIZE + 1]]
+    has_more = len(rows) > CATEGORY_PAGE_SIZE
+    rows = rows[:CATEGORY_PAGE_SIZE]
+    if back:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = cursor is not None, has_more
+    return {"category": name, "products": rows, "has_prev": has_prev, "has_next": has_next}
+
+
+def get_category_page(category_id, cursor=None, back=False):
+    """
+    {"category": name, "products": [[id, name, price], ...], "has_prev", "has_next"}, or None if the
+    category doesn't exist. cursor=None -> first page; otherwise the page after (before, back=True) that id.
+    """
+    client = get_redis()
+    key = f"shop:catalog:{category_id}:{client.get(version_key(category_id)) or 0}:{'p' if back else 'n'}:{cursor or 0}"
+    cached = client.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    page = _load_category_page(category_id, cursor, back)
+    if page is not None:
+        client.set(key, json.dumps(page), ex=CATEGORY_PAGE_CACHE_SECONDS)
+    return page
+
+
+def invalidate_category_pages(*category_ids):
+    pipe = get_redis().pipeline(transaction=False)
+    for category_id in {category_id for category_id in category_ids if category_id}:
+        pipe.incr(version_key(category_id))
+    pipe.execute()
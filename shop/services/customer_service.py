@@ -0,0 +1,55 @@
+# shop/services/customer_service.py
+# Saved checkout details per chat_id (CustomerProfile), for the one-tap "use saved details" checkout:
+#   - a customer without a profile row gets one derived from their latest order, once
+#   - every checkout writes the details it used back (save_customer_profile)
+#   - reads come from Redis (a JSON blob, "{}" = known to have no details) and hit the DB only on a miss
+import json
+
+from django.conf import settings
+
+from core.redis_client import get_redis
+from shop.models import CustomerProfile, Order
+
+
+PROFILE_FIELDS = ("customer_name", "phone", "address", "latitude", "longitude", "email")
+
+
+def profile_key(chat_id):
+    return f"shop:customer:{chat_id}"
+
+
+
+
+def _cache_profile(chat_id, profile):
+    get_redis().set(profile_key(chat_id), json.dumps(profile), ex=settings.CUSTOMER_PROFILE_CACHE_SECONDS)
+
+
+def _load_profile(chat_id):
+    profile = CustomerProfile.objects.filter(chat_id=chat_id).values(*PROFILE_FIELDS).first()
+    if profile:
+        return profile
+
+    # first visit since profiles exist -> derive it from the latest order (order_chat_history_idx)
+    order = Order.objects.filter(chat_id=chat_id).order_by("-created_at", "-id").values(*PROFILE_FIELDS).first()
+    if not order or not (order["customer_name"] and order["phone"] and order["address"]):
+        return {}
+    CustomerProfile.objects.get_or_create(chat_id=chat_id, defaults=order)
+    return order
+
+
+def get_customer_profile(chat_id):
+    """{customer_name, phone, address, latitude, longitude, email} or None when we know nothing yet."""
+    cached = get_redis().get(profile_key(chat_id))
+    if cached is not None:
+        profile = json.loads(cached)
+    else:
+        profile = _load_profile(chat_id)
+        _cache_profile(chat_id, profile)
+    return profile or None
+
+
+def save_customer_profile(chat_id, **details):
+    """details: the PROFILE_FIELDS used by the checkout that just created an order."""
+    profile = {name: details.get(name) for name in PROFILE_FIELDS}
+    CustomerProfile.objects.update_or_create(chat_id=chat_id, defaults=profile)
+    _cache_profile(chat_id, profile)
@@ -0,0 +1,217 @@
+# shop/services/inventory_service.py
+# Stock reservations that never queue buyers behind one Product row lock:
+#   checkout confirmed -> reserve_stock(): one Lua script, all cart lines or nothing, on Redis counters
+#                         ("units left" per product) + StockReservation rows with a TTL
+#   payment page       -> extend_reservations(): held as long as the Stripe session can still be paid
+#   paid               -> commit_order_stock(): reservations become 'paid'
+#   cancelled/expired  -> release_order_stock() / release_expired_reservations(): units go back
+#                         (expired + still unpaid -> the order is cancelled)
+#   every few seconds  -> apply_paid_reservations(): ONE aggregated UPDATE per product on Product.stock,
+#                         however many buyers paid for it in that window
+# A missing counter (new product, Redis flushed) is seeded from Postgres:
+#   stock - reserved - paid-but-not-yet-applied
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from core.redis_client import get_redis
+from shop.models import Order, Product, StockReservation
+from shop.services.order_service import transition_order
+
+
+logger = logging.getLogger(__name__)
+
+LEFT_KEY = "shop:stock:{}:left"
+
+HOLDING_STATUSES = ("reserved", "paid")
+APPLY_BATCH_SIZE = 5000
+
+# {0, 0} = reserved, {1, i} = counter of line i missing (caller seeds), {2, i} = line i short
+RESERVE_STOCK = """
+for i = 1, #KEYS do
+    local left = redis.call('GET', KEYS[i])
+    if not left then return {1, i} end
+    if tonumber(left) < tonumber(ARGV[i]) then return {2, i} end
+end
+for i = 1, #KEYS do
+    redis.call('DECRBY', KEYS[i], ARGV[i])
+end
+return {0, 0}
+"""
+
+# stock changed in the admin: shift the live counter by the difference
+ADJUST_STOCK = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+
+
+def left_key(product_id):
+    return LEFT_KEY.format(product_id)
+
+
+def seed_stock_counters(product_ids):
+    """Create missing counters from Postgres (one query; SET NX so a live counter always wins)."""
+    products = Product.objects.filter(id__in=product_ids).annotate(
+        held=Coalesce(Sum("reservations__quantity", filter=Q(reservations__status__in=HOLDING_STATUSES)), Value(0))
+    ).values_list("id", "stock", "held")
+
+    pipe = get_redis().pipeline(transaction=False)
+    for product_id, stock, held in products:
+        pipe.set(left_key(product_id), max(stock - held, 0), nx=True)
+    pipe.execute()
+
+
+def reserve_stock(lines):
+    """
+    lines: {product_id: quantity}. Takes every line atomically or none of them.
+    Returns None on success, else the id of the first product without enough stock.
+    """
+    product_ids = sorted(lines)
+    keys = [left_key(product_id) for product_id in product_ids]
+    quantities = [lines[product_id] for product_id in product_ids]
+
+    client = get_redis()
+    for _ in range(2):
+        status, index = client.eval(RESERVE_STOCK, len(keys), *keys, *quantities)
+        if status == 0:
+            return None
+        if status == 2:
+            return product_ids[index - 1]
+        seed_stock_counters(product_ids)
+    return product_ids[index - 1]
+
+
+def unreserve_stock(lines):
+    """Give units back to the counters (only for units whose reservation is no longer held)."""
+    pipe = get_redis().pipeline(transaction=False)
+    for product_id, quantity in lines.items():
+        if quantity:
+            pipe.incrby(left_key(product_id), quantity)
+    pipe.execute()
+
+
+def record_reservations(order, lines):
+    """Durable side of reserve_stock(): one StockReservation per line, all expiring together."""
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in lines.items()
+    ])
+
+
+def holds_reservations(order):
+    return StockReservation.objects.filter(order=order, status="reserved").exists()
+
+
+def extend_reservations(order, expires_at):
+    """Keep the order's held reservations until at least `expires_at` (its payment page's expiry)."""
+    StockReservation.objects.filter(order=order, status="reserved", expires_at__lt=expires_at).update(expires_at=expires_at)
+
+
+def adjust_stock_counter(product_id, delta):
+    get_redis().eval(ADJUST_STOCK, 1, left_key(product_id), delta)
+
+
+
+
+def _release(reservations):
+    """Flip held reservations to 'released' (row locks = exactly once), then refund the counters. Returns the order ids."""
+    with transaction.atomic():
+        rows = list(reservations.select_for_update(skip_locked=True).values_list("id", "order_id", "product_id", "quantity"))
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(status="released")
+
+    # a crash right here under-sells until the counter is re-seeded -- never over-sells
+    refund = defaultdict(int)
+    for _, _, product_id, quantity in rows:
+        refund[product_id] += quantity
+    unreserve_stock(refund)
+    return sorted({row[1] for row in rows})
+
+
+def release_order_stock(order):
+    """Order cancelled: its reserved units are available again."""
+    return _release(StockReservation.objects.filter(order=order, status="reserved"))
+
+
+def release_expired_reservations():
+    """
+    Reservations past their TTL go back on sale and their still unpaid orders are cancelled
+    (customer notice, delivery slot given back -- the status signals). Scheduled by celery beat.
+    Returns the ids of the orders whose reservations expired.
+    """
+    order_ids = _release(StockReservation.objects.filter(status="reserved", expires_at__lt=timezone.now()))
+    for order_id in order_ids:
+        transition_order(order_id, "cancelled", only_from=("pending",))
+    return order_ids
+
+
+def commit_order_stock(order):
+    """
+    Order paid: its reservations become 'paid' (applied to Product.stock by the next flush).
+    A reservation that already expired is taken again -- the customer has paid -- even if the
+    counter goes negative (only possible in the seconds between the expiry sweep and a payment
+    that was already under way). Such an order is flagged Order.oversold for the merchant to
+    refund or restock. Returns {product_id: units oversold}.
+    """
+    with transaction.atomic():
+        rows = list(
+            StockReservation.objects.select_for_update()
+            .filter(order=order, status__in=("reserved", "released"))
+            .values_list("id", "product_id", "quantity", "status")
+        )
+        StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(status="paid")
+
+    retaken = {product_id: quantity for _, product_id, quantity, status in rows if status == "released"}
+    if not retaken:
+        return {}
+
+    pipe = get_redis().pipeline(transaction=False)
+    for product_id, quantity in retaken.items():
+        pipe.decrby(left_key(product_id), quantity)
+    oversold = {
+        product_id: min(-left, retaken[product_id])
+        for product_id, left in zip(retaken, pipe.execute()) if left < 0
+    }
+    if oversold:
+        Order.objects.filter(id=order.id).update(oversold=True)
+        order.oversold = True
+        logger.warning("order #%s paid after its reservation expired, oversold: %s", order.id, oversold)
+    return oversold
+
+
+def apply_paid_reservations():
+    """Subtract paid reservations from Product.stock: one UPDATE per product per batch. Returns rows applied."""
+    applied = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status="paid")
+                .values_list("id", "product_id", "quantity")[:APPLY_BATCH_SIZE]
+            )
+            if not rows:
+                break
+
+            totals = defaultdict(int)
+            for _, product_id, quantity in rows:
+                totals[product_id] += quantity
+            # products in id order -> two concurrent flushes never deadlock
+            for product_id in sorted(totals):
+                Product.objects.filter(id=product_id).update(stock=Greatest(F("stock") - totals[product_id], 0))
+            StockReservation.objects.filter(id__in=[row[0] for row in rows]).update(status="fulfilled")
+
+        applied += len(rows)
+        if len(rows) < APPLY_BATCH_SIZE:
+            break
+    return applied
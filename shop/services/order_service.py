@@ -0,0 +1,214 @@
+# shop/services/order_service.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from core.db_router import replica_alias
+from shop.models import CheckoutConfirmation, Order
+
+
+ORDERS_PAGE_SIZE = 10
+PURGE_BATCH_SIZE = 5000
+
+# the page only renders these (item_count / summary are denormalized on Order)
+ORDER_HISTORY_FIELDS = ("id", "status", "total", "created_at", "item_count", "summary")
+
+# customer notice per status
+ORDER_STATUS_TEXT = {
+    "pending": "⏳ Your order is waiting for confirmation.",
+    "accepted": "🧑‍🍳 Your order is now being prepared.",
+    "shipped": "🚚 Your order is on the way to you.",
+    "done": "✅ Your order has been delivered. Thank you!",
+    "cancelled": "❌ Your order was cancelled.",
+}
+
+TRANSITION_SQL = """
+UPDATE shop_order SET status = %s
+WHERE id = ANY(%s) AND status = ANY(%s)
+RETURNING id
+"""
+
+# one order, status + any other changed columns, the whole new row back
+TRANSITION_ROW_SQL = """
+UPDATE shop_order SET {assignments}
+WHERE id = %s AND status = ANY(%s)
+RETURNING *
+"""
+
+
+
+
+# (created_at, id) <-> short string that fits in Telegram's 64-byte callback_data
+def encode_order_cursor(order):
+    micros = int(order.created_at.timestamp()) * 1_000_000 + order.created_at.microsecond
+    return f"{micros}_{order.id}"
+
+
+def decode_order_cursor(value):
+    micros, order_id = value.split("_")
+    micros = int(micros)
+    created_at = datetime.fromtimestamp(micros // 1_000_000, tz=dt_timezone.utc)
+    return created_at.replace(microsecond=micros % 1_000_000), int(order_id)
+
+
+
+
+# One page of a customer's order history, newest first.
+# cursor=None -> first page; newer=False -> rows older than cursor; newer=True -> rows newer than cursor
+# Returns (orders, has_newer, has_older) -- one indexed query, no OrderItem access
+@sync_to_async
+def get_order_history_page(chat_id, cursor=None, newer=False):
+    qs = Order.objects.using(replica_alias()).filter(chat_id=chat_id).only(*ORDER_HISTORY_FIELDS)
+
+    if cursor is None:
+        qs = qs.order_by("-created_at", "-id")
+    else:
+        created_at, order_id = cursor
+        if newer:
+            qs = qs.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=order_id)
+            ).order_by("created_at", "id")
+        else:
+            qs = qs.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+            ).order_by("-created_at", "-id")
+
+    # one extra row tells us whether there is another page in that direction
+    orders = list(qs[:ORDERS_PAGE_SIZE + 1])
+    has_more = len(orders) > ORDERS_PAGE_SIZE
+    orders = orders[:ORDERS_PAGE_SIZE]
+
+    if newer:
+        orders.reverse()
+        return orders, has_more, True
+    return orders, cursor is not None, has_more
+
+
+
+
+def refresh_order_summary(order):
+    """Recompute the denormalized item_count / summary from the order's current lines (admin inline edits)."""
+    order.set_items_summary(list(order.items.select_related("product")))
+    order.save(update_fields=["item_count", "summary"])
+
+
+
+
+# ------------------ Idempotent checkout confirmation ------------------
+# claim_checkout() -> (True, row) for the first confirmation of a token, (False, existing row) for
+# every repeat; the first run fills in the order / payment link as it goes (finish_checkout) or
+# gives the token back if it stopped before creating an order (drop_checkout_claim).
+def claim_checkout(token, chat_id):
+    confirmation, created = CheckoutConfirmation.objects.get_or_create(token=token, defaults={"chat_id": chat_id})
+    if not created and confirmation.chat_id != chat_id:
+        return False, None
+    return created, confirmation
+
+
+def finish_checkout(token, **fields):
+    """fields: order_id and / or payment_url."""
+    CheckoutConfirmation.objects.filter(token=token).update(**fields)
+
+
+def drop_checkout_claim(token):
+    CheckoutConfirmation.objects.filter(token=token, order__isnull=True).delete()
+
+
+def purge_checkout_confirmations():
+    """Delete confirmations older than CHECKOUT_CONFIRMATION_DAYS in batches (celery beat, daily). Returns rows deleted."""
+    cutoff = timezone.now() - timedelta(days=settings.CHECKOUT_CONFIRMATION_DAYS)
+    deleted = 0
+    while True:
+        tokens = list(CheckoutConfirmation.objects.filter(created_at__lt=cutoff).values_list("token", flat=True)[:PURGE_BATCH_SIZE])
+        if not tokens:
+            return deleted
+        deleted += CheckoutConfirmation.objects.filter(token__in=tokens).delete()[0]
+
+
+
+
+def order_status_message(order_id, status):
+    return (
+        f"🔔 <b>Order Update</b>\n\n"
+        f"🧾 <b>Order ID:</b> {order_id}\n"
+        f"{ORDER_STATUS_TEXT.get(status, '')}"
+    )
+
+
+def paid_order_message(order):
+    """The merchant's notice of a paid order (the status signal and the admin bulk job). Reads order.items + products."""
+    lines = [
+        f"💰 <b>PAID ORDER #{order.id}</b>",
+        f"👤 Customer: {order.customer_name or '—'}",
+        f"📞 Phone: {order.phone or '—'}",
+        f"📍 Address: {order.address or '—'}",
+        f"💵 Total: {order.total}",
+        "",
+        "🧾 <b>Items:</b>"
+    ]
+
+    for item in order.items.all():
+        lines.append(f"- {item.product.name} x{item.quantity}")
+
+    # commit_order_stock ran first: paid after the reservation expired and the stock is short
+    if order.oversold:
+        lines += ["", "⚠️ <b>Paid after its stock reservation expired -- oversold, refund or restock.</b>"]
+    return "\n".join(lines)
+
+
+def allowed_from(status, only_from=None):
+    """Statuses an order may be in to move to `status` (Order.TRANSITIONS), optionally narrowed to `only_from`."""
+    sources = [current for current, targets in Order.TRANSITIONS.items() if status in targets]
+    if only_from is not None:
+        sources = [current for current in sources if current in only_from]
+    return sources
+
+
+def transition_order(order_id, status, only_from=None, **fields):
+    """
+    Compare-and-set: move one order to `status` -- writing only status + `fields` (e.g. the
+    stripe ids) -- in a single UPDATE that matches only while the current status may go there.
+    No read-modify-save, no lock: of a racing webhook / redirect / admin edit exactly one wins.
+
+    Returns the updated Order, or None when the order is gone or its status no longer allows
+    the move (already paid, already cancelled, ...). On success post_save is sent with
+    update_fields, so the status receivers run once per real transition.
+    """
+    sources = allowed_from(status, only_from)
+    if not sources:
+        return None
+
+    values = {"status": status, **fields}
+    columns = [Order._meta.get_field(name) for name in values]
+    assignments = ", ".join(f'"{field.column}" = %s' for field in columns)
+    params = [field.get_db_prep_save(values[name], connection) for name, field in zip(values, columns)]
+
+    orders = list(Order.objects.raw(TRANSITION_ROW_SQL.format(assignments=assignments), params + [order_id, sources]))
+    if not orders:
+        return None
+
+    order = orders[0]
+    post_save.send(
+        sender=Order, instance=order, created=False, raw=False,
+        using=order._state.db, update_fields=frozenset(field.name for field in columns),
+    )
+    return order
+
+
+def bulk_transition(order_ids, status):
+    """
+    Move the orders to `status` in ONE conditional UPDATE -- only those whose current status
+    may go there (Order.TRANSITIONS). No post_save: the caller queues the side effects.
+    Returns the ids that actually changed.
+    """
+    sources = allowed_from(status)
+    if not order_ids or not sources:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(TRANSITION_SQL, [status, list(order_ids), sources])
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,149 @@
+# shop/services/partition_service.py
+# Monthly partitions of shop_order / shop_orderitem (see shop migration 0010):
+#   - ensure_order_partitions(): creates the coming months ahead of time (celery beat, daily)
+#   - archive_order_partitions(): detaches old months into the ORDER_ARCHIVE_SCHEMA schema
+#     (the rows leave the ORM but stay queryable in SQL, and can be dumped / dropped as a whole);
+#     the rows pointing at those orders go first, see archive_order_dependents()
+# Partition names end with _pYYYY_MM (UTC months).
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# partitioned table -> partition key column
+PARTITIONED_TABLES = {
+    "shop_order": "created_at",
+    "shop_orderitem": "order_created_at",
+}
+
+PARTITION_NAME_RE = re.compile(r"_p(\d{4})_(\d{2})$")
+
+LIST_PARTITIONS_SQL = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = %s
+"""
+
+# rows pointing at an order (no database FK, the order table is partitioned -> nothing cascades):
+# deliveries are history and follow their orders into the archive schema, the rest only
+# matters while the order is live and is dropped
+ARCHIVED_ORDER_DEPENDENTS = {"delivery_delivery": "order_id"}
+DROPPED_ORDER_DEPENDENTS = {
+    "shop_stockreservation": "order_id",
+    "shop_checkoutconfirmation": "order_id",
+}
+
+
+
+
+def add_months(month, count):
+    """month: (year, month) tuple."""
+    index = month[0] * 12 + month[1] - 1 + count
+    return index // 12, index % 12 + 1
+
+
+def month_bounds(month):
+    lower = datetime(month[0], month[1], 1, tzinfo=dt_timezone.utc)
+    upper_month = add_months(month, 1)
+    return lower, datetime(upper_month[0], upper_month[1], 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month[0]:04d}_{month[1]:02d}"
+
+
+def list_partitions(table):
+    """{(year, month): partition name} of the table's monthly partitions (the default one excluded)."""
+    with connection.cursor() as cursor:
+        cursor.execute(LIST_PARTITIONS_SQL, [table])
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            partitions[(int(match.group(1)), int(match.group(2)))] = name
+    return partitions
+
+
+def create_partition(table, month):
+    """
+    Create + attach one month. Rows that already fell into the DEFAULT partition for that
+    month are moved into it first (ATTACH would fail otherwise).
+    """
+    key = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    lower, upper = month_bounds(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{table}_default" WHERE "{key}" >= %s AND "{key}" < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [lower, upper],
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+    return name
+
+
+
+
+def ensure_order_partitions(months_ahead=None):
+    """Make sure this month and the next `months_ahead` exist for every partitioned table. Returns created names."""
+    months_ahead = settings.ORDER_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    now = timezone.now().astimezone(dt_timezone.utc)
+    wanted = [add_months((now.year, now.month), offset) for offset in range(months_ahead + 1)]
+
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = list_partitions(table)
+        created += [create_partition(table, month) for month in wanted if month not in existing]
+    return created
+
+
+def archive_order_dependents(cursor, partition, schema):
+    """Move / drop the rows that point at the orders of a shop_order partition about to be archived."""
+    order_ids = f'SELECT id FROM "{partition}"'
+    # a delivery's track history goes with it (FK to delivery_delivery)
+    cursor.execute(
+        f'DELETE FROM "delivery_deliveryroute" WHERE "delivery_id" IN '
+        f'(SELECT id FROM "delivery_delivery" WHERE "order_id" IN ({order_ids}))'
+    )
+    for table, column in DROPPED_ORDER_DEPENDENTS.items():
+        cursor.execute(f'DELETE FROM "{table}" WHERE "{column}" IN ({order_ids})')
+    for table, column in ARCHIVED_ORDER_DEPENDENTS.items():
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{schema}"."{table}" (LIKE "{table}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{table}" WHERE "{column}" IN ({order_ids}) RETURNING *) '
+            f'INSERT INTO "{schema}"."{table}" SELECT * FROM moved'
+        )
+
+
+def archive_order_partitions(keep_months=None):
+    """
+    Detach the partitions older than `keep_months` full months and move them to the archive
+    schema (items first, then the orders' dependents and orders). Returns the archived partition names.
+    """
+    keep_months = settings.ORDER_PARTITION_KEEP_MONTHS if keep_months is None else keep_months
+    now = timezone.now().astimezone(dt_timezone.utc)
+    oldest_kept = add_months((now.year, now.month), -keep_months)
+    schema = settings.ORDER_ARCHIVE_SCHEMA
+
+    archived = []
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        for table in ("shop_orderitem", "shop_order"):
+            for month, name in sorted(list_partitions(table).items()):
+                if month >= oldest_kept:
+                    continue
+                with transaction.atomic():
+                    if table == "shop_order":
+                        archive_order_dependents(cursor, name, schema)
+                    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                    cursor.execute(f'ALTER TABLE "{name}" SET SCHEMA "{schema}"')
+                archived.append(f"{schema}.{name}")
+    return archived
@@ -0,0 +1,83 @@
+# shop/services/search_service.py
+# Product search for the bot's inline mode ("@ourbot milk" in any chat):
+#   - full text: Product.search_vector (generated tsvector, GIN product_search_idx), every word as a prefix
+#     so results show up while the user is still typing
+#   - typos: trigram word similarity on the name (GIN product_name_trgm), only when full text finds too little
+#   - results are cached in Redis per normalized query; saving / deleting a product bumps VERSION_KEY,
+#     which retires every cached query at once
+import json
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F
+
+from core.db_router import replica_alias
+from core.redis_client import get_redis
+from shop.models import Product
+
+
+SEARCH_LIMIT = 20
+SEARCH_MIN_LENGTH = 2
+SEARCH_CACHE_SECONDS = 300
+VERSION_KEY = "shop:search:version"
+
+WORD_RE = re.compile(r"\w+")
+RESULT_FIELDS = ("id", "name", "price", "description", "telegram_file_id")
+
+
+
+
+def normalize_query(query):
+    """Lowercase words only (also makes the raw tsquery below safe): "  Milk, 1L!" -> "milk 1l"."""
+    return " ".join(WORD_RE.findall(query.lower()))[:64]
+
+
+def _search_db(normalized):
+    products = Product.objects.using(replica_alias()).filter(is_active=True)
+
+    tsquery = SearchQuery(" & ".join(f"{word}:*" for word in normalized.split()), search_type="raw", config="simple")
+    rows = list(
+        products.filter(search_vector=tsquery)
+        .annotate(rank=SearchRank(F("search_vector"), tsquery))
+        .order_by("-rank", "id")
+        .values(*RESULT_FIELDS)[:SEARCH_LIMIT]
+    )
+    if len(rows) < SEARCH_LIMIT:
+        rows += list(
+            products.filter(name__trigram_word_similar=normalized)
+            .exclude(id__in=[row["id"] for row in rows])
+            .annotate(similarity=TrigramWordSimilarity(normalized, "name"))
+            .order_by("-similarity", "id")
+            .values(*RESULT_FIELDS)[:SEARCH_LIMIT - len(rows)]
+        )
+    return rows
+
+
+def search_products(query):
+    """[{id, name, price, description, photo}] best first; photo is a Telegram file_id or ""."""
+    normalized = normalize_query(query)
+    if len(normalized) < SEARCH_MIN_LENGTH:
+        return []
+
+    client = get_redis()
+    key = f"shop:search:{client.get(VERSION_KEY) or 0}:{normalized}"
+    cached = client.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    results = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "price": str(row["price"]),
+            "description": row["description"][:100],
+            "photo": row["telegram_file_id"],
+        }
+        for row in _search_db(normalized)
+    ]
+    client.set(key, json.dumps(results), ex=SEARCH_CACHE_SECONDS)
+    return results
+
+
+def invalidate_search_cache():
+    get_redis().incr(VERSION_KEY)
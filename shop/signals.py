@@ -1,38 +1,101 @@
 # shop/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
-from django.conf import settings
-from telegram import Bot
+from .models import Category, Order, Product
+from .tasks import notify_merchant_task, send_telegram_message_task
+from .services.order_service import order_status_message, paid_order_message
+from .services.inventory_service import adjust_stock_counter, commit_order_stock, release_order_stock
+from .services.search_service import invalidate_search_cache
+from .services.catalog_service import invalidate_category_pages
+
+
+def status_changed(created, update_fields):
+    """Status receivers only react to transitions (order_service.transition_order), not to every save."""
+    return not created and update_fields is not None and "status" in update_fields
+
 
-from .models import Order
-from .tasks import notify_merchant_task
 
 
 # --------------------------------------------------
-# Create Telegram Bot ONCE
+# Stock reservations follow the order / product
 # --------------------------------------------------
-try:
-    bot = Bot(token=settings.BOT_TOKEN)
-except Exception as e:
-    bot = None
-    print("❌ Telegram bot init failed:", e)
+@receiver(post_save, sender=Order)
+def order_stock_changed(sender, instance: Order, created, update_fields=None, **kwargs):
+    """Paid -> reservations are committed, cancelled -> reserved stock goes back on sale."""
+    if not status_changed(created, update_fields) or instance.status not in ("done", "cancelled"):
+        return
+    try:
+        if instance.status == "done":
+            commit_order_stock(instance)
+        else:
+            release_order_stock(instance)
+    except Exception as e:
+        print("❌ Failed to update stock reservations:", e)
+
+
+@receiver(post_init, sender=Product)
+def remember_product_stock(sender, instance: Product, **kwargs):
+    instance._stock_snapshot = instance.__dict__.get("stock")
+
+
+@receiver(post_save, sender=Product)
+def product_stock_changed(sender, instance: Product, created, **kwargs):
+    """Restock / correction in the admin: shift the live Redis counter by the difference."""
+    before, instance._stock_snapshot = instance._stock_snapshot, instance.stock
+    if created or before is None or before == instance.stock:
+        return
+    try:
+        adjust_stock_counter(instance.id, instance.stock - before)
+    except Exception as e:
+        print("❌ Failed to adjust stock counter:", e)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_search_changed(sender, instance: Product, **kwargs):
+    """Cached inline search results may show the old name / price / photo."""
+    try:
+        invalidate_search_cache()
+    except Exception as e:
+        print("❌ Failed to invalidate search cache:", e)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_category_pages_changed(sender, instance: Product, **kwargs):
+    """Cached category pages: the product's category, and the one it was moved out of."""
+    # post_save runs before the DirtyFieldsMixin snapshot is refreshed -> still the old category
+    previous = getattr(instance, "_snapshot", {}).get("category_id")
+    try:
+        invalidate_category_pages(instance.category_id, previous)
+    except Exception as e:
+        print("❌ Failed to invalidate category pages:", e)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_pages_changed(sender, instance: Category, **kwargs):
+    try:
+        invalidate_category_pages(instance.id)
+    except Exception as e:
+        print("❌ Failed to invalidate category pages:", e)
+
+
 
 
 # --------------------------------------------------
 # Order status change handler
 # --------------------------------------------------
 @receiver(post_save, sender=Order)
-def order_status_changed(sender, instance: Order, created, **kwargs):
+def order_status_changed(sender, instance: Order, created, update_fields=None, **kwargs):
     """
-    Fires on every Order save.
-    - If created: do nothing
-    - If updated:
+    Fires on every Order status transition (saves that don't touch status are ignored).
         • Notify customer about status
         • Notify merchant ONLY when payment is successful (status='done')
     """
 
-    if created:
+    if not status_changed(created, update_fields):
         return
 
     print(f"🔄 Order #{instance.id} updated → status = {instance.status}")
@@ -40,28 +103,16 @@ def order_status_changed(sender, instance: Order, created, **kwargs):
     # --------------------------------------------------
     # 1️⃣ Notify CUSTOMER about status update
     # --------------------------------------------------
-    status_text = {
-        "pending": "⏳ Your order is waiting for confirmation.",
-        "accepted": "🧑‍🍳 Your order is now being prepared.",
-        "shipped": "🚚 Your order is on the way to you.",
-        "done": "✅ Your order has been delivered. Thank you!",
-        "cancelled": "❌ Your order was cancelled.",
-    }
-
-    if bot and instance.chat_id:
+    # queued -> the admin / payment request never waits for Telegram
+    if instance.chat_id:
         try:
-            bot.send_message(
+            send_telegram_message_task.delay(
                 chat_id=instance.chat_id,
-                text=(
-                    f"🔔 <b>Order Update</b>\n\n"
-                    f"🧾 <b>Order ID:</b> {instance.id}\n"
-                    f"{status_text.get(instance.status, '')}"
-                ),
-                parse_mode="HTML"
+                text=order_status_message(instance.id, instance.status),
             )
-            print("✅ Customer notified")
+            print("✅ Customer notification queued")
         except Exception as e:
-            print("❌ Failed to notify customer:", e)
+            print("❌ Failed to queue customer notification:", e)
 
     # --------------------------------------------------
     # 2️⃣ Notify MERCHANT only when PAID
@@ -69,17 +120,4 @@ def order_status_changed(sender, instance: Order, created, **kwargs):
     if instance.status != "done":
         return
 
-    lines = [
-        f"💰 <b>PAID ORDER #{instance.id}</b>",
-        f"👤 Customer: {instance.customer_name or '—'}",
-        f"📞 Phone: {instance.phone or '—'}",
-        f"📍 Address: {instance.address or '—'}",
-        f"💵 Total: {instance.total}",
-        "",
-        "🧾 <b>Items:</b>"
-    ]
-
-    for item in instance.items.all():
-        lines.append(f"- {item.product.name} x{item.quantity}")
-
-    notify_merchant_task.delay("\n".join(lines))
+    notify_merchant_task.delay(paid_order_message(instance))
@@ -19,10 +19,22 @@ If Celery imports bot.py → event loop breaks."""
 import requests
 from celery import shared_task
 from django.conf import settings
+from django.utils import timezone
 import requests
 import json
 import html
 
+from django.db.models import F
+
+from shop.models import Order, OrderStatusJob
+from shop.services.order_service import order_status_message, paid_order_message, purge_checkout_confirmations
+from shop.services.inventory_service import (
+    apply_paid_reservations, commit_order_stock, release_expired_reservations, release_order_stock,
+)
+from delivery.services.slot_service import release_order_slot
+from shop.services.cart_service import compact_carts, reconcile_cart_totals
+from shop.services.partition_service import ensure_order_partitions
+
 
 # TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/{method}"
 
@@ -75,3 +87,119 @@ def notify_merchant_task(text):
 
 
 
+@shared_task
+def apply_paid_reservations_task():
+    """Subtract paid stock reservations from Product.stock (scheduled by celery beat)."""
+    return apply_paid_reservations()
+
+
+@shared_task
+def release_expired_reservations_task():
+    """Put stock held by unpaid, expired checkouts back on sale and cancel those orders (scheduled by celery beat)."""
+    return len(release_expired_reservations())
+
+
+@shared_task
+def compact_carts_task():
+    """Purge / archive old carts in small batches (scheduled daily by celery beat)."""
+    reclaimed = compact_carts()
+    print("compact_carts_task reclaimed:", reclaimed)
+    return reclaimed
+
+
+@shared_task
+def reconcile_cart_totals_task():
+    """Repair drifted Cart.item_count / total (scheduled hourly by celery beat)."""
+    fixed = reconcile_cart_totals()
+    if fixed:
+        print("reconcile_cart_totals_task fixed carts:", fixed)
+    return fixed
+
+
+@shared_task
+def purge_checkout_confirmations_task():
+    """Drop old double-tap guard rows of finished / expired checkouts (scheduled daily by celery beat)."""
+    return purge_checkout_confirmations()
+
+
+@shared_task
+def ensure_order_partitions_task():
+    """Create the coming monthly Order/OrderItem partitions (scheduled daily by celery beat)."""
+    return ensure_order_partitions()
+
+
+
+
+def _finish_status_job(job_id):
+    """Stamp finished_at once every notice of the job is counted (sent or failed)."""
+    OrderStatusJob.objects.filter(
+        id=job_id, finished_at__isnull=True, total__lte=F("sent") + F("failed"),
+    ).update(finished_at=timezone.now())
+
+
+@shared_task(bind=True, max_retries=3)
+def send_status_notice_task(self, job_id, chat_id, text):
+    """
+    One customer notice of an OrderStatusJob. Telegram's 429 / network errors are retried
+    (after retry_after), the outcome is counted into the job's sent / failed progress.
+    """
+    url = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/sendMessage"
+    try:
+        resp = requests.post(url, json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"}, timeout=30)
+    except requests.exceptions.RequestException as e:
+        print("send_status_notice_task request failed:", e)
+        resp = None
+
+    if (resp is None or resp.status_code == 429) and self.request.retries < self.max_retries:
+        retry_after = resp.json().get("parameters", {}).get("retry_after", 1) if resp is not None else 1
+        raise self.retry(countdown=retry_after)
+    if resp is not None and resp.status_code != 200:
+        print("Telegram response:", resp.text)
+
+    delivered = resp is not None and resp.status_code == 200
+    counter = "sent" if delivered else "failed"
+    OrderStatusJob.objects.filter(id=job_id).update(**{counter: F(counter) + 1})
+    _finish_status_job(job_id)
+    return delivered
+
+
+@shared_task
+def notify_status_job_task(job_id):
+    """
+    Follow-up of an admin bulk status change (the UPDATE bypassed post_save): stock / slot side
+    effects and the merchant's paid-order notices, then one send_status_notice_task per customer,
+    spaced by countdown to at most TELEGRAM_BULK_RATE per second (no worker sits in a sleep).
+    """
+    job = OrderStatusJob.objects.get(id=job_id)
+    orders = Order.objects.filter(id__in=job.order_ids)
+    if job.status == "done":
+        orders = orders.prefetch_related("items__product")
+    else:
+        orders = orders.only("id", "chat_id", "status", "delivery_slot_id")
+    orders = list(orders)
+
+    paid = 0
+    for order in orders:
+        if job.status == "done":
+            commit_order_stock(order)
+            # same notice as a single payment; the merchant's chat takes about one message a second
+            notify_merchant_task.apply_async((paid_order_message(order),), countdown=paid)
+            paid += 1
+        elif job.status == "cancelled":
+            release_order_stock(order)
+            release_order_slot(order)
+
+    recipients = [order for order in orders if order.chat_id]
+    # orders without a chat (or gone since) can't be told
+    unreachable = len(job.order_ids) - len(recipients)
+    if unreachable:
+        OrderStatusJob.objects.filter(id=job_id).update(failed=F("failed") + unreachable)
+
+    interval = 1 / settings.TELEGRAM_BULK_RATE
+    for number, order in enumerate(recipients):
+        send_status_notice_task.apply_async(
+            (job_id, order.chat_id, order_status_message(order.id, job.status)),
+            countdown=number * interval,
+        )
+    _finish_status_job(job_id)
+    return len(recipients)
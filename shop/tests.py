@@ -1,3 +1,568 @@
-from django.test import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from threading import Barrier
+from unittest import mock, skipUnless
+import uuid
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import bot
+from core.redis_client import get_redis, redis_available
+from delivery.models import Delivery, DeliveryRoute
+from shop.models import (
+    Cart, CartItem, Category, CheckoutConfirmation, Order, OrderItem, Product, StockReservation,
+)
+from shop.services.cart_service import apply_cart_changes, reconcile_cart_totals
+from shop.services.catalog_service import CATEGORY_PAGE_SIZE, get_category_page
+from shop.services.order_service import allowed_from, bulk_transition, order_status_message, transition_order
+from shop.services.partition_service import (
+    PARTITIONED_TABLES, add_months, archive_order_partitions, create_partition, ensure_order_partitions,
+    list_partitions, month_bounds, partition_name,
+)
+
+
+class OrderAdminQueryCountTests(TestCase):
+    """The order admin must not issue queries per row: more orders / items, same query count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        category = Category.objects.create(name="Food", slug="food")
+        cls.product = Product.objects.create(category=category, name="Pizza", price=10, stock=1000)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def make_order(self, items=1):
+        order = Order.objects.create(chat_id=1, customer_name="Test User", phone="+966500000000", address="Main street 1")
+        for _ in range(items):
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=10)
+        return order
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_constant(self):
+        url = reverse("admin:shop_order_changelist")
+        self.make_order()
+        few = self.count_queries(url)
+        for _ in range(20):
+            self.make_order()
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_changelist_search_query_count_is_constant(self):
+        url = reverse("admin:shop_order_changelist")
+        self.make_order()
+        few = self.count_queries(url, q="test")
+        for _ in range(20):
+            self.make_order()
+        self.assertEqual(self.count_queries(url, q="test"), few)
+
+    def test_change_page_query_count_is_constant(self):
+        small = self.make_order(items=1)
+        big = self.make_order(items=15)
+        self.assertEqual(
+            self.count_queries(reverse("admin:shop_order_change", args=[big.id])),
+            self.count_queries(reverse("admin:shop_order_change", args=[small.id])),
+        )
+
+
+class DirtyFieldsTests(TestCase):
+    """DirtyFieldsMixin: only what was really written / reloaded counts as clean."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Food", slug="food")
+
+    def setUp(self):
+        product = Product.objects.create(category=self.category, name="Pizza", price=10, stock=1000)
+        self.product = Product.objects.get(id=product.id)
+
+    def test_fields_left_out_of_update_fields_stay_dirty(self):
+        self.product.name = "Burger"
+        self.product.price = 12
+        self.product.save(update_fields=["price"])
+        self.assertEqual(self.product.get_dirty_fields(), ["name"])
+
+        self.product.save()
+        fresh = Product.objects.get(id=self.product.id)
+        self.assertEqual((fresh.name, fresh.price), ("Burger", 12))
+
+    def test_refreshed_fields_are_clean(self):
+        Product.objects.filter(id=self.product.id).update(stock=5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            self.product.save()
+
+    def test_partial_refresh_keeps_other_edits_dirty(self):
+        self.product.name = "Burger"
+        Product.objects.filter(id=self.product.id).update(stock=5)
+        self.product.refresh_from_db(fields=["stock"])
+        self.assertEqual(self.product.get_dirty_fields(), ["name"])
+
+
+class OrderPartitionTests(TestCase):
+    """Smoke test of the monthly partitions on the migrated schema."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Food", slug="food")
+        cls.product = Product.objects.create(category=category, name="Pizza", price=10, stock=1000)
+
+    def setUp(self):
+        now = timezone.now()
+        self.month = (now.year, now.month)
+
+    def make_order(self, created_at):
+        """An order in created_at's month, with an item, a delivery + route and a reservation."""
+        order = Order.objects.create(chat_id=1, customer_name="Test User", phone="+966500000000", address="Main street 1")
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=10)
+        Order.objects.filter(id=order.id).update(created_at=created_at)
+        OrderItem.objects.filter(order_id=order.id).update(order_created_at=created_at)
+        delivery = Delivery.objects.create(order_id=order.id)
+        DeliveryRoute.objects.create(delivery=delivery, day=created_at.date())
+        StockReservation.objects.create(order_id=order.id, product=self.product, quantity=1, expires_at=created_at)
+        return order
+
+    def test_ensure_creates_the_coming_months_once(self):
+        ahead = settings.ORDER_PARTITIONS_AHEAD + 2
+        created = ensure_order_partitions(months_ahead=ahead)
+        last = add_months(self.month, ahead)
+        for table in PARTITIONED_TABLES:
+            self.assertIn(partition_name(table, last), created)
+            self.assertIn(last, list_partitions(table))
+        self.assertEqual(ensure_order_partitions(months_ahead=ahead), [])
+
+    def test_archive_moves_old_months_with_their_dependents(self):
+        old_month = add_months(self.month, -30)
+        old = self.make_order(month_bounds(old_month)[0] + timedelta(days=1))
+        recent = self.make_order(timezone.now())
+        # the old order fell into the DEFAULT partition; its month is created the way the task does it
+        for table in PARTITIONED_TABLES:
+            create_partition(table, old_month)
+        self.assertEqual(Order.objects.filter(id=old.id).count(), 1)
+
+        schema = settings.ORDER_ARCHIVE_SCHEMA
+        archived = archive_order_partitions(keep_months=24)
+        self.assertEqual(archived, [
+            f"{schema}.{partition_name('shop_orderitem', old_month)}",
+            f"{schema}.{partition_name('shop_order', old_month)}",
+        ])
+
+        self.assertEqual(list(Order.objects.values_list("id", flat=True)), [recent.id])
+        self.assertEqual(list(OrderItem.objects.values_list("order_id", flat=True)), [recent.id])
+        self.assertEqual(list(StockReservation.objects.values_list("order_id", flat=True)), [recent.id])
+        self.assertEqual(list(DeliveryRoute.objects.values_list("delivery__order_id", flat=True)), [recent.id])
+        deliveries = list(Delivery.objects.all())
+        self.assertEqual([delivery.order_id for delivery in deliveries], [recent.id])
+        self.assertEqual(str(deliveries[0]), f"Delivery for Order #{recent.id} - preparing")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM "{schema}"."{partition_name("shop_order", old_month)}"')
+            self.assertEqual(cursor.fetchall(), [(old.id,)])
+            cursor.execute(f'SELECT order_id FROM "{schema}"."delivery_delivery"')
+            self.assertEqual(cursor.fetchall(), [(old.id,)])
+
+
+def make_test_order(**fields):
+    return Order.objects.create(chat_id=1, customer_name="Test User", phone="+966500000000", address="Main street 1", **fields)
+
+
+@mock.patch("shop.signals.notify_merchant_task")
+@mock.patch("shop.signals.send_telegram_message_task")
+class OrderTransitionTests(TestCase):
+    """Order.TRANSITIONS is enforced by the compare-and-set UPDATEs of order_service."""
+
+    def test_transition_graph(self, send_message, notify_merchant):
+        self.assertEqual(set(Order.TRANSITIONS), {status for status, _ in Order.STATUS_CHOICES})
+        self.assertEqual(allowed_from("accepted"), ["pending"])
+        self.assertEqual(allowed_from("shipped"), ["accepted"])
+        self.assertEqual(allowed_from("done"), ["pending", "shipped"])
+        self.assertEqual(allowed_from("cancelled"), ["pending", "accepted"])
+        self.assertEqual(allowed_from("pending"), [])
+        self.assertEqual(allowed_from("done", only_from=("pending",)), ["pending"])
+
+    def test_allowed_transition_notifies_once(self, send_message, notify_merchant):
+        order = make_test_order()
+        moved = transition_order(order.id, "accepted")
+        self.assertEqual(moved.status, "accepted")
+        self.assertEqual(Order.objects.get(id=order.id).status, "accepted")
+        send_message.delay.assert_called_once()
+        notify_merchant.delay.assert_not_called()
+
+    def test_refused_transition_changes_nothing(self, send_message, notify_merchant):
+        order = make_test_order(status="done")
+        self.assertIsNone(transition_order(order.id, "cancelled"))
+        self.assertIsNone(transition_order(order.id, "pending"))
+        self.assertEqual(Order.objects.get(id=order.id).status, "done")
+        send_message.delay.assert_not_called()
+
+    def test_only_from_narrows_the_graph(self, send_message, notify_merchant):
+        order = make_test_order(status="shipped")
+        self.assertIsNone(transition_order(order.id, "done", only_from=("pending",)))
+        self.assertEqual(Order.objects.get(id=order.id).status, "shipped")
+
+    def test_bulk_transition_skips_disallowed(self, send_message, notify_merchant):
+        pending, shipped, cancelled = make_test_order(), make_test_order(status="shipped"), make_test_order(status="cancelled")
+        changed = bulk_transition([pending.id, shipped.id, cancelled.id], "done")
+        self.assertEqual(sorted(changed), sorted([pending.id, shipped.id]))
+        self.assertEqual(Order.objects.get(id=cancelled.id).status, "cancelled")
+        # no post_save: the admin job sends the notices
+        send_message.delay.assert_not_called()
+
+
+@mock.patch("shop.signals.notify_merchant_task")
+@mock.patch("shop.signals.send_telegram_message_task")
+class OrderTransitionRaceTests(TransactionTestCase):
+    """A customer cancel racing a late Stripe success: one winner, one customer notice."""
+
+    ROUNDS = 10
+
+    def race(self, order_id):
+        barrier = Barrier(2)
+
+        def move(status):
+            try:
+                barrier.wait()
+                order = transition_order(order_id, status, only_from=("pending",))
+                return order.status if order else None
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            return list(pool.map(move, ["cancelled", "done"]))
+
+    def test_cancel_racing_payment_has_one_winner(self, send_message, notify_merchant):
+        for _ in range(self.ROUNDS):
+            send_message.reset_mock()
+            notify_merchant.reset_mock()
+            order = make_test_order()
+
+            results = self.race(order.id)
+            winners = [status for status in results if status]
+            self.assertEqual(len(winners), 1, results)
+            self.assertEqual(Order.objects.get(id=order.id).status, winners[0])
+
+            send_message.delay.assert_called_once()
+            self.assertEqual(send_message.delay.call_args.kwargs["chat_id"], order.chat_id)
+            self.assertEqual(notify_merchant.delay.call_count, int(winners[0] == "done"))
+
+
+@mock.patch("bot.release_slot")
+@mock.patch("bot.book_slot", return_value=True)
+@mock.patch("bot.unreserve_stock")
+@mock.patch("bot.reserve_stock", return_value=None)
+class CheckoutConfirmationTests(TestCase):
+    """A confirmation token creates at most one order and one payment page, whatever is tapped again."""
+
+    PAY_URL = "https://checkout.stripe.com/pay/test"
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Food", slug="food")
+        cls.product = Product.objects.create(category=category, name="Pizza", price=10, stock=1000)
+
+    def setUp(self):
+        cart = Cart.objects.create(chat_id=1, item_count=2, total=20)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2, price=10)
+        self.token = uuid.uuid4().hex
+        self.context = mock.Mock(chat_data={}, bot=mock.AsyncMock(), user_data={
+            "checkout_token": self.token, "name": "Test User", "phone": "+966500000000", "address": "Main street 1",
+        })
+        payment_link = mock.patch("bot.create_payment_link", new_callable=mock.AsyncMock, return_value=self.PAY_URL)
+        self.create_payment_link = payment_link.start()
+        self.addCleanup(payment_link.stop)
+
+    def update(self):
+        query = mock.AsyncMock(data=f"confirm_checkout:{self.token}")
+        query.message.chat.id = 1
+        return mock.Mock(callback_query=query)
+
+    def sent_texts(self):
+        return [call.kwargs["text"] for call in self.context.bot.send_message.call_args_list]
+
+    async def confirm(self):
+        return await bot.checkout_confirm(self.update(), self.context)
+
+    async def test_double_tap_makes_one_order_and_one_session(self, *mocks):
+        await self.confirm()
+        await self.confirm()
+
+        order = await Order.objects.aget()
+        self.assertEqual((order.total, order.item_count), (20, 2))
+        self.assertEqual(await OrderItem.objects.filter(order_id=order.id).acount(), 1)
+        self.create_payment_link.assert_awaited_once_with(order.id)
+        confirmation = await CheckoutConfirmation.objects.aget(token=self.token)
+        self.assertEqual((confirmation.order_id, confirmation.payment_url), (order.id, self.PAY_URL))
+        self.assertEqual(self.sent_texts(), [f"🛒 Order #{order.id} created! Click below to pay:"] * 2)
+
+    async def test_tap_while_first_is_running_waits(self, *mocks):
+        await sync_to_async(bot.claim_checkout)(self.token, 1)  # the first tap, still placing the order
+        await self.confirm()
+
+        self.assertFalse(await Order.objects.aexists())
+        self.create_payment_link.assert_not_awaited()
+        self.assertEqual(self.sent_texts(), ["⏳ Your order is being created, one moment…"])
+
+    async def test_failure_inside_the_order_transaction_leaves_nothing(self, reserve_stock, unreserve_stock, *mocks):
+        with mock.patch("bot.record_reservations", side_effect=RuntimeError("database gone")):
+            with self.assertRaises(RuntimeError):
+                await self.confirm()
+
+        self.assertFalse(await Order.objects.aexists())
+        self.assertFalse(await OrderItem.objects.aexists())
+        # the token can be confirmed again
+        self.assertFalse(await CheckoutConfirmation.objects.filter(token=self.token).aexists())
+        unreserve_stock.assert_called_once()
+
+    async def test_payment_page_failure_keeps_the_order(self, *mocks):
+        self.create_payment_link.side_effect = RuntimeError("stripe down")
+        await self.confirm()
+        order = await Order.objects.aget()
+        confirmation = await CheckoutConfirmation.objects.aget(token=self.token)
+        self.assertEqual((confirmation.order_id, confirmation.payment_url), (order.id, ""))
+
+        # right away: still the first run's page -> no second session
+        await self.confirm()
+        self.assertEqual(self.create_payment_link.await_count, 1)
+        self.assertEqual(self.sent_texts()[-1], "⏳ Your order is being created, one moment…")
+
+        # the first run gave up long ago -> the same order's page is asked for again
+        await CheckoutConfirmation.objects.filter(token=self.token).aupdate(
+            created_at=timezone.now() - bot.CHECKOUT_LINK_WAIT - timedelta(seconds=1),
+        )
+        self.create_payment_link.side_effect = None
+        await self.confirm()
+        self.assertEqual(self.create_payment_link.await_count, 2)
+        self.create_payment_link.assert_awaited_with(order.id)
+        self.assertEqual(await Order.objects.acount(), 1)
+
+    async def test_replay_after_the_order_is_finished(self, *mocks):
+        await self.confirm()
+        order = await Order.objects.aget()
+        await Order.objects.filter(id=order.id).aupdate(status="done")
+
+        await self.confirm()
+        self.assertEqual(await Order.objects.acount(), 1)
+        self.create_payment_link.assert_awaited_once()
+        self.assertEqual(self.sent_texts()[-1], order_status_message(order.id, "done"))
+
+
+@mock.patch("bot.CART_TAP_WINDOW", 0.05)
+@mock.patch("bot.send_cart_message", new_callable=mock.AsyncMock)
+@mock.patch("bot.apply_cart_changes", new_callable=mock.AsyncMock)
+class CartTapTests(SimpleTestCase):
+    """A chat's cart taps within CART_TAP_WINDOW become one write and one re-render."""
+
+    def context(self):
+        return mock.Mock(application=mock.Mock(create_task=asyncio.create_task))
+
+    def tap(self, context, *ops, chat_id=1, product_id=7):
+        for op in ops:
+            bot.queue_cart_tap(chat_id, op, product_id, mock.sentinel.message, context)
+
+    async def test_burst_is_one_write_with_the_net_delta(self, apply_changes, send_cart):
+        context = self.context()
+        self.tap(context, "add", "inc", "inc", "dec", "inc")
+        self.tap(context, "dec", product_id=8)
+        await bot.drain_cart_taps()
+
+        apply_changes.assert_awaited_once_with(1, {7: (False, 3), 8: (False, -1)})
+        send_cart.assert_awaited_once_with(1, mock.sentinel.message, context)
+
+    async def test_remove_then_add_keeps_the_order(self, apply_changes, send_cart):
+        context = self.context()
+        self.tap(context, "inc", "rm", "add")
+        self.tap(context, "add", "rm", product_id=8)
+        await bot.drain_cart_taps()
+
+        # remove drops the line first, then the later taps apply on top; taps before it are gone
+        apply_changes.assert_awaited_once_with(1, {7: (True, 1), 8: (True, 0)})
+
+    async def test_chats_are_flushed_separately(self, apply_changes, send_cart):
+        context = self.context()
+        self.tap(context, "inc", chat_id=1)
+        self.tap(context, "inc", "inc", chat_id=2)
+        await bot.drain_cart_taps()
+
+        self.assertEqual(sorted(call.args for call in apply_changes.await_args_list), [(1, {7: (False, 1)}), (2, {7: (False, 2)})])
+
+    async def test_shutdown_drains_pending_taps(self, apply_changes, send_cart):
+        context = self.context()
+        self.tap(context, "inc", "inc")
+        self.assertEqual(len(bot._cart_flushes), 1)
+        apply_changes.assert_not_awaited()
+
+        await bot.drain_cart_taps()
+        apply_changes.assert_awaited_once_with(1, {7: (False, 2)})
+        self.assertEqual((bot._cart_taps, bot._cart_flushes), ({}, set()))
+
+    async def test_failed_write_still_rerenders(self, apply_changes, send_cart):
+        apply_changes.side_effect = RuntimeError("database gone")
+        context = self.context()
+        self.tap(context, "inc")
+        with self.assertLogs("bot", "ERROR"):
+            await bot.drain_cart_taps()
+        send_cart.assert_awaited_once()
+        self.assertEqual(bot._cart_taps, {})
+
+
+class CartChangesTests(TestCase):
+    """cart_service: tap bursts against the stored cart, its denormalized item_count / total."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Food", slug="food")
+        cls.product = Product.objects.create(category=category, name="Pizza", price=10, stock=1000)
+        cls.drink = Product.objects.create(category=category, name="Cola", price=Decimal("2.50"), stock=1000)
+
+    def apply(self, remove, delta, product=None):
+        return async_to_sync(apply_cart_changes)(1, {(product or self.product).id: (remove, delta)})
+
+    def test_totals_follow_the_lines(self):
+        async_to_sync(apply_cart_changes)(1, {self.product.id: (False, 2), self.drink.id: (False, 3)})
+        cart = self.apply(False, -1, product=self.drink)
+        self.assertEqual((cart.item_count, cart.total), (4, Decimal("25.00")))
+        cart = self.apply(False, -5, product=self.drink)  # below zero: the line goes, no negative counts
+        self.assertEqual((cart.item_count, cart.total), (2, Decimal("20.00")))
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_no_cart_without_an_add(self):
+        self.assertIsNone(self.apply(False, -1))
+        self.assertIsNone(self.apply(True, 0))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_one_active_cart_per_chat(self):
+        self.apply(False, 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(chat_id=1)
+        Cart.objects.update(is_active=False)
+        cart = self.apply(False, 1)  # after checkout: a new cart
+        self.assertEqual(Cart.objects.filter(chat_id=1).count(), 2)
+        self.assertEqual(cart.item_count, 1)
+
+    def test_reconcile_repairs_drifted_active_carts(self):
+        cart = self.apply(False, 3)
+        old = Cart.objects.create(chat_id=2, is_active=False, item_count=9, total=90)
+        CartItem.objects.create(cart=cart, product=self.drink, quantity=2, price=Decimal("2.50"))  # behind the counters' back
+
+        self.assertEqual(reconcile_cart_totals(), 1)
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total), (5, Decimal("35.00")))
+        old.refresh_from_db()
+        self.assertEqual((old.item_count, old.total), (9, 90))  # checked-out carts are left alone
+        self.assertEqual(reconcile_cart_totals(), 0)
+
+    def test_remove_then_add_starts_the_line_over(self):
+        self.apply(False, 3)
+        cart = self.apply(True, 1)
+        self.assertEqual((cart.item_count, cart.total), (1, 10))
+        self.assertEqual(list(cart.items.values_list("quantity", flat=True)), [1])
+
+    def test_remove_drops_the_line(self):
+        self.apply(False, 2)
+        cart = self.apply(True, 0)
+        self.assertEqual((cart.item_count, cart.total), (0, 0))
+        self.assertFalse(cart.items.exists())
+
+
+@skipUnless(redis_available(), "needs Redis")
+class CategoryPageCacheTests(TestCase):
+    """Cached category pages: re-read after any change to their products, keyset paging stays consistent."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Food", slug="food")
+        cls.other = Category.objects.create(name="Drinks", slug="drinks")
+        cls.products = [
+            Product.objects.create(category=cls.category, name=f"Dish {number:02d}", price=10, stock=100)
+            for number in range(CATEGORY_PAGE_SIZE * 2 + 3)
+        ]
+
+    def setUp(self):
+        # ids repeat between test runs, the Redis keys would outlive them
+        self.clear_cache()
+        self.addCleanup(self.clear_cache)
+
+    def clear_cache(self):
+        client = get_redis()
+        for category in (self.category, self.other):
+            keys = list(client.scan_iter(f"shop:catalog:{category.id}:*"))
+            if keys:
+                client.delete(*keys)
+
+    def walk(self, first=None):
+        """Every page forward, from `first` (an already read first page) or from the start."""
+        pages = [first or get_category_page(self.category.id)]
+        while pages[-1]["has_next"]:
+            pages.append(get_category_page(self.category.id, pages[-1]["products"][-1][0]))
+        return pages
+
+    def ids(self, pages):
+        return [row[0] for page in pages for row in page["products"]]
+
+    def test_pages_are_served_from_the_cache(self):
+        first = get_category_page(self.category.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category_page(self.category.id), first)
+
+    def test_product_save_invalidates(self):
+        get_category_page(self.category.id)
+        product = self.products[0]
+        product.price = 12
+        product.save()
+        page = get_category_page(self.category.id)
+        self.assertEqual(page["products"][0], [product.id, product.name, "12.00"])
+
+    def test_stock_change_invalidates(self):
+        get_category_page(self.category.id)
+        product = Product.objects.get(id=self.products[0].id)
+        product.stock = 0
+        product.save()
+        with self.assertNumQueries(2):  # category name + one page of products
+            get_category_page(self.category.id)
+
+    def test_moving_a_product_invalidates_both_categories(self):
+        get_category_page(self.category.id)
+        get_category_page(self.other.id)
+        product = Product.objects.get(id=self.products[0].id)
+        product.category = self.other
+        product.save()
+        self.assertNotIn(product.id, self.ids([get_category_page(self.category.id)]))
+        self.assertEqual(self.ids([get_category_page(self.other.id)]), [product.id])
+
+    def test_paging_across_the_cache_boundary_is_stable(self):
+        self.assertEqual(self.ids(self.walk()), [product.id for product in self.products])
+
+        # the customer holds a page cached before the catalog changed, then pages on
+        first = get_category_page(self.category.id)
+        removed = self.products[CATEGORY_PAGE_SIZE + 1]
+        removed.is_active = False
+        removed.save()
+        added = Product.objects.create(category=self.category, name="Dish new", price=10, stock=100)
+
+        ids = self.ids(self.walk(first))
+        expected = [product.id for product in self.products if product != removed] + [added.id]
+        self.assertEqual(ids, expected)
+
+    def test_back_pages_match_forward_pages(self):
+        pages = self.walk()
+        self.assertEqual(len(pages), 3)
+        for previous, page in zip(pages, pages[1:]):
+            back = get_category_page(self.category.id, page["products"][0][0], back=True)
+            self.assertEqual(back["products"], previous["products"])
+            self.assertEqual(back["has_prev"], previous["has_prev"])
+            self.assertTrue(back["has_next"])